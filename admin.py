@@ -5,11 +5,13 @@ import json
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager, Player, Nation, Province, WorldEvent
+from ledger import ADMIN_GRANTS, GOLD, Ledger, player_account, require_ledger
 
 class AdminManager:
     def __init__(self, admin_ids: List[int]):
         self.admin_ids = admin_ids
         self.db = None  # Will be set by bot
+        self.ledger: Optional[Ledger] = None  # Shared ledger, set by bot
     
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin"""
@@ -140,14 +142,14 @@ class AdminManager:
     
     def give_gold(self, player_id: int, amount: float) -> bool:
         """Give gold to a player"""
+        ledger = require_ledger(self.ledger, "AdminManager")
         with self.db.get_session() as session:
-            player = session.query(Player).filter_by(telegram_id=player_id).first()
-            if not player:
-                return False
-            
-            player.gold += amount
-            session.commit()
-            return True
+            internal_id = session.query(Player.id).filter_by(telegram_id=player_id).scalar()
+        if internal_id is None:
+            return False
+        
+        ledger.transfer(ADMIN_GRANTS, player_account(internal_id), GOLD, amount, "admin_grant")
+        return True
     
     def set_player_level(self, player_id: int, level: int) -> bool:
         """Set player level"""
@@ -13,6 +13,8 @@ import sqlite3
 import psutil
 import logging
 
+from ledger import ADMIN_GRANTS, GOLD, Ledger, material_asset, player_account, transfer
+
 @dataclass
 class AdminAction:
     """Represents an admin action"""
@@ -46,6 +48,7 @@ class AdminPanel:
     def __init__(self, settings_manager, database_manager):
         self.settings_manager = settings_manager
         self.database_manager = database_manager
+        self.ledger = Ledger(database_manager)
         self.admin_actions: List[AdminAction] = []
         self.system_metrics: List[SystemMetrics] = []
         self.logger = logging.getLogger(__name__)
@@ -499,35 +502,27 @@ class AdminPanel:
         """Give resources to a user"""
         try:
             with self.database_manager.get_session() as session:
-                from database import Player, PlayerMaterial
+                from database import Player
                 
-                player = session.query(Player).filter_by(telegram_id=target_id).first()
-                if not player:
+                player_id = session.query(Player.id).filter_by(telegram_id=target_id).scalar()
+                if not player_id:
                     return False
                 
+                account = player_account(player_id)
+                reference = f"admin:{admin_id}"
+                entries = []
+                
                 # Give gold
                 if gold > 0:
-                    player.gold += gold
+                    entries.append(transfer(ADMIN_GRANTS, account, GOLD, gold, "admin_grant", reference))
                 
                 # Give materials
                 if materials:
                     for material, amount in materials.items():
-                        player_material = session.query(PlayerMaterial).filter_by(
-                            player_id=player.id,
-                            material=material
-                        ).first()
-                        
-                        if player_material:
-                            player_material.amount += amount
-                        else:
-                            player_material = PlayerMaterial(
-                                player_id=player.id,
-                                material=material,
-                                amount=amount
-                            )
-                            session.add(player_material)
+                        entries.append(transfer(ADMIN_GRANTS, account, material_asset(material), amount,
+                                                "admin_grant", reference))
                 
-                session.commit()
+                self.ledger.post(*entries)
                 
                 self.log_admin_action(
                     admin_id=admin_id,
@@ -12,11 +12,17 @@ from bale import Bot, Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboa
 from bale.handlers import MessageHandler, CallbackQueryHandler, CommandHandler
 
 from bale_storage import BaleStorage
+from database import DatabaseManager
+from ledger import GOLD, OPENING, SHOP, Ledger, material_asset, transfer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def bale_account(user_id: int) -> str:
+    """Ledger account of a Bale player (balances live in BaleStorage, not the players table)"""
+    return f"bale:{user_id}"
+
 class BaleWorldWarBot:
     def __init__(self, config_path: str = "config.json"):
         with open(config_path, 'r') as f:
@@ -27,6 +33,11 @@ class BaleWorldWarBot:
         # Initialize storage with global purchase sync
         self.storage = BaleStorage()
         
+        # Audit trail of gold and material movements
+        ledger_db = DatabaseManager(self.config.get("ledger", {}).get("database_url", "sqlite:///data/bale_ledger.db"))
+        ledger_db.create_tables()
+        self.ledger = Ledger(ledger_db)
+        
         # Game state
         self.player_cooldowns = {}
         
@@ -104,6 +115,11 @@ class BaleWorldWarBot:
             self.storage.save_units(user_id, units)
             self.storage.save_quests(user_id, [])
             
+            account = bale_account(user_id)
+            opening = [(GOLD, player['gold'])] + [(material_asset(m), q) for m, q in materials.items()]
+            self.ledger.post(*(transfer(OPENING, account, asset, amount, "opening_balance")
+                               for asset, amount in opening))
+            
             welcome_text = f"""
 🎖️ **به {self.config['game']['world_name']} خوش آمدید، فرمانده!**
 
@@ -597,6 +613,10 @@ class BaleWorldWarBot:
                 materials = self.storage.load_materials(user_id)
                 materials[item_type] = materials.get(item_type, 0) + quantity
                 self.storage.save_materials(user_id, materials)
+                self.ledger.post(
+                    transfer(bale_account(user_id), SHOP, GOLD, total_cost, "shop_purchase"),
+                    transfer(SHOP, bale_account(user_id), material_asset(item_type), quantity, "shop_purchase")
+                )
                 
                 # Add to global purchases - THIS IS THE NEW FEATURE!
                 purchase_data = {
@@ -625,6 +645,7 @@ class BaleWorldWarBot:
                 units = self.storage.load_units(user_id)
                 units[item_type] = units.get(item_type, 0) + 1
                 self.storage.save_units(user_id, units)
+                self.ledger.transfer(bale_account(user_id), SHOP, GOLD, unit_cost, "shop_purchase", f"unit:{item_type}")
                 
                 # Add to global purchases - THIS IS THE NEW FEATURE!
                 purchase_data = {
@@ -739,6 +760,7 @@ class BaleWorldWarBot:
     async def start(self):
         """Start the bot"""
         logger.info("Starting Bale World War Bot...")
+        asyncio.create_task(self.ledger.run())
         
         # Start polling
         await self.bot.run()
@@ -746,6 +768,7 @@ class BaleWorldWarBot:
     async def stop(self):
         """Stop the bot"""
         logger.info("Stopping Bale World War Bot...")
+        self.ledger.stop()
         await self.bot.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,179 @@
+"""
+Compact Battle Replay Encoding for World War Telegram Bot
+Struct-packed rounds keyed by a per-replay unit name table, zlib compressed
+"""
+import struct
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Version 1 referred to units by catalogue position and cannot be decoded safely;
+# version 2 packed quantities into 32 bits
+REPLAY_VERSION = 3
+MAX_QUANTITY = 2 ** 64 - 1
+
+# version, unit names, rounds
+_HEADER = struct.Struct("<BHH")
+_COUNT = struct.Struct("<H")
+# unit id, quantity (per replay version)
+_UNITS = {2: struct.Struct("<HI"), 3: struct.Struct("<HQ")}
+# attacker power, defender power, loss entries
+_ROUND = struct.Struct("<ffH")
+# side (0 attacker, 1 defender), unit id, units lost (per replay version)
+_LOSSES = {2: struct.Struct("<BHI"), 3: struct.Struct("<BHQ")}
+
+def _quantity(value) -> int:
+    """Unit count clamped to what a replay can store"""
+    return min(max(0, int(value)), MAX_QUANTITY)
+
+SIDES = ("attacker", "defender")
+
+@dataclass
+class BattleRound:
+    """Single combat round of a battle"""
+    attacker_power: float
+    defender_power: float
+    losses: Dict[str, Dict[str, int]] = field(default_factory=lambda: {"attacker": {}, "defender": {}})
+
+@dataclass
+class BattleReplay:
+    """Fully decoded battle replay"""
+    attacker_units: Dict[str, int]
+    defender_units: Dict[str, int]
+    rounds: List[BattleRound]
+
+    @property
+    def casualties(self) -> Dict[str, Dict[str, int]]:
+        """Total casualties per side, summed over all rounds"""
+        casualties = {"attacker": {}, "defender": {}}
+        for battle_round in self.rounds:
+            for side in SIDES:
+                side_casualties = casualties[side]
+                for unit_name, lost in battle_round.losses.get(side, {}).items():
+                    side_casualties[unit_name] = side_casualties.get(unit_name, 0) + lost
+        return casualties
+
+class BattleLogCodec:
+    """Encode and decode battle replays.
+
+    Each replay carries its own table of the unit names it mentions, written once, and
+    rounds refer to units by their index in that table. Replays therefore decode to the
+    exact keys they were encoded with, whatever happens to the asset catalogue later.
+    """
+
+    def encode(self, attacker_units: Dict[str, int], defender_units: Dict[str, int],
+               rounds: List[BattleRound]) -> bytes:
+        """Encode a battle into a compressed replay blob"""
+        names: List[str] = []
+        ids: Dict[str, int] = {}
+
+        def unit_id(unit_name: str) -> int:
+            if unit_name not in ids:
+                ids[unit_name] = len(names)
+                names.append(unit_name)
+            return ids[unit_name]
+
+        unit_struct, loss_struct = _UNITS[REPLAY_VERSION], _LOSSES[REPLAY_VERSION]
+        body = bytearray()
+        for units in (attacker_units, defender_units):
+            body += _COUNT.pack(len(units))
+            for unit_name, quantity in units.items():
+                body += unit_struct.pack(unit_id(unit_name), _quantity(quantity))
+
+        for battle_round in rounds:
+            entries = [
+                (side_index, unit_id(unit_name), _quantity(lost))
+                for side_index, side in enumerate(SIDES)
+                for unit_name, lost in battle_round.losses.get(side, {}).items()
+                if lost > 0
+            ]
+            body += _ROUND.pack(battle_round.attacker_power, battle_round.defender_power, len(entries))
+            for entry in entries:
+                body += loss_struct.pack(*entry)
+
+        table = bytearray()
+        for unit_name in names:
+            encoded = unit_name.encode("utf-8")
+            table += _COUNT.pack(len(encoded)) + encoded
+
+        header = _HEADER.pack(REPLAY_VERSION, len(names), len(rounds))
+        return zlib.compress(header + bytes(table) + bytes(body), 9)
+
+    def decode(self, blob: bytes) -> BattleReplay:
+        """Decode a replay blob"""
+        data = zlib.decompress(blob)
+        version = data[0] if data else None
+        if version not in _UNITS:
+            raise ValueError(f"Unsupported battle replay version: {version}")
+        unit_struct, loss_struct = _UNITS[version], _LOSSES[version]
+        _, name_count, round_count = _HEADER.unpack_from(data, 0)
+        offset = _HEADER.size
+
+        names = []
+        for _ in range(name_count):
+            (length,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            names.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+
+        sides = []
+        for _ in SIDES:
+            (count,) = _COUNT.unpack_from(data, offset)
+            offset += _COUNT.size
+            units = {}
+            for unit_id, quantity in unit_struct.iter_unpack(data[offset:offset + count * unit_struct.size]):
+                units[names[unit_id]] = quantity
+            offset += count * unit_struct.size
+            sides.append(units)
+
+        rounds = []
+        for _ in range(round_count):
+            attacker_power, defender_power, entry_count = _ROUND.unpack_from(data, offset)
+            offset += _ROUND.size
+            losses = {"attacker": {}, "defender": {}}
+            entries = data[offset:offset + entry_count * loss_struct.size]
+            for side_index, unit_id, lost in loss_struct.iter_unpack(entries):
+                losses[SIDES[side_index]][names[unit_id]] = lost
+            offset += entry_count * loss_struct.size
+            rounds.append(BattleRound(attacker_power, defender_power, losses))
+
+        return BattleReplay(attacker_units=sides[0], defender_units=sides[1], rounds=rounds)
+
+class LazyBattleReplay:
+    """Replay handle that only decompresses and decodes on first access"""
+
+    def __init__(self, blob: bytes, codec: BattleLogCodec):
+        self._blob = blob
+        self._codec = codec
+        self._replay: Optional[BattleReplay] = None
+
+    @property
+    def is_decoded(self) -> bool:
+        return self._replay is not None
+
+    @property
+    def size(self) -> int:
+        """Encoded size in bytes"""
+        return len(self._blob)
+
+    def load(self) -> BattleReplay:
+        """Decode the replay (cached after the first call)"""
+        if self._replay is None:
+            self._replay = self._codec.decode(self._blob)
+        return self._replay
+
+    @property
+    def attacker_units(self) -> Dict[str, int]:
+        return self.load().attacker_units
+
+    @property
+    def defender_units(self) -> Dict[str, int]:
+        return self.load().defender_units
+
+    @property
+    def rounds(self) -> List[BattleRound]:
+        return self.load().rounds
+
+    @property
+    def casualties(self) -> Dict[str, Dict[str, int]]:
+        return self.load().casualties
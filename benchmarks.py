@@ -0,0 +1,241 @@
+"""
+Performance Benchmarks for World War Telegram Bot
+Run with: python benchmarks.py [benchmark ...]
+"""
+import dataclasses
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Constructs every static catalogue in a fresh interpreter and reports seconds spent
+_CATALOGUE_STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+from military_assets import MilitaryAssetsDatabase
+from enhanced_military_assets import EnhancedMilitaryAssetsDatabase
+from military_quiz_system import MilitaryQuizDatabase
+imported = time.perf_counter()
+MilitaryAssetsDatabase()
+EnhancedMilitaryAssetsDatabase()
+MilitaryQuizDatabase()
+print(imported - start, time.perf_counter() - imported)
+"""
+
+def _run_catalogue_startup(cache_dir: str):
+    """Run the catalogue startup script in a new process"""
+    env = dict(os.environ, CATALOGUE_CACHE_DIR=cache_dir)
+    output = subprocess.check_output(
+        [sys.executable, "-c", _CATALOGUE_STARTUP_SCRIPT], cwd=PROJECT_DIR, env=env, text=True
+    )
+    import_time, build_time = (float(value) for value in output.split())
+    return import_time, build_time
+
+def bench_catalogue_startup(runs: int = 5):
+    """Compare catalogue construction with and without the on-disk cache"""
+    print("📦 Catalogue startup (MilitaryAssets + EnhancedMilitaryAssets + Quiz)")
+    cold, warm = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cold.append(_run_catalogue_startup(cache_dir)[1])
+            warm.append(_run_catalogue_startup(cache_dir)[1])
+
+    cold_best, warm_best = min(cold) * 1000, min(warm) * 1000
+    print(f"   Build from source: {cold_best:.2f} ms")
+    print(f"   Load from cache:   {warm_best:.2f} ms")
+    print(f"   Speedup:           {cold_best / warm_best:.1f}x")
+
+    # Repeated instantiation in one process (one per bot variant) hits the memory cache
+    from military_assets import MilitaryAssetsDatabase
+    MilitaryAssetsDatabase()
+    start = time.perf_counter()
+    for _ in range(100):
+        MilitaryAssetsDatabase()
+    per_instance = (time.perf_counter() - start) / 100 * 1000
+    print(f"   Extra MilitaryAssetsDatabase instance: {per_instance:.3f} ms")
+
+def _rebuild(value, legacy: bool, legacy_classes: dict):
+    """Copy a catalogue record, optionally into the old dict-backed, list-based layout"""
+    if dataclasses.is_dataclass(value):
+        cls = type(value)
+        values = [_rebuild(getattr(value, f.name), legacy, legacy_classes) for f in dataclasses.fields(cls)]
+        if legacy:
+            if cls not in legacy_classes:
+                legacy_classes[cls] = dataclasses.make_dataclass(
+                    f"Legacy{cls.__name__}", [f.name for f in dataclasses.fields(cls)]
+                )
+            return legacy_classes[cls](*values)
+        return cls(*values)
+    if isinstance(value, tuple):
+        items = [_rebuild(item, legacy, legacy_classes) for item in value]
+        return items if legacy else tuple(items)
+    return value
+
+def _traced_size(build) -> int:
+    """Bytes still allocated by build() once it returns"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size
+
+def bench_catalogue_memory():
+    """Compare memory of slotted, frozen catalogue records with plain dataclasses"""
+    from military_assets import MilitaryAssetsDatabase
+    from enhanced_military_assets import EnhancedMilitaryAssetsDatabase
+    from military_quiz_system import MilitaryQuizDatabase
+
+    catalogues = {
+        "MilitaryAsset": list(MilitaryAssetsDatabase().assets.values()),
+        "EnhancedMilitaryAsset": list(EnhancedMilitaryAssetsDatabase().assets.values()),
+        "QuizQuestion": list(MilitaryQuizDatabase().questions.values()),
+    }
+
+    print("🧠 Catalogue record memory (records, tuples/lists and per-instance dicts)")
+    total_legacy = total_compact = 0
+    for name, records in catalogues.items():
+        legacy_classes = {}
+        _rebuild(records[0], True, legacy_classes)  # create legacy classes outside the trace
+        legacy = _traced_size(lambda: [_rebuild(r, True, legacy_classes) for r in records])
+        compact = _traced_size(lambda: [_rebuild(r, False, legacy_classes) for r in records])
+        total_legacy += legacy
+        total_compact += compact
+        print(f"   {name:<22} {len(records):>4} records: "
+              f"{legacy / 1024:8.1f} KiB -> {compact / 1024:8.1f} KiB")
+    print(f"   {'Total':<35} {total_legacy / 1024:8.1f} KiB -> {total_compact / 1024:8.1f} KiB "
+          f"({100 * (1 - total_compact / total_legacy):.0f}% smaller)")
+
+def bench_order_matching(orders: int = 50_000):
+    """Measure matching engine throughput and batched persistence of the results"""
+    from database import DatabaseManager, Player
+    from ledger import Ledger
+    from order_book import MatchingEngine, OrderBookStore, BUY, SELL
+
+    rng = random.Random(42)
+    materials = ["iron", "oil", "steel", "copper"]
+    flow = []
+    for _ in range(orders):
+        side = BUY if rng.random() < 0.5 else SELL
+        # Slightly crossing prices so roughly half of the orders trade
+        price = round(rng.gauss(10.0 + (0.2 if side == BUY else -0.2), 0.5), 2)
+        flow.append((rng.randrange(1, 201), rng.choice(materials), side,
+                     rng.random() < 0.1, max(price, 0.01), rng.randint(1, 100)))
+
+    engine = MatchingEngine()
+    start = time.perf_counter()
+    for player_id, material, side, is_market, price, quantity in flow:
+        if is_market:
+            engine.submit_market(player_id, material, side, quantity)
+        else:
+            engine.submit_limit(player_id, material, side, price, quantity)
+    elapsed = time.perf_counter() - start
+    new_orders, updated_orders, fills = engine.drain()
+
+    print(f"📈 Order matching ({orders:,} orders over {len(materials)} materials)")
+    print(f"   Matching:       {orders / elapsed:,.0f} orders/s ({len(fills):,} fills, "
+          f"{len(engine.open_orders):,} resting)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.create_tables()
+        with db.get_session() as session:
+            session.add_all(Player(id=i, telegram_id=i, gold=1e9) for i in range(1, 201))
+            session.commit()
+        start = time.perf_counter()
+        OrderBookStore(db, Ledger(db)).flush(new_orders, updated_orders, fills)
+        flush_time = time.perf_counter() - start
+    print(f"   Batched flush:  {flush_time * 1000:.0f} ms for {len(new_orders):,} orders, "
+          f"{len(fills):,} fills ({orders / flush_time:,.0f} orders/s)")
+
+def bench_simulation(hours: int = 168):
+    """Measure headless simulation throughput over a week of game time"""
+    from simulation import simulate
+
+    print(f"🌍 Headless simulation ({hours} game hours)")
+    print(simulate(hours, seed=42).summary())
+
+def bench_quest_generation(per_type: int = 200, levels: int = 10):
+    """Measure batch quest generation against the per-quest existence-check loop it replaced"""
+    from database import DatabaseManager, Quest
+    from quest_system import QuestManager
+
+    manager = QuestManager(rng=random.Random(42))
+    total = per_type * levels * len(manager.quest_templates)
+    print(f"📜 Quest generation ({total:,} quests: {per_type} per type x {levels} levels)")
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        db.create_tables()
+        manager.db = db
+
+        start = time.perf_counter()
+        with db.get_session() as session:
+            for quest_type in manager.quest_templates:
+                for level in range(1, levels + 1):
+                    for _ in range(per_type):
+                        quest = manager.generate_random_quest(quest_type, level)
+                        if not session.query(Quest).filter_by(title=quest.title, quest_type=quest_type).first():
+                            session.add(quest)
+            session.commit()
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        created = manager.generate_daily_quests(per_type, list(range(1, levels + 1)))
+        batch = time.perf_counter() - start
+    print(f"   Per-quest loop: {legacy * 1000:.0f} ms (title collisions leave few new quests)")
+    print(f"   Batch:          {batch * 1000:.0f} ms for {created:,} quests ({created / batch:,.0f} quests/s)")
+
+def bench_quiz_leaderboard(results: int = 100_000, users: int = 5_000):
+    """Compare heap-based leaderboards with the append, sort and slice update they replaced"""
+    from types import SimpleNamespace
+    from datetime import datetime, timedelta
+    from quiz_leaderboard import QuizLeaderboards
+
+    rng = random.Random(42)
+    start_time = datetime(2024, 1, 1)
+    stream = [SimpleNamespace(user_id=rng.randrange(users), score=rng.randrange(10_000), accuracy=50.0,
+                              rank="Advanced", category=None, timestamp=start_time + timedelta(minutes=i))
+              for i in range(results)]
+    print(f"🏆 Quiz leaderboard ({results:,} results from {users:,} users)")
+
+    start = time.perf_counter()
+    board = []
+    for result in stream:
+        board.append({"user_id": result.user_id, "score": result.score, "accuracy": result.accuracy,
+                      "rank": result.rank, "timestamp": result.timestamp})
+        board.sort(key=lambda x: x["score"], reverse=True)
+        board = board[:100]
+    legacy = time.perf_counter() - start
+
+    start = time.perf_counter()
+    boards = QuizLeaderboards()
+    for result in stream:
+        boards.add(result)
+    heap = time.perf_counter() - start
+    print(f"   Sort and slice: {legacy * 1000:.0f} ms (one board)")
+    print(f"   Heap:           {heap * 1000:.0f} ms (all-time, daily and weekly boards)")
+
+BENCHMARKS = {
+    "catalogue_startup": bench_catalogue_startup,
+    "catalogue_memory": bench_catalogue_memory,
+    "order_matching": bench_order_matching,
+    "simulation": bench_simulation,
+    "quest_generation": bench_quest_generation,
+    "quiz_leaderboard": bench_quiz_leaderboard,
+}
+
+def main(names):
+    for name in names or BENCHMARKS:
+        if name not in BENCHMARKS:
+            print(f"❌ Unknown benchmark: {name} (available: {', '.join(BENCHMARKS)})")
+            continue
+        BENCHMARKS[name]()
+        print()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -15,8 +15,11 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
+from catalogue_cache import freeze_loaded_catalogues
 from database import DatabaseManager, Player, Nation, Province, PlayerMaterial, PlayerUnit
-from economy import EconomyManager, TradeManager, DailyIncomeManager
+from economy import EconomyManager, TradeManager, DailyIncomeManager, MarketAnalysis
+from ledger import Ledger, opening_entries
+from order_book import MarketExchange
 from military import MilitaryManager, UnitUpkeepManager
 from military_assets import MilitaryAssetsDatabase
 from province_manager import ProvinceManager
@@ -46,22 +49,34 @@ class WorldWarBot:
         
         # Initialize managers
         self.db_manager = DatabaseManager(self.config["database"]["url"])
+        self.ledger = Ledger(self.db_manager)
+        self.technology = TechnologyManager()
+        self.technology.db = self.db_manager  # Set database reference
         self.economy = EconomyManager(self.config["economy"])
-        self.trade_manager = TradeManager(self.db_manager, self.economy)
-        self.daily_income = DailyIncomeManager(self.db_manager, self.config["game"])
+        self.market_analysis = MarketAnalysis(self.economy)
+        self.trade_manager = TradeManager(self.db_manager, self.economy, self.ledger)
+        self.exchange = MarketExchange(self.db_manager, self.economy, ledger=self.ledger)
+        self.daily_income = DailyIncomeManager(self.db_manager, self.config["game"], self.ledger,
+                                               self.technology.modifiers)
         self.military = MilitaryManager(self.config["military"])
         self.military.db = self.db_manager  # Set database reference
-        self.unit_upkeep = UnitUpkeepManager(self.db_manager, self.config["military"])
+        self.military.ledger = self.ledger
+        self.military.modifiers = self.technology.modifiers
+        self.unit_upkeep = UnitUpkeepManager(self.db_manager, self.config["military"], self.ledger)
         self.province_manager = ProvinceManager()
         self.province_manager.db = self.db_manager  # Set database reference
+        self.province_manager.ledger = self.ledger
+        self.province_manager.modifiers = self.technology.modifiers
         self.quest_manager = QuestManager()
         self.quest_manager.db = self.db_manager  # Set database reference
-        self.technology = TechnologyManager()
-        self.technology.db = self.db_manager  # Set database reference
+        self.quest_manager.ledger = self.ledger
+        self.quest_manager.on_notify = self.send_quest_notifications
+        self.military.on_units_changed = self.quest_manager.player_changed
         self.world_simulator = WorldSimulator(self.config["world"])
         self.world_simulator.db = self.db_manager  # Set database reference
         self.admin = AdminManager(self.config["bot"]["admin_ids"])
         self.admin.db = self.db_manager  # Set database reference
+        self.admin.ledger = self.ledger
         self.ui = UIManager()
         
         # Game state
@@ -137,6 +152,7 @@ class WorldWarBot:
                 session.commit()
                 
                 # Initialize player materials
+                starting_materials = {}
                 for material in self.config["economy"]["materials"]:
                     player_material = PlayerMaterial(
                         player_id=player.id,
@@ -144,7 +160,10 @@ class WorldWarBot:
                         quantity=100.0  # Starting materials
                     )
                     session.add(player_material)
+                    starting_materials[material] = player_material.quantity
                 
+                # Opening balances, so the player's account can be rebuilt from the ledger
+                self.ledger.record(session, opening_entries(player.id, player.gold, starting_materials))
                 session.commit()
                 
                 welcome_text = f"""
@@ -330,6 +349,7 @@ Use inline keyboards for easy navigation!
             
             # Get current market prices
             prices = self.economy.get_current_prices()
+            trends = self.market_analysis.get_market_trends()
             
             economy_text = f"""
 💰 **Economic Overview**
@@ -338,7 +358,12 @@ Use inline keyboards for easy navigation!
 """
             for material, price_info in prices.items():
                 emoji = {"iron": "🛠️", "oil": "⛽", "food": "🌾", "gold": "🥇", "uranium": "☢️", "steel": "🔩"}.get(material, "📦")
-                economy_text += f"{emoji} {material.title()}: {price_info['price']:.2f} gold/unit\n"
+                economy_text += f"{emoji} {material.title()}: {price_info['price']:.2f} gold/unit"
+                if material in trends:
+                    trend = trends[material]
+                    arrow = {"up": "📈", "down": "📉"}.get(trend["trend"], "➖")
+                    economy_text += f" {arrow} {trend['change_percent']:+.1f}% ({trend['recommendation']})"
+                economy_text += "\n"
             
             economy_text += f"""
 **💼 Your Resources:**
@@ -442,10 +467,7 @@ Use /trade to buy and sell resources!
             assets_text += f"⭐ **Tiers:** 1-10\n\n"
             
             # Show tier distribution
-            tier_counts = {}
-            for asset in assets_db.assets.values():
-                tier = asset.tier
-                tier_counts[tier] = tier_counts.get(tier, 0) + 1
+            tier_counts = assets_db.get_tier_counts()
             
             assets_text += "**Tier Distribution:**\n"
             for tier in sorted(tier_counts.keys()):
@@ -780,13 +802,63 @@ Use /trade to buy and sell resources!
         await callback_query.message.answer(f"💼 Selling {material} - Feature coming soon!")
     
     async def show_market(self, callback_query: CallbackQuery):
-        await callback_query.message.answer("📈 Market Overview - Feature coming soon!")
+        page = self.trade_manager.get_market_page(sort="price")
+        if not page.listings:
+            await callback_query.message.answer("📈 **Market Overview**\n\nNo open trades right now.", parse_mode="Markdown")
+            return
+        
+        text = "📈 **Market Overview** (cheapest first)\n\n"
+        for listing in page.listings:
+            text += f"#{listing.id} {listing.material_type.title()}: {listing.quantity:,.0f} units @ {listing.price_per_unit:.2f} gold\n"
+        if page.next_cursor:
+            text += "\n... more offers available"
+        await callback_query.message.answer(text, parse_mode="Markdown")
     
     async def show_available_quests(self, callback_query: CallbackQuery):
-        await callback_query.message.answer("🎯 Available Quests - Feature coming soon!")
+        with self.db_manager.get_session() as session:
+            player_id = session.query(Player.id).filter_by(telegram_id=callback_query.from_user.id).scalar()
+        if not player_id:
+            await callback_query.message.answer("❌ You need to start the game first with /start")
+            return
+        
+        quests = self.quest_manager.get_available_quests(player_id)
+        if not quests:
+            await callback_query.message.answer("🎯 **Available Quests**\n\n❌ No missions for you right now. Check back after the next rotation!", parse_mode="Markdown")
+            return
+        
+        text = "🎯 **Available Quests**\n\n"
+        builder = InlineKeyboardBuilder()
+        for quest in quests:
+            rewards = quest.rewards or {}
+            text += f"**{quest.title}** ({quest.quest_type.title()}, difficulty {quest.difficulty})\n"
+            text += f"Reward: {rewards.get('gold', 0):,} gold, {rewards.get('experience', 0):,} XP\n\n"
+            builder.add(InlineKeyboardButton(text=f"Accept: {quest.title}", callback_data=f"game_quest_accept_{quest.id}"))
+        builder.adjust(1)
+        await callback_query.message.answer(text, reply_markup=builder.as_markup(), parse_mode="Markdown")
     
     async def accept_quest(self, callback_query: CallbackQuery, quest_id: int):
-        await callback_query.message.answer(f"✅ Quest {quest_id} accepted - Feature coming soon!")
+        with self.db_manager.get_session() as session:
+            player_id = session.query(Player.id).filter_by(telegram_id=callback_query.from_user.id).scalar()
+        if not player_id:
+            await callback_query.message.answer("❌ You need to start the game first with /start")
+            return
+        
+        accepted, reason = self.quest_manager.eligibility.accept(player_id, quest_id)
+        if accepted:
+            await callback_query.message.answer(f"✅ Quest {quest_id} accepted! Check /missions for progress.")
+        else:
+            await callback_query.message.answer(f"❌ {reason}")
+    
+    def send_quest_notifications(self, notifications):
+        """Tell players about completed and expired quests"""
+        for notification in notifications:
+            if not notification.telegram_id:
+                continue
+            if notification.status == "completed":
+                text = f"🏆 Mission **{notification.title}** completed! Rewards have been added to your account."
+            else:
+                text = f"⌛ Mission **{notification.title}** expired before it was completed."
+            asyncio.create_task(self.bot.send_message(notification.telegram_id, text, parse_mode="Markdown"))
     
     async def show_available_research(self, callback_query: CallbackQuery):
         await callback_query.message.answer("🔬 Available Research - Feature coming soon!")
@@ -826,12 +898,24 @@ Use /trade to buy and sell resources!
         
         # Initialize database
         await self.db_manager.init_database()
+        self.exchange.load()
+        self.trade_manager.expiry.load()
+        self.quest_manager.timers.load()
+        self.technology.load_research_state()
+        freeze_loaded_catalogues()
         
         # Start background tasks
+        asyncio.create_task(self.ledger.run())
+        asyncio.create_task(self.quest_manager.board.run())
+        asyncio.create_task(self.quest_manager.timers.run())
+        asyncio.create_task(self.technology.research.run())
         asyncio.create_task(self.world_simulator.run())
         asyncio.create_task(self.economy.update_prices_loop())
+        asyncio.create_task(self.exchange.flush_loop())
+        asyncio.create_task(self.trade_manager.expiry.run())
         asyncio.create_task(self.daily_income_loop())
         asyncio.create_task(self.unit_upkeep_loop())
+        asyncio.create_task(self.quest_generation_loop())
         
         # Start polling
         await self.dp.start_polling(self.bot)
@@ -858,11 +942,30 @@ Use /trade to buy and sell resources!
                 logger.error(f"Error processing unit upkeep: {e}")
                 await asyncio.sleep(300)  # Wait 5 minutes before retrying
     
+    async def quest_generation_loop(self):
+        """Background task generating each day's quests for the levels players are at"""
+        while True:
+            try:
+                with self.db_manager.get_session() as session:
+                    levels = [level for (level,) in session.query(Player.level).distinct()]
+                created = self.quest_manager.generate_daily_quests(levels=levels or None)
+                logger.info(f"Generated {created} daily quests")
+                await asyncio.sleep(86400)  # Wait 1 day
+            except Exception as e:
+                logger.error(f"Error generating daily quests: {e}")
+                await asyncio.sleep(300)  # Wait 5 minutes before retrying
+    
     async def stop(self):
         """Stop the bot"""
         logger.info("Stopping World War Bot...")
         self.economy.stop()
+        self.exchange.stop()
+        self.trade_manager.expiry.stop()
         self.world_simulator.stop()
+        self.quest_manager.board.stop()
+        self.quest_manager.timers.stop()
+        self.technology.research.stop()
+        self.ledger.stop()
         await self.bot.session.close()
 
 if __name__ == "__main__":
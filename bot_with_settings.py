@@ -16,6 +16,7 @@ from bot_settings import BotSettingsManager, NotificationManager, LanguageManage
 from settings_ui import SettingsUIManager
 from admin_panel import AdminPanel
 from monitoring_analytics import UserAnalytics, AnalyticsDashboard
+from catalogue_cache import freeze_loaded_catalogues
 from database import DatabaseManager
 from military_assets import MilitaryAssetsDatabase
 
@@ -516,6 +517,8 @@ class EnhancedWorldWarBot:
     async def start(self):
         """Start the enhanced bot"""
         try:
+            freeze_loaded_catalogues()
+            
             # Start background tasks
             await self.start_background_tasks()
             
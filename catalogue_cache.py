@@ -0,0 +1,95 @@
+"""
+Catalogue Loader for World War Telegram Bot
+Builds static catalogues once, caches them on disk keyed by a hash of their source
+"""
+import gc
+import hashlib
+import logging
+import os
+import pickle
+import sys
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get(
+    "CATALOGUE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalogue_cache")
+)
+
+# Catalogues already loaded in this process, keyed by (name, source hash)
+_loaded: Dict[Tuple[str, str], Any] = {}
+
+def source_hash(sources: List[str]) -> str:
+    """Hash catalogue source files together with the cache format and Python version"""
+    digest = hashlib.sha256()
+    digest.update(f"{CACHE_FORMAT_VERSION}:{sys.version_info[:2]}".encode())
+    for path in sources:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def load_catalogue(name: str, sources: List[str], builder: Callable[[], Any],
+                   cache_dir: Optional[str] = None) -> Any:
+    """Load a catalogue from memory or the on-disk cache, building it on a miss.
+
+    The result is shared by every caller in the process and must be treated as read-only.
+    """
+    key = source_hash(sources)
+    catalogue = _loaded.get((name, key))
+    if catalogue is not None:
+        return catalogue
+
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    path = os.path.join(cache_dir, f"{name}-{key[:16]}.pickle")
+    catalogue = _read_cache(path)
+    if catalogue is None:
+        catalogue = builder()
+        # Classes defined in a script run as __main__ can't be unpickled elsewhere
+        if getattr(builder, "__module__", None) != "__main__":
+            _write_cache(cache_dir, name, path, catalogue)
+
+    _loaded[(name, key)] = catalogue
+    return catalogue
+
+def clear_loaded_catalogues():
+    """Forget catalogues loaded in this process (the on-disk cache is kept)"""
+    _loaded.clear()
+
+def freeze_loaded_catalogues():
+    """Exclude everything loaded so far from garbage collection (called once startup is done).
+
+    Frozen objects are never traversed by the collector, so full collections skip the
+    catalogues, and workers forked later share their pages copy-on-write instead of
+    dirtying them on every collection.
+    """
+    gc.collect()
+    gc.freeze()
+
+def _read_cache(path: str) -> Any:
+    """Read a cached catalogue, returning None on a miss or unreadable file"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable catalogue cache {path}: {e}")
+        return None
+
+def _write_cache(cache_dir: str, name: str, path: str, catalogue: Any):
+    """Write a catalogue cache atomically and drop stale versions"""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(catalogue, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        current = os.path.basename(path)
+        for filename in os.listdir(cache_dir):
+            if filename.startswith(f"{name}-") and filename.endswith(".pickle") and filename != current:
+                os.remove(os.path.join(cache_dir, filename))
+    except OSError as e:
+        logger.warning(f"Could not write catalogue cache {path}: {e}")
@@ -3,7 +3,7 @@ Complex Resource Management System
 Multiple currencies with realistic economic mechanics
 """
 
-import random
+import itertools
 import time
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
@@ -12,6 +12,12 @@ from enum import Enum
 import json
 import os
 
+import numpy as np
+
+from database import DatabaseManager
+from price_engine import PriceEngine
+from resource_ledger import ResourceLedger
+
 class ResourceType(Enum):
     GOLD = "gold"
     OIL = "oil"
@@ -29,6 +35,9 @@ class ResourceType(Enum):
     AMMUNITION = "ammunition"
     MEDICAL_SUPPLIES = "medical_supplies"
 
+# Column of each resource type in per-user balance arrays
+RESOURCE_ORDINALS = {resource_type: i for i, resource_type in enumerate(ResourceType)}
+
 class ResourceCategory(Enum):
     BASIC = "basic"          # Gold, Food, Water
     INDUSTRIAL = "industrial"  # Oil, Iron, Energy, Materials
@@ -77,23 +86,19 @@ class ResourceTransaction:
     timestamp: datetime
     description: str
 
-@dataclass
-class ResourceStorage:
-    """Player resource storage"""
-    user_id: int
-    resources: Dict[ResourceType, float]
-    storage_capacity: Dict[ResourceType, float]
-    last_updated: datetime
-
 class ComplexResourceManager:
     """Advanced resource management system"""
     
-    def __init__(self, database_manager):
+    def __init__(self, database_manager, price_engine: Optional[PriceEngine] = None,
+                 ledger: Optional[ResourceLedger] = None):
         self.db_manager = database_manager
+        self.price_engine = price_engine or PriceEngine()
         self.resources: Dict[ResourceType, Resource] = {}
         self.prices: Dict[ResourceType, ResourcePrice] = {}
-        self.transactions: List[ResourceTransaction] = []
-        self.storage: Dict[int, ResourceStorage] = {}
+        self.ledger = ledger or ResourceLedger(
+            len(ResourceType), database_manager if isinstance(database_manager, DatabaseManager) else None
+        )
+        self._transaction_ids = itertools.count(1)
         self.market_events: List[Dict] = []
         self._initialize_resources()
         self._initialize_prices()
@@ -342,65 +347,60 @@ class ComplexResourceManager:
     
     def _initialize_prices(self):
         """Initialize resource prices"""
-        for resource_type, resource in self.resources.items():
-            price = resource.base_value * random.uniform(0.8, 1.2)
+        resource_types = list(self.resources.keys())
+        resources = list(self.resources.values())
+        base = np.array([resource.base_value for resource in resources])
+        volatility = np.array([resource.volatility for resource in resources])
+        rng = self.price_engine.rng
+        
+        # Supply/demand pressure, uniform noise and market events, within each resource's limits
+        self._price_slice = self.price_engine.register(
+            resource_types,
+            prices=base * rng.uniform(0.8, 1.2, len(resources)),
+            base=base,
+            min_price=[resource.min_price for resource in resources],
+            max_price=[resource.max_price for resource in resources],
+            uniform_scale=volatility * 0.05,
+            supply_demand_scale=volatility * 0.1,
+            demand=rng.uniform(0.3, 0.7, len(resources)),
+            supply=rng.uniform(0.3, 0.7, len(resources))
+        )
+        now = datetime.now()
+        for resource_type in resource_types:
             self.prices[resource_type] = ResourcePrice(
-                resource_type=resource_type,
-                price=price,
-                change=0.0,
-                change_percent=0.0,
-                timestamp=datetime.now(),
-                demand=random.uniform(0.3, 0.7),
-                supply=random.uniform(0.3, 0.7)
+                resource_type=resource_type, price=0.0, change=0.0, change_percent=0.0,
+                timestamp=now, demand=0.0, supply=0.0
             )
+        self._sync_prices(now)
     
     def update_prices(self):
         """Update all resource prices based on market conditions"""
-        for resource_type, resource in self.resources.items():
-            price_data = self.prices[resource_type]
-            
-            # Calculate price change based on supply and demand
-            supply_demand_ratio = price_data.supply / max(price_data.demand, 0.1)
-            
-            # Base price change
-            base_change = (supply_demand_ratio - 1) * resource.volatility * 0.1
-            
-            # Add random volatility
-            random_change = random.uniform(-resource.volatility, resource.volatility) * 0.05
-            
-            # Add market events impact
-            event_impact = self._calculate_event_impact(resource_type)
-            
-            # Calculate new price
-            total_change = base_change + random_change + event_impact
-            new_price = price_data.price * (1 + total_change)
-            
-            # Apply price limits
-            new_price = max(resource.min_price, min(resource.max_price, new_price))
-            
-            # Update price data
-            old_price = price_data.price
-            price_data.price = new_price
-            price_data.change = new_price - old_price
-            price_data.change_percent = (price_data.change / old_price) * 100 if old_price > 0 else 0
-            price_data.timestamp = datetime.now()
-            
-            # Update supply and demand
-            price_data.demand = max(0.1, min(1.0, price_data.demand + random.uniform(-0.1, 0.1)))
-            price_data.supply = max(0.1, min(1.0, price_data.supply + random.uniform(-0.1, 0.1)))
+        now = datetime.now()
+        self.price_engine.step(self._price_slice, now)
+        self._sync_prices(now)
+    
+    def _sync_prices(self, timestamp: datetime):
+        """Copy the price engine's arrays into the ResourcePrice records"""
+        engine, group = self.price_engine, self._price_slice
+        prices = engine.prices[group]
+        previous = engine.previous[group]
+        change = prices - previous
+        change_percent = np.divide(change * 100, previous, out=np.zeros_like(change), where=previous > 0)
+        
+        for price_data, price, delta, percent, demand, supply in zip(
+            self.prices.values(), prices.tolist(), change.tolist(), change_percent.tolist(),
+            engine.demand[group].tolist(), engine.supply[group].tolist()
+        ):
+            price_data.price = price
+            price_data.change = delta
+            price_data.change_percent = percent
+            price_data.timestamp = timestamp
+            price_data.demand = demand
+            price_data.supply = supply
     
     def _calculate_event_impact(self, resource_type: ResourceType) -> float:
         """Calculate impact of market events on resource price"""
-        impact = 0.0
-        
-        for event in self.market_events:
-            if event["expires"] < datetime.now():
-                continue
-            
-            if resource_type in event["affected_resources"]:
-                impact += event["impact"] * event["intensity"]
-        
-        return impact
+        return float(self.price_engine.event_impact[self.price_engine.index[resource_type]])
     
     def create_market_event(self, event_type: str, description: str, 
                            affected_resources: List[ResourceType], 
@@ -417,10 +417,15 @@ class ComplexResourceManager:
         }
         
         self.market_events.append(event)
+        self.price_engine.add_event(affected_resources, impact * intensity, event["expires"], event_type=event_type)
         
         # Remove expired events
         self.market_events = [e for e in self.market_events if e["expires"] > datetime.now()]
     
+    def get_market_events(self, resource_type: ResourceType) -> List[Dict]:
+        """Get active market events affecting a resource"""
+        return self.price_engine.get_events(resource_type)
+    
     def get_resource_price(self, resource_type: ResourceType) -> ResourcePrice:
         """Get current price of a resource"""
         return self.prices.get(resource_type)
@@ -439,8 +444,7 @@ class ComplexResourceManager:
         total_cost = amount * price_data.price
         
         # Check if user has enough gold
-        user_storage = self._get_user_storage(user_id)
-        if user_storage.resources.get(ResourceType.GOLD, 0) < total_cost:
+        if self._balance(user_id, ResourceType.GOLD) < total_cost:
             return False, "Insufficient gold", 0.0
         
         # Check storage capacity
@@ -448,8 +452,8 @@ class ComplexResourceManager:
             return False, "Insufficient storage capacity", 0.0
         
         # Execute transaction
-        user_storage.resources[ResourceType.GOLD] -= total_cost
-        user_storage.resources[resource_type] = user_storage.resources.get(resource_type, 0) + amount
+        self.ledger.add(user_id, RESOURCE_ORDINALS[ResourceType.GOLD], -total_cost)
+        self.ledger.add(user_id, RESOURCE_ORDINALS[resource_type], amount)
         
         # Record transaction
         self._record_transaction(user_id, resource_type, amount, price_data.price, 
@@ -467,13 +471,12 @@ class ComplexResourceManager:
         total_earnings = amount * price_data.price
         
         # Check if user has enough resources
-        user_storage = self._get_user_storage(user_id)
-        if user_storage.resources.get(resource_type, 0) < amount:
+        if self._balance(user_id, resource_type) < amount:
             return False, "Insufficient resources", 0.0
         
         # Execute transaction
-        user_storage.resources[resource_type] -= amount
-        user_storage.resources[ResourceType.GOLD] = user_storage.resources.get(ResourceType.GOLD, 0) + total_earnings
+        self.ledger.add(user_id, RESOURCE_ORDINALS[resource_type], -amount)
+        self.ledger.add(user_id, RESOURCE_ORDINALS[ResourceType.GOLD], total_earnings)
         
         # Record transaction
         self._record_transaction(user_id, resource_type, amount, price_data.price, 
@@ -495,8 +498,7 @@ class ComplexResourceManager:
         received_amount = amount * exchange_rate
         
         # Check if user has enough resources
-        user_storage = self._get_user_storage(user_id)
-        if user_storage.resources.get(from_resource, 0) < amount:
+        if self._balance(user_id, from_resource) < amount:
             return False, "Insufficient resources", 0.0
         
         # Check storage capacity
@@ -504,8 +506,8 @@ class ComplexResourceManager:
             return False, "Insufficient storage capacity", 0.0
         
         # Execute trade
-        user_storage.resources[from_resource] -= amount
-        user_storage.resources[to_resource] = user_storage.resources.get(to_resource, 0) + received_amount
+        self.ledger.add(user_id, RESOURCE_ORDINALS[from_resource], -amount)
+        self.ledger.add(user_id, RESOURCE_ORDINALS[to_resource], received_amount)
         
         # Record transaction
         self._record_transaction(user_id, from_resource, amount, from_price, 
@@ -514,32 +516,22 @@ class ComplexResourceManager:
         
         return True, "Trade successful", received_amount
     
-    def _get_user_storage(self, user_id: int) -> ResourceStorage:
-        """Get or create user storage"""
-        if user_id not in self.storage:
-            self.storage[user_id] = ResourceStorage(
-                user_id=user_id,
-                resources={},
-                storage_capacity={},
-                last_updated=datetime.now()
-            )
-        return self.storage[user_id]
+    def _balance(self, user_id: int, resource_type: ResourceType) -> float:
+        """Get a user's balance of one resource"""
+        return self.ledger.get(user_id, RESOURCE_ORDINALS[resource_type])
     
     def _check_storage_capacity(self, user_id: int, resource_type: ResourceType, 
                                amount: float) -> bool:
         """Check if user has enough storage capacity"""
-        user_storage = self._get_user_storage(user_id)
-        current_amount = user_storage.resources.get(resource_type, 0)
-        capacity = user_storage.storage_capacity.get(resource_type, 1000.0)  # Default capacity
-        
-        return current_amount + amount <= capacity
+        ordinal = RESOURCE_ORDINALS[resource_type]
+        return self.ledger.get(user_id, ordinal) + amount <= self.ledger.capacity(user_id, ordinal)
     
     def _record_transaction(self, user_id: int, resource_type: ResourceType, 
                            amount: float, price: float, total_cost: float, 
                            transaction_type: str, description: str):
         """Record a resource transaction"""
         transaction = ResourceTransaction(
-            transaction_id=f"txn_{user_id}_{int(time.time())}",
+            transaction_id=f"txn_{user_id}_{int(time.time())}_{next(self._transaction_ids)}",
             user_id=user_id,
             resource_type=resource_type,
             amount=amount,
@@ -550,22 +542,29 @@ class ComplexResourceManager:
             description=description
         )
         
-        self.transactions.append(transaction)
-        
-        # Keep only last 1000 transactions
-        if len(self.transactions) > 1000:
-            self.transactions = self.transactions[-1000:]
+        self.ledger.log.append(transaction)
+        # Without the bot's flush loop, changes are written before the call returns
+        if not self.ledger.is_running:
+            self.ledger.flush()
+    
+    @property
+    def transactions(self) -> List[ResourceTransaction]:
+        """Recent transactions, oldest first"""
+        return list(self.ledger.log.entries)
+    
+    def get_user_transactions(self, user_id: int, limit: int = 10) -> List[ResourceTransaction]:
+        """Get a user's most recent transactions, newest first"""
+        return self.ledger.log.recent(limit, user_id)
     
     def get_user_resources(self, user_id: int) -> Dict[ResourceType, float]:
         """Get user's current resources"""
-        user_storage = self._get_user_storage(user_id)
-        return user_storage.resources.copy()
+        balances = self.ledger.snapshot(user_id)
+        return {resource_type: float(balances[i]) for resource_type, i in RESOURCE_ORDINALS.items() if balances[i]}
     
     def add_resource(self, user_id: int, resource_type: ResourceType, amount: float, 
                     source: str = "earned"):
         """Add resources to user (e.g., from quests, daily income)"""
-        user_storage = self._get_user_storage(user_id)
-        user_storage.resources[resource_type] = user_storage.resources.get(resource_type, 0) + amount
+        self.ledger.add(user_id, RESOURCE_ORDINALS[resource_type], amount)
         
         # Record transaction
         price = self.prices[resource_type].price if resource_type in self.prices else 0
@@ -575,12 +574,10 @@ class ComplexResourceManager:
     def spend_resource(self, user_id: int, resource_type: ResourceType, amount: float, 
                       purpose: str = "spent"):
         """Spend resources (e.g., for building, research)"""
-        user_storage = self._get_user_storage(user_id)
-        
-        if user_storage.resources.get(resource_type, 0) < amount:
+        if self._balance(user_id, resource_type) < amount:
             return False, "Insufficient resources"
         
-        user_storage.resources[resource_type] -= amount
+        self.ledger.add(user_id, RESOURCE_ORDINALS[resource_type], -amount)
         
         # Record transaction
         price = self.prices[resource_type].price if resource_type in self.prices else 0
@@ -4,9 +4,9 @@ Database models and configuration for World War Telegram Bot
 import json
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, JSON, LargeBinary, Index
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
 
@@ -104,6 +104,14 @@ class PlayerMaterial(Base):
     # Relationships
     player = relationship("Player", back_populates="materials")
 
+class ResourceBalance(Base):
+    __tablename__ = "resource_balances"
+    
+    user_id = Column(Integer, primary_key=True)  # Telegram user id used by ComplexResourceManager
+    balances = Column(LargeBinary, nullable=False)  # float64 per ResourceType ordinal
+    capacities = Column(LargeBinary, nullable=False)  # float64 per ResourceType ordinal
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
 class PlayerUnit(Base):
     __tablename__ = "player_units"
     
@@ -209,6 +217,7 @@ class Trade(Base):
     buyer_id = Column(Integer, ForeignKey("players.id"))
     material_type = Column(String(50), nullable=False)
     quantity = Column(Float, nullable=False)
+    escrow_quantity = Column(Float, default=0.0)  # Materials held from the seller while open
     price_per_unit = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
     status = Column(String(50), default="open")  # open, completed, cancelled, expired
@@ -219,6 +228,44 @@ class Trade(Base):
     # Relationships
     seller = relationship("Player", foreign_keys=[seller_id], back_populates="trades")
     buyer = relationship("Player", foreign_keys=[buyer_id], back_populates="trades_received")
+    
+    # Keyset pagination of open listings by price and by age
+    __table_args__ = (
+        Index("ix_trades_listing_price", "status", "material_type", "price_per_unit", "id"),
+        Index("ix_trades_listing_age", "status", "material_type", "created_at", "id"),
+    )
+
+class MarketOrder(Base):
+    __tablename__ = "market_orders"
+    
+    id = Column(Integer, primary_key=True)  # Assigned by the matching engine
+    player_id = Column(Integer, ForeignKey("players.id"), nullable=False)
+    material_type = Column(String(50), nullable=False, index=True)
+    side = Column(String(10), nullable=False)  # buy, sell
+    order_type = Column(String(10), default="limit")  # limit, market
+    price = Column(Float)  # Limit price, None for market orders
+    quantity = Column(Float, nullable=False)
+    remaining = Column(Float, nullable=False)
+    sequence = Column(Integer, nullable=False)  # Time priority within a price level
+    status = Column(String(20), default="open", index=True)  # open, filled, cancelled
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    # Relationships
+    player = relationship("Player")
+
+class MarketFill(Base):
+    __tablename__ = "market_fills"
+    
+    id = Column(Integer, primary_key=True)
+    buy_order_id = Column(Integer, ForeignKey("market_orders.id"), nullable=False)
+    sell_order_id = Column(Integer, ForeignKey("market_orders.id"), nullable=False)
+    buyer_id = Column(Integer, ForeignKey("players.id"), nullable=False)
+    seller_id = Column(Integer, ForeignKey("players.id"), nullable=False)
+    material_type = Column(String(50), nullable=False)
+    price = Column(Float, nullable=False)
+    quantity = Column(Float, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class Battle(Base):
     __tablename__ = "battles"
@@ -229,11 +276,19 @@ class Battle(Base):
     province_id = Column(Integer, ForeignKey("provinces.id"), nullable=False)
     battle_type = Column(String(50), default="attack")  # attack, defense, raid
     status = Column(String(50), default="ongoing")  # ongoing, completed, cancelled
-    attacker_units = Column(JSON, default=dict)
-    defender_units = Column(JSON, default=dict)
-    battle_log = Column(JSON, default=list)
+    attacker_units = deferred(Column(JSON, default=dict))  # Legacy, superseded by replay
+    defender_units = deferred(Column(JSON, default=dict))  # Legacy, superseded by replay
+    battle_log = deferred(Column(JSON, default=list))  # Legacy, superseded by replay
     winner_id = Column(Integer, ForeignKey("players.id"))
-    casualties = Column(JSON, default=dict)
+    casualties = deferred(Column(JSON, default=dict))  # Legacy, superseded by replay
+    
+    # Replay summary (loaded with history lists)
+    rounds = Column(Integer, default=0)
+    attacker_losses = Column(Integer, default=0)
+    defender_losses = Column(Integer, default=0)
+    
+    # Compressed replay, see battle_log.py (only loaded on demand)
+    replay = deferred(Column(LargeBinary))
     started_at = Column(DateTime, default=datetime.utcnow)
     ended_at = Column(DateTime)
     
@@ -258,6 +313,35 @@ class WorldEvent(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     expires_at = Column(DateTime)
 
+class LedgerBatch(Base):
+    __tablename__ = "ledger_batches"
+    
+    id = Column(Integer, primary_key=True)
+    entry_count = Column(Integer, default=0)
+    committed_at = Column(DateTime, default=datetime.utcnow)
+
+class LedgerPosting(Base):
+    __tablename__ = "ledger_postings"
+    __table_args__ = (Index("ix_ledger_postings_account_id", "account", "id"),)
+    
+    id = Column(Integer, primary_key=True)
+    batch_id = Column(Integer, ForeignKey("ledger_batches.id"), nullable=False)
+    entry_index = Column(Integer, nullable=False)  # Entry within the batch; its postings sum to zero per asset
+    account = Column(String(64), nullable=False)  # player:<id>, system:<name>, ...
+    asset = Column(String(64), nullable=False)  # gold or material:<type>
+    amount = Column(Float, nullable=False)  # Positive credits the account, negative debits it
+    reason = Column(String(50), nullable=False)
+    reference = Column(String(100))
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LedgerCheckpoint(Base):
+    __tablename__ = "ledger_checkpoints"
+    
+    id = Column(Integer, primary_key=True)
+    last_posting_id = Column(Integer, nullable=False)  # Balances include every posting up to this id
+    balances = Column(JSON, nullable=False)  # {account: {asset: balance}}
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class DatabaseManager:
     def __init__(self, database_url: str):
         self.engine = create_engine(database_url, echo=False)
@@ -2,28 +2,50 @@
 Economy System for World War Telegram Bot
 """
 import asyncio
-import random
+import heapq
 import json
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import and_, or_
 from database import DatabaseManager, Player, PlayerMaterial, Trade
+from ledger import GOLD, INCOME, Ledger, player_account, require_ledger, transfer
+from nation_modifiers import NationModifiers
+from price_engine import PriceEngine
+from price_history import PriceHistoryStore
+from trade_settlement import TradeSettlement, locked_transaction
 
 class EconomyManager:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, price_engine: Optional[PriceEngine] = None):
         self.config = config
         self.materials = config["materials"]
         self.price_update_interval = config["price_update_interval"]
         self.base_prices = {material: data["base_price"] for material, data in self.materials.items()}
         self.volatilities = {material: data["volatility"] for material, data in self.materials.items()}
-        self.current_prices = self.base_prices.copy()
-        self.price_history = {material: [] for material in self.materials.keys()}
+        
+        # Random walk with mean reversion, kept between 10% and 500% of the base price
+        base = np.array(list(self.base_prices.values()), dtype=np.float64)
+        volatility = np.array(list(self.volatilities.values()), dtype=np.float64)
+        self.price_engine = price_engine or PriceEngine()
+        self._price_slice = self.price_engine.register(
+            list(self.materials.keys()), prices=base, base=base, min_price=base * 0.1,
+            max_price=base * 5.0, reversion=0.1, gauss_scale=volatility * base
+        )
+        self.price_history = PriceHistoryStore(list(self.materials.keys()))
+        self.price_history_file = config.get("price_history_file")
+        self.price_history_save_interval = config.get("price_history_save_interval", 300)
+        if self.price_history_file:
+            self.price_history.load(self.price_history_file)
         self.is_running = False
     
     def get_current_prices(self) -> Dict[str, Dict]:
         """Get current market prices with volatility info"""
         prices = {}
+        current_prices = self.current_prices
         for material, base_price in self.base_prices.items():
-            current_price = self.current_prices[material]
+            current_price = current_prices[material]
             volatility = self.volatilities[material]
             change = ((current_price - base_price) / base_price) * 100
             
@@ -37,38 +59,17 @@ class EconomyManager:
         
         return prices
     
+    @property
+    def current_prices(self) -> Dict[str, float]:
+        """Current price of every material"""
+        return self.price_engine.get_prices(self._price_slice)
+    
     def update_prices(self):
         """Update material prices based on supply and demand"""
-        for material in self.materials.keys():
-            base_price = self.base_prices[material]
-            volatility = self.volatilities[material]
-            
-            # Random walk with mean reversion
-            current_price = self.current_prices[material]
-            change = random.gauss(0, volatility * base_price)
-            
-            # Mean reversion factor
-            mean_reversion = (base_price - current_price) * 0.1
-            
-            new_price = current_price + change + mean_reversion
-            
-            # Ensure price doesn't go below 10% of base price
-            min_price = base_price * 0.1
-            max_price = base_price * 5.0
-            
-            new_price = max(min_price, min(max_price, new_price))
-            
-            self.current_prices[material] = new_price
-            
-            # Store price history
-            self.price_history[material].append({
-                "timestamp": datetime.utcnow(),
-                "price": new_price
-            })
-            
-            # Keep only last 100 price points
-            if len(self.price_history[material]) > 100:
-                self.price_history[material] = self.price_history[material][-100:]
+        self.price_engine.step(self._price_slice)
+        
+        # Store price history
+        self.price_history.record(self.current_prices)
     
     async def update_prices_loop(self):
         """Background task to update prices periodically"""
@@ -76,75 +77,261 @@ class EconomyManager:
         while self.is_running:
             try:
                 self.update_prices()
+                if self.price_history_file:
+                    self.price_history.save_if_due(self.price_history_file, self.price_history_save_interval)
                 await asyncio.sleep(self.price_update_interval)
             except Exception as e:
                 print(f"Error updating prices: {e}")
                 await asyncio.sleep(60)  # Wait 1 minute before retrying
     
     def stop(self):
-        """Stop the price update loop"""
+        """Stop the price update loop and persist price history"""
         self.is_running = False
+        if self.price_history_file:
+            self.price_history.save(self.price_history_file)
     
     def calculate_trade_cost(self, material: str, quantity: float) -> float:
         """Calculate cost for trading a material"""
-        if material not in self.current_prices:
+        current_prices = self.current_prices
+        if material not in current_prices:
             return 0.0
         
-        price_per_unit = self.current_prices[material]
+        price_per_unit = current_prices[material]
         return price_per_unit * quantity
     
     def get_material_value(self, materials: Dict[str, float]) -> float:
         """Calculate total value of materials"""
         total_value = 0.0
+        current_prices = self.current_prices
         for material, quantity in materials.items():
-            if material in self.current_prices:
-                total_value += self.current_prices[material] * quantity
+            if material in current_prices:
+                total_value += current_prices[material] * quantity
         return total_value
     
     def apply_market_impact(self, material: str, quantity: float, trade_type: str):
-        """Apply market impact for large trades"""
-        if material not in self.current_prices:
+        """Apply market impact for large trades.
+
+        Trades accumulate in the price engine's order-flow buffer; the net flow moves the
+        price (by at most 10%) the next time prices are read.
+        """
+        if material not in self.base_prices:
             return
+        self.price_engine.record_trade(material, quantity, trade_type)
+
+@dataclass(frozen=True, slots=True)
+class TradeListing:
+    """Read-only snapshot of an open trade for market listings"""
+    id: int
+    seller_id: int
+    material_type: str
+    quantity: float
+    price_per_unit: float
+    total_price: float
+    created_at: datetime
+    expires_at: Optional[datetime]
+
+@dataclass(frozen=True, slots=True)
+class ListingPage:
+    """One page of open trades; pass next_cursor to fetch the following page"""
+    listings: Tuple[TradeListing, ...]
+    next_cursor: Optional[Tuple[Any, int]]
+
+class MarketListings:
+    """Keyset-paginated open trade listings with a per-material page cache"""
+    
+    SORTS = ("price", "age")
+    
+    def __init__(self, db_manager: DatabaseManager, page_size: int = 10, max_cached_pages: int = 64):
+        self.db = db_manager
+        self.page_size = page_size
+        self.max_cached_pages = max_cached_pages
+        # material (None for all materials) -> (sort, cursor, page_size) -> page
+        self._cache: Dict[Optional[str], OrderedDict] = {}
+    
+    def get_page(self, material: Optional[str] = None, sort: str = "price",
+                 cursor: Optional[Tuple[Any, int]] = None,
+                 page_size: Optional[int] = None) -> ListingPage:
+        """Get a page of open trades sorted by price (cheapest first) or age (newest first)"""
+        if sort not in self.SORTS:
+            raise ValueError(f"Unknown listing sort: {sort}")
+        page_size = page_size or self.page_size
+        key = (sort, cursor, page_size)
         
-        # Large trades affect prices
-        impact_factor = min(quantity / 1000.0, 0.1)  # Max 10% impact
+        pages = self._cache.setdefault(material, OrderedDict())
+        page = pages.get(key)
+        if page is not None:
+            pages.move_to_end(key)
+            return page
         
-        if trade_type == "buy":
-            # Buying increases price
-            price_increase = self.current_prices[material] * impact_factor
-            self.current_prices[material] += price_increase
-        elif trade_type == "sell":
-            # Selling decreases price
-            price_decrease = self.current_prices[material] * impact_factor
-            self.current_prices[material] = max(
-                self.current_prices[material] - price_decrease,
-                self.base_prices[material] * 0.1
-            )
+        page = self._query_page(material, sort, cursor, page_size)
+        pages[key] = page
+        if len(pages) > self.max_cached_pages:
+            pages.popitem(last=False)
+        return page
+    
+    def invalidate(self, material: Optional[str] = None):
+        """Drop cached pages for a material (and the all-materials listing)"""
+        if material is None:
+            self._cache.clear()
+            return
+        self._cache.pop(material, None)
+        self._cache.pop(None, None)
+    
+    def _query_page(self, material: Optional[str], sort: str,
+                    cursor: Optional[Tuple[Any, int]], page_size: int) -> ListingPage:
+        """Fetch one page with a keyset (seek) condition instead of OFFSET"""
+        with self.db.get_session() as session:
+            query = session.query(
+                Trade.id, Trade.seller_id, Trade.material_type, Trade.quantity,
+                Trade.price_per_unit, Trade.total_price, Trade.created_at, Trade.expires_at
+            ).filter(Trade.status == "open")
+            if material:
+                query = query.filter(Trade.material_type == material)
+            
+            if sort == "price":
+                column = Trade.price_per_unit
+                if cursor is not None:
+                    query = query.filter(or_(
+                        column > cursor[0], and_(column == cursor[0], Trade.id > cursor[1])
+                    ))
+                query = query.order_by(column, Trade.id)
+            else:
+                column = Trade.created_at
+                if cursor is not None:
+                    query = query.filter(or_(
+                        column < cursor[0], and_(column == cursor[0], Trade.id < cursor[1])
+                    ))
+                query = query.order_by(column.desc(), Trade.id.desc())
+            
+            rows = query.limit(page_size + 1).all()
+        
+        listings = tuple(TradeListing(*row) for row in rows[:page_size])
+        next_cursor = None
+        if len(rows) > page_size:
+            last = listings[-1]
+            next_cursor = (last.price_per_unit if sort == "price" else last.created_at, last.id)
+        return ListingPage(listings, next_cursor)
+
+class TradeExpirySweeper:
+    """Expires open trades when they reach expires_at.
+
+    Due times are kept in a min-heap; the background loop sleeps until the earliest one
+    (or until an earlier trade is scheduled) and expires everything due in bulk UPDATEs.
+    """
+    
+    BATCH_SIZE = 500
+    RETRY_DELAY = 5.0  # seconds
+    
+    def __init__(self, db_manager: DatabaseManager,
+                 on_expired: Optional[Callable[[Any, List[Tuple[int, int, str, float]]], None]] = None):
+        self.db = db_manager
+        # Called inside the expiry transaction with (id, seller_id, material_type, escrow_quantity) rows
+        self.on_expired = on_expired
+        self.is_running = False
+        self._heap: List[Tuple[datetime, int]] = []
+        self._wakeup = asyncio.Event()
+    
+    def load(self):
+        """Schedule every open trade with an expiry time (used at startup)"""
+        with self.db.get_session() as session:
+            rows = session.query(Trade.expires_at, Trade.id).filter(
+                Trade.status == "open", Trade.expires_at.isnot(None)
+            ).all()
+        self._heap = [tuple(row) for row in rows]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+    
+    def schedule(self, trade_id: int, expires_at: datetime):
+        """Track a new trade; wakes the loop if it is now the earliest due"""
+        is_earliest = not self._heap or expires_at < self._heap[0][0]
+        heapq.heappush(self._heap, (expires_at, trade_id))
+        if is_earliest:
+            self._wakeup.set()
+    
+    def next_due(self) -> Optional[datetime]:
+        return self._heap[0][0] if self._heap else None
+    
+    def sweep(self, now: Optional[datetime] = None) -> int:
+        """Expire every trade due by now; returns how many were still open.
+
+        Due ids are popped one batch at a time and that batch is committed before the
+        next is popped; if a batch fails its ids go back on the heap for the next sweep.
+        """
+        now = now or datetime.utcnow()
+        expired = 0
+        while self._heap and self._heap[0][0] <= now:
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.BATCH_SIZE:
+                batch.append(heapq.heappop(self._heap))
+            try:
+                expired += self._expire_batch([trade_id for _, trade_id in batch], now)
+            except Exception:
+                for item in batch:
+                    heapq.heappush(self._heap, item)
+                raise
+        return expired
+    
+    def _expire_batch(self, trade_ids: List[int], now: datetime) -> int:
+        """Expire one batch of due trades in its own transaction"""
+        # Trades completed or cancelled since scheduling are skipped by the status filter
+        with locked_transaction(self.db) as session:
+            rows = session.query(
+                Trade.id, Trade.seller_id, Trade.material_type, Trade.escrow_quantity
+            ).filter(Trade.id.in_(trade_ids), Trade.status == "open").order_by(Trade.id).with_for_update().all()
+            if not rows:
+                return 0
+            session.query(Trade).filter(
+                Trade.id.in_([row.id for row in rows]), Trade.status == "open"
+            ).update({Trade.status: "expired", Trade.escrow_quantity: 0.0, Trade.completed_at: now},
+                     synchronize_session=False)
+            if self.on_expired:
+                self.on_expired(session, rows)
+            session.commit()
+        return len(rows)
+    
+    async def run(self):
+        """Background task expiring trades as they come due"""
+        self.is_running = True
+        while self.is_running:
+            self._wakeup.clear()
+            retry = 0.0
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error expiring trades: {e}")
+                # Failed batches are still due; back off instead of spinning on them
+                retry = self.RETRY_DELAY
+            
+            due = self.next_due()
+            timeout = None if due is None else max((due - datetime.utcnow()).total_seconds(), retry)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+    
+    def stop(self):
+        """Stop the expiry loop"""
+        self.is_running = False
+        self._wakeup.set()
 
 class TradeManager:
-    def __init__(self, db_manager: DatabaseManager, economy_manager: EconomyManager):
+    def __init__(self, db_manager: DatabaseManager, economy_manager: EconomyManager, ledger: Ledger):
         self.db = db_manager
         self.economy = economy_manager
+        self.listings = MarketListings(db_manager)
+        self.settlement = TradeSettlement(db_manager, economy_manager, ledger, on_change=self.listings.invalidate)
+        self.expiry = TradeExpirySweeper(db_manager, self._on_trades_expired)
     
     def create_trade(self, seller_id: int, material: str, quantity: float, 
-                    price_per_unit: float, buyer_id: Optional[int] = None) -> Trade:
-        """Create a new trade"""
-        with self.db.get_session() as session:
-            trade = Trade(
-                seller_id=seller_id,
-                buyer_id=buyer_id,
-                material_type=material,
-                quantity=quantity,
-                price_per_unit=price_per_unit,
-                total_price=price_per_unit * quantity,
-                expires_at=datetime.utcnow() + timedelta(hours=24)
-            )
-            session.add(trade)
-            session.commit()
-            return trade
+                    price_per_unit: float, buyer_id: Optional[int] = None) -> Optional[Trade]:
+        """Create a new trade, escrowing the seller's materials (None if they lack them)"""
+        trade = self.settlement.escrow_listing(seller_id, material, quantity, price_per_unit, buyer_id)
+        if trade:
+            self.expiry.schedule(trade.id, trade.expires_at)
+        return trade
     
     def get_available_trades(self, material: Optional[str] = None) -> List[Trade]:
-        """Get available trades, optionally filtered by material"""
+        """Get all available trades, optionally filtered by material (use listings for menus)"""
         with self.db.get_session() as session:
             query = session.query(Trade).filter(Trade.status == "open")
             if material:
@@ -153,73 +340,26 @@ class TradeManager:
     
     def execute_trade(self, trade_id: int, buyer_id: int) -> bool:
         """Execute a trade between players"""
-        with self.db.get_session() as session:
-            trade = session.query(Trade).filter_by(id=trade_id).first()
-            if not trade or trade.status != "open":
-                return False
-            
-            seller = session.query(Player).filter_by(id=trade.seller_id).first()
-            buyer = session.query(Player).filter_by(id=buyer_id).first()
-            
-            if not seller or not buyer:
-                return False
-            
-            # Check if buyer has enough gold
-            if buyer.gold < trade.total_price:
-                return False
-            
-            # Check if seller has enough materials
-            seller_material = session.query(PlayerMaterial).filter_by(
-                player_id=seller.id,
-                material_type=trade.material_type
-            ).first()
-            
-            if not seller_material or seller_material.quantity < trade.quantity:
-                return False
-            
-            # Execute the trade
-            seller_material.quantity -= trade.quantity
-            seller.gold += trade.total_price
-            
-            # Give materials to buyer
-            buyer_material = session.query(PlayerMaterial).filter_by(
-                player_id=buyer.id,
-                material_type=trade.material_type
-            ).first()
-            
-            if buyer_material:
-                buyer_material.quantity += trade.quantity
-            else:
-                buyer_material = PlayerMaterial(
-                    player_id=buyer.id,
-                    material_type=trade.material_type,
-                    quantity=trade.quantity
-                )
-                session.add(buyer_material)
-            
-            buyer.gold -= trade.total_price
-            
-            # Update trade status
-            trade.buyer_id = buyer_id
-            trade.status = "completed"
-            trade.completed_at = datetime.utcnow()
-            
-            # Apply market impact
-            self.economy.apply_market_impact(trade.material_type, trade.quantity, "buy")
-            
-            session.commit()
-            return True
+        return self.settlement.settle(trade_id, buyer_id)
+    
+    def execute_trades(self, fills: List[Tuple[int, int]]) -> List[bool]:
+        """Execute several (trade_id, buyer_id) purchases in one transaction"""
+        return self.settlement.settle_batch(fills)
     
     def cancel_trade(self, trade_id: int, player_id: int) -> bool:
         """Cancel a trade (only by seller)"""
-        with self.db.get_session() as session:
-            trade = session.query(Trade).filter_by(id=trade_id).first()
-            if not trade or trade.seller_id != player_id or trade.status != "open":
-                return False
-            
-            trade.status = "cancelled"
-            session.commit()
-            return True
+        return self.settlement.cancel_listing(trade_id, player_id)
+    
+    def _on_trades_expired(self, session, rows: List[Tuple[int, int, str, float]]):
+        """Return escrow of expired trades and drop their cached listings"""
+        self.settlement.release_escrow(session, [row[1:] for row in rows])
+        for material in {row.material_type for row in rows}:
+            self.listings.invalidate(material)
+    
+    def get_market_page(self, material: Optional[str] = None, sort: str = "price",
+                        cursor: Optional[Tuple[Any, int]] = None) -> ListingPage:
+        """Get a cached page of open trades"""
+        return self.listings.get_page(material, sort, cursor)
     
     def get_player_trades(self, player_id: int) -> List[Trade]:
         """Get all trades for a player"""
@@ -229,8 +369,11 @@ class TradeManager:
             ).order_by(Trade.created_at.desc()).all()
 
 class DailyIncomeManager:
-    def __init__(self, db_manager: DatabaseManager, config: Dict):
+    def __init__(self, db_manager: DatabaseManager, config: Dict, ledger: Ledger,
+                 modifiers: Optional[NationModifiers] = None):
         self.db = db_manager
+        self.ledger = require_ledger(ledger, "DailyIncomeManager")
+        self.modifiers = modifiers
         self.config = config
         self.daily_income_base = config["daily_income_base"]
         self.tax_rate = config["tax_rate"]
@@ -250,6 +393,8 @@ class DailyIncomeManager:
         nation_bonus = 0
         if player.nation:
             nation_bonus = player.nation.gdp * 0.001  # 0.1% of nation GDP
+            if self.modifiers:
+                nation_bonus *= self.modifiers.value(player.nation_id, "all_production")
         
         total_income = (base_income + level_bonus + nation_bonus) * morale_factor
         
@@ -261,17 +406,22 @@ class DailyIncomeManager:
     
     def process_daily_income(self):
         """Process daily income for all players"""
+        entries = []
         with self.db.get_session() as session:
             players = session.query(Player).filter(Player.is_banned == False).all()
             
             for player in players:
                 income = self.calculate_daily_income(player)
-                player.gold += income
+                if income > 0:
+                    entries.append(transfer(INCOME, player_account(player.id), GOLD, income, "daily_income"))
                 
                 # Update last active
                 player.last_active = datetime.utcnow()
             
             session.commit()
+        
+        # Paid in one ledger batch
+        self.ledger.post(*entries)
     
     def apply_inflation(self):
         """Apply inflation to base prices"""
@@ -280,54 +430,90 @@ class DailyIncomeManager:
         pass
 
 class MarketAnalysis:
+    """Market indicators for all materials, computed together and cached per price tick"""
+    
+    TREND_WINDOW = 10
+    SHORT_MA_WINDOW = 5
+    LONG_MA_WINDOW = 20
+    RSI_PERIOD = 14
+    
     def __init__(self, economy_manager: EconomyManager):
         self.economy = economy_manager
+        self._cached_tick = None
+        self._cached_trends: Dict[str, Dict] = {}
     
     def get_market_trends(self) -> Dict[str, Dict]:
         """Get market trend analysis"""
-        trends = {}
+        history = self.economy.price_history
+        if self._cached_tick != history.tick_count:
+            self._cached_trends = self._analyse(history)
+            self._cached_tick = history.tick_count
+        return self._cached_trends
+    
+    def _analyse(self, history) -> Dict[str, Dict]:
+        """Compute indicators for every material at once from the (ticks, materials) history"""
+        if len(history) < 2:
+            return {}
         
-        for material in self.economy.materials.keys():
-            history = self.economy.price_history[material]
-            if len(history) < 2:
-                continue
-            
-            # Calculate trend over last 10 price points
-            recent_prices = [p["price"] for p in history[-10:]]
-            if len(recent_prices) < 2:
-                continue
-            
-            # Simple trend calculation
-            price_change = recent_prices[-1] - recent_prices[0]
-            percent_change = (price_change / recent_prices[0]) * 100
-            
-            # Volatility calculation
-            if len(recent_prices) > 1:
-                price_changes = [recent_prices[i] - recent_prices[i-1] for i in range(1, len(recent_prices))]
-                volatility = (sum([abs(change) for change in price_changes]) / len(price_changes)) / recent_prices[0] * 100
-            else:
-                volatility = 0
-            
-            trends[material] = {
-                "trend": "up" if percent_change > 1 else "down" if percent_change < -1 else "stable",
-                "change_percent": percent_change,
-                "volatility": volatility,
-                "recommendation": self._get_trading_recommendation(percent_change, volatility)
-            }
+        window = max(self.TREND_WINDOW, self.LONG_MA_WINDOW, self.RSI_PERIOD + 1)
+        prices = history.recent_matrix(window)
+        
+        # Trend and volatility over the last TREND_WINDOW ticks
+        recent = prices[-self.TREND_WINDOW:]
+        first = recent[0]
+        change_percent = (recent[-1] - first) / first * 100
+        volatility = np.abs(np.diff(recent, axis=0)).mean(axis=0) / first * 100
         
-        return trends
-    
-    def _get_trading_recommendation(self, change_percent: float, volatility: float) -> str:
-        """Get trading recommendation based on trend and volatility"""
-        if change_percent > 5 and volatility < 10:
-            return "Strong Buy"
-        elif change_percent > 1 and volatility < 15:
-            return "Buy"
-        elif change_percent < -5 and volatility < 10:
-            return "Strong Sell"
-        elif change_percent < -1 and volatility < 15:
-            return "Sell"
-        elif volatility > 20:
-            return "High Risk"
-        else:
-            return "Hold"
\ No newline at end of file
+        sma_short = prices[-self.SHORT_MA_WINDOW:].mean(axis=0)
+        sma_long = prices[-self.LONG_MA_WINDOW:].mean(axis=0)
+        
+        # RSI from average gains and losses over the last RSI_PERIOD changes
+        changes = np.diff(prices[-(self.RSI_PERIOD + 1):], axis=0)
+        gains = np.clip(changes, 0, None).mean(axis=0)
+        losses = np.clip(-changes, 0, None).mean(axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(losses > 0, 100 - 100 / (1 + gains / losses), np.where(gains > 0, 100.0, 50.0))
+        
+        trend = np.select([change_percent > 1, change_percent < -1], ["up", "down"], "stable")
+        recommendation = np.select(
+            [
+                (change_percent > 5) & (volatility < 10),
+                (change_percent > 1) & (volatility < 15),
+                (change_percent < -5) & (volatility < 10),
+                (change_percent < -1) & (volatility < 15),
+                volatility > 20
+            ],
+            ["Strong Buy", "Buy", "Strong Sell", "Sell", "High Risk"],
+            "Hold"
+        )
+        
+        indicators = {
+            "trend": trend.tolist(),
+            "change_percent": change_percent.tolist(),
+            "volatility": volatility.tolist(),
+            "sma_short": sma_short.tolist(),
+            "sma_long": sma_long.tolist(),
+            "rsi": rsi.tolist(),
+            "recommendation": recommendation.tolist()
+        }
+        return {
+            material: {name: values[i] for name, values in indicators.items()}
+            for i, material in enumerate(history.materials)
+        }
+    
+    def get_price_chart(self, material: str, resolution: str = "1h", limit: int = 168) -> List[Dict]:
+        """Get OHLC bars for a material chart (hourly bars for the last week by default)"""
+        bars = self.economy.price_history.get_ohlc(material, resolution, limit)
+        return [
+            {
+                "timestamp": datetime.utcfromtimestamp(timestamp),
+                "open": open_price,
+                "high": high,
+                "low": low,
+                "close": close
+            }
+            for timestamp, open_price, high, low, close in zip(
+                bars["timestamp"].tolist(), bars["open"].tolist(), bars["high"].tolist(),
+                bars["low"].tolist(), bars["close"].tolist()
+            )
+        ]
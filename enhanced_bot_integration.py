@@ -15,11 +15,14 @@ from aiogram.utils.keyboard import InlineKeyboardBuilder
 # Import all our enhanced systems
 from military_quiz_system import MilitaryQuizSystem, DifficultyLevel, QuestionCategory
 from complex_resources import ComplexResourceManager, ResourceType
+from quiz_results import DATA_DIR, DEFAULT_RESULTS_FILE, QuizResultStore
+from resource_ledger import ResourceLedger, TransactionLog
 from enhanced_military_assets import EnhancedMilitaryAssetsDatabase, AssetComplexity
 from bot_settings import BotSettingsManager, NotificationManager, LanguageManager
 from settings_ui import SettingsUIManager
 from admin_panel import AdminPanel
 from monitoring_analytics import UserAnalytics, PerformanceMonitor, AnalyticsDashboard
+from catalogue_cache import freeze_loaded_catalogues
 from database import DatabaseManager
 
 class EnhancedWorldWarBot:
@@ -34,8 +37,16 @@ class EnhancedWorldWarBot:
         self.db_manager = DatabaseManager(config["database"]["url"])
         
         # Initialize enhanced systems
-        self.quiz_system = MilitaryQuizSystem(self.db_manager)
-        self.resource_manager = ComplexResourceManager(self.db_manager)
+        self.quiz_system = MilitaryQuizSystem(self.db_manager, QuizResultStore(
+            config.get("quiz", {}).get("results_file", DEFAULT_RESULTS_FILE),
+            data_dir=config.get("data_dir", DATA_DIR)))
+        resources_config = config.get("resources", {})
+        self.resource_manager = ComplexResourceManager(self.db_manager, ledger=ResourceLedger(
+            len(ResourceType), self.db_manager,
+            log=TransactionLog(spill_path=resources_config.get("transaction_log_file",
+                                                               "data/resource_transactions.jsonl")),
+            flush_interval=resources_config.get("flush_interval", 5.0)
+        ))
         self.assets_db = EnhancedMilitaryAssetsDatabase()
         
         # Initialize settings and UI
@@ -595,10 +606,13 @@ class EnhancedWorldWarBot:
         # Start tasks
         self.background_tasks.append(asyncio.create_task(update_resource_prices()))
         self.background_tasks.append(asyncio.create_task(monitor_performance()))
+        self.background_tasks.append(asyncio.create_task(self.resource_manager.ledger.flush_loop()))
     
     async def start(self):
         """Start the enhanced bot"""
         try:
+            freeze_loaded_catalogues()
+            
             # Start background tasks
             await self.start_background_tasks()
             
@@ -618,6 +632,8 @@ class EnhancedWorldWarBot:
             # Stop background tasks
             for task in self.background_tasks:
                 task.cancel()
+            self.resource_manager.ledger.stop()
+            self.quiz_system.results.close()
             
             # Stop bot
             await self.bot.session.close()
@@ -4,11 +4,15 @@ Assets now require multiple currencies based on complexity and realism
 """
 
 import random
+import sys
 from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from enum import Enum
+import numpy as np
+import complex_resources
 from complex_resources import ResourceType, ResourceCategory
+from catalogue_cache import load_catalogue
 
 class AssetComplexity(Enum):
     SIMPLE = "simple"        # Basic units requiring few resources
@@ -17,7 +21,7 @@ class AssetComplexity(Enum):
     ADVANCED = "advanced"    # High-tech units with rare resources
     LEGENDARY = "legendary"  # Ultimate units with all resource types
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ResourceRequirement:
     """Resource requirement for building an asset"""
     resource_type: ResourceType
@@ -26,7 +30,7 @@ class ResourceRequirement:
     is_critical: bool  # Whether this resource is critical for the asset
     description: str
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class EnhancedMilitaryAsset:
     """Enhanced military asset with complex resource requirements"""
     name: str
@@ -45,22 +49,22 @@ class EnhancedMilitaryAsset:
     capacity: int
     
     # Resource requirements
-    resource_requirements: List[ResourceRequirement]
+    resource_requirements: Tuple[ResourceRequirement, ...]
     
     # Production requirements
     production_time: int  # Hours to produce
     production_facility: str  # Required facility type
-    technology_requirements: List[str]
+    technology_requirements: Tuple[str, ...]
     
     # Operational requirements
-    upkeep_resources: List[ResourceRequirement]  # Resources needed per hour
+    upkeep_resources: Tuple[ResourceRequirement, ...]  # Resources needed per hour
     fuel_consumption: float
     ammunition_consumption: float
     maintenance_interval: int  # Hours between maintenance
     
     # Special properties
-    special_abilities: List[str]
-    environmental_requirements: List[str]  # Terrain, weather, etc.
+    special_abilities: Tuple[str, ...]
+    environmental_requirements: Tuple[str, ...]  # Terrain, weather, etc.
     crew_requirements: int
     training_time: int  # Hours to train crew
     
@@ -68,13 +72,79 @@ class EnhancedMilitaryAsset:
     base_cost: float  # Base cost in gold
     rarity_factor: float  # Rarity multiplier (0-1)
     market_demand: float  # Market demand (0-1)
+    
+    def __post_init__(self):
+        # Share repeated strings and store lists as tuples to keep records compact
+        for name in ("category", "subcategory", "production_facility"):
+            object.__setattr__(self, name, sys.intern(getattr(self, name)))
+        for name in ("technology_requirements", "special_abilities", "environmental_requirements"):
+            object.__setattr__(self, name, tuple(sys.intern(value) for value in getattr(self, name)))
+        object.__setattr__(self, "resource_requirements", tuple(self.resource_requirements))
+        object.__setattr__(self, "upkeep_resources", tuple(self.upkeep_resources))
+
+# Cap for max buildable quantity of assets that consume nothing
+MAX_BUILD_QUANTITY = 1_000_000
+
+class ResourceRequirementMatrix:
+    """Asset x ResourceType requirement matrix for whole-catalogue queries"""
+    
+    def __init__(self, assets: Dict[str, EnhancedMilitaryAsset]):
+        self.resource_types: Tuple[ResourceType, ...] = tuple(ResourceType)
+        self.resource_index = {resource_type: i for i, resource_type in enumerate(self.resource_types)}
+        self.asset_keys: Tuple[str, ...] = tuple(assets.keys())
+        
+        # consumed[i, j]: amount of resource j consumed to build asset i
+        # required[i, j]: whether asset i lists resource j at all
+        self.consumed = np.zeros((len(self.asset_keys), len(self.resource_types)))
+        self.required = np.zeros(self.consumed.shape, dtype=bool)
+        for i, key in enumerate(self.asset_keys):
+            for req in assets[key].resource_requirements:
+                j = self.resource_index[req.resource_type]
+                self.required[i, j] = True
+                if req.is_consumed:
+                    self.consumed[i, j] += req.amount
+        
+        self.consumed.setflags(write=False)
+        self.required.setflags(write=False)
+    
+    def to_vector(self, amounts: Dict[ResourceType, float]) -> np.ndarray:
+        """Convert a ResourceType -> amount mapping into a resource vector"""
+        vector = np.zeros(len(self.resource_types))
+        for resource_type, amount in amounts.items():
+            if resource_type in self.resource_index:
+                vector[self.resource_index[resource_type]] = amount
+        return vector
+    
+    def affordable(self, user_resources: Dict[ResourceType, float]) -> np.ndarray:
+        """Boolean mask of assets buildable at least once"""
+        return np.all(self.consumed <= self.to_vector(user_resources), axis=1)
+    
+    def max_buildable(self, user_resources: Dict[ResourceType, float]) -> np.ndarray:
+        """Maximum buildable quantity of every asset"""
+        available = self.to_vector(user_resources)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(self.consumed > 0, available / self.consumed, np.inf)
+        limits = np.minimum(ratios.min(axis=1), MAX_BUILD_QUANTITY)
+        return np.floor(limits).astype(np.int64)
+    
+    def total_costs(self, resource_prices: Dict[ResourceType, float]) -> np.ndarray:
+        """Gold value of consumed resources for every asset"""
+        return self.consumed @ self.to_vector(resource_prices)
 
 class EnhancedMilitaryAssetsDatabase:
     """Enhanced database with complex resource requirements"""
     
     def __init__(self):
-        self.assets: Dict[str, EnhancedMilitaryAsset] = {}
+        self.assets: Dict[str, EnhancedMilitaryAsset] = load_catalogue(
+            "enhanced_military_assets", [__file__, complex_resources.__file__], self._build_assets
+        )
+        self._requirement_matrix: Optional[ResourceRequirementMatrix] = None
+    
+    def _build_assets(self) -> Dict[str, EnhancedMilitaryAsset]:
+        """Build the asset catalogue from scratch"""
+        self.assets = {}
         self._create_enhanced_assets()
+        return self.assets
     
     def _create_enhanced_assets(self):
         """Create enhanced military assets with complex requirements"""
@@ -500,12 +570,38 @@ class EnhancedMilitaryAssetsDatabase:
         """Get all assets of a specific complexity"""
         return [asset for asset in self.assets.values() if asset.complexity == complexity]
     
+    @property
+    def requirement_matrix(self) -> ResourceRequirementMatrix:
+        """Requirement matrix for the whole catalogue (built on first use)"""
+        if self._requirement_matrix is None:
+            self._requirement_matrix = ResourceRequirementMatrix(self.assets)
+        return self._requirement_matrix
+    
     def get_assets_by_resource_requirement(self, resource_type: ResourceType) -> List[EnhancedMilitaryAsset]:
         """Get all assets that require a specific resource"""
-        return [
-            asset for asset in self.assets.values()
-            if any(req.resource_type == resource_type for req in asset.resource_requirements)
-        ]
+        matrix = self.requirement_matrix
+        mask = matrix.required[:, matrix.resource_index[resource_type]]
+        return [self.assets[matrix.asset_keys[i]] for i in np.flatnonzero(mask)]
+    
+    def get_affordable_assets(self, user_resources: Dict[ResourceType, float]) -> List[EnhancedMilitaryAsset]:
+        """Get all assets the user can build at least once with their resources"""
+        matrix = self.requirement_matrix
+        return [self.assets[matrix.asset_keys[i]] for i in np.flatnonzero(matrix.affordable(user_resources))]
+    
+    def get_max_buildable_quantities(self, user_resources: Dict[ResourceType, float]) -> Dict[str, int]:
+        """Get the maximum quantity of every asset the user can build with their resources"""
+        matrix = self.requirement_matrix
+        return dict(zip(matrix.asset_keys, matrix.max_buildable(user_resources).tolist()))
+    
+    def calculate_total_costs(self, resource_prices: Dict[ResourceType, float]) -> Dict[str, float]:
+        """Calculate total cost of every asset under the given resource prices"""
+        matrix = self.requirement_matrix
+        return dict(zip(matrix.asset_keys, matrix.total_costs(resource_prices).tolist()))
+    
+    def calculate_market_costs(self, resource_manager) -> Dict[str, float]:
+        """Calculate total cost of every asset under current ComplexResourceManager prices"""
+        prices = {resource_type: price_data.price for resource_type, price_data in resource_manager.get_all_prices().items()}
+        return self.calculate_total_costs(prices)
     
     def calculate_total_cost(self, asset_name: str, resource_prices: Dict[ResourceType, float]) -> float:
         """Calculate total cost of an asset including all resource requirements"""
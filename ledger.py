@@ -0,0 +1,394 @@
+"""
+Double-Entry Ledger for World War Telegram Bot
+Append-only postings for every gold and material movement, committed in batches
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, event, func, tuple_
+
+from database import DatabaseManager, LedgerBatch, LedgerCheckpoint, LedgerPosting, Player, PlayerMaterial
+
+logger = logging.getLogger(__name__)
+
+GOLD = "gold"
+MATERIAL_PREFIX = "material:"
+PLAYER_PREFIX = "player:"
+
+# System accounts on the other side of player postings
+INCOME = "system:income"
+UPKEEP = "system:upkeep"
+QUEST_REWARDS = "system:quest_rewards"
+ADMIN_GRANTS = "system:admin_grants"
+SHOP = "system:shop"
+OPENING = "system:opening"
+TRADE_ESCROW = "escrow:trades"
+ORDER_ESCROW = "escrow:orders"
+
+def player_account(player_id: int) -> str:
+    return f"{PLAYER_PREFIX}{player_id}"
+
+def material_asset(material: str) -> str:
+    return f"{MATERIAL_PREFIX}{material}"
+
+@dataclass(frozen=True, slots=True)
+class Posting:
+    """One leg of an entry; positive amounts credit the account"""
+    account: str
+    asset: str
+    amount: float
+
+@dataclass(frozen=True, slots=True)
+class Entry:
+    """Postings that move value between accounts and sum to zero per asset"""
+    reason: str
+    postings: Tuple[Posting, ...]
+    reference: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+def transfer(from_account: str, to_account: str, asset: str, amount: float, reason: str,
+             reference: Optional[str] = None) -> Entry:
+    """Entry moving amount of an asset from one account to another"""
+    return Entry(reason, (Posting(from_account, asset, -amount), Posting(to_account, asset, amount)), reference)
+
+def _check_balanced(entry: Entry):
+    totals: Dict[str, float] = {}
+    for posting in entry.postings:
+        totals[posting.asset] = totals.get(posting.asset, 0.0) + posting.amount
+    unbalanced = {asset: total for asset, total in totals.items() if abs(total) > 1e-9}
+    if unbalanced:
+        raise ValueError(f"Unbalanced ledger entry {entry.reason}: {unbalanced}")
+
+def opening_entries(player_id: int, gold: float, materials: Optional[Dict[str, float]] = None) -> List[Entry]:
+    """Entries giving a new player their starting gold and materials"""
+    account = player_account(player_id)
+    entries = [transfer(OPENING, account, GOLD, gold, "opening_balance")] if gold else []
+    entries.extend(transfer(OPENING, account, material_asset(material), quantity, "opening_balance")
+                   for material, quantity in (materials or {}).items() if quantity)
+    return entries
+
+def require_ledger(ledger: Optional["Ledger"], owner: str) -> "Ledger":
+    """The shared ledger injected into owner; raises instead of falling back to a private one"""
+    if ledger is None:
+        raise RuntimeError(f"{owner} needs the shared Ledger; none was set")
+    return ledger
+
+def _differences(rebuilt: Dict[str, float], actual: Dict[str, float],
+                 tolerance: float = 1e-6) -> Dict[str, Tuple[float, float]]:
+    """Assets whose ledger and materialised balances differ: {asset: (ledger, actual)}"""
+    return {
+        asset: (rebuilt.get(asset, 0.0), actual.get(asset, 0.0))
+        for asset in set(rebuilt) | set(actual)
+        if abs(rebuilt.get(asset, 0.0) - actual.get(asset, 0.0)) > tolerance
+    }
+
+def _player_id(account: str) -> Optional[int]:
+    return int(account[len(PLAYER_PREFIX):]) if account.startswith(PLAYER_PREFIX) else None
+
+class Ledger:
+    """Append-only double-entry ledger of gold and material movements.
+
+    Entries are queued in memory and committed together: one transaction inserts the batch's
+    postings and applies the net change of every player account to players.gold and
+    player_materials, which are the materialised balances of player accounts. Other
+    accounts are materialised in memory. Checkpoints fold the postings into a snapshot of
+    every account, so any account can be rebuilt for an audit from the latest checkpoint
+    plus the postings after it.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, commit_interval: float = 0.005,
+                 checkpoint_interval: float = 3600.0):
+        self.db = db_manager
+        self.commit_interval = commit_interval
+        self.checkpoint_interval = checkpoint_interval
+        self.is_running = False
+
+        self._pending: List[Entry] = []
+        self._pending_deltas: Dict[Tuple[str, str], float] = {}
+        self._balances: Optional[Dict[Tuple[str, str], float]] = None  # non-player accounts
+        self._last_checkpoint = time.monotonic()
+        self.drift: Dict[str, Dict[str, Tuple[float, float]]] = {}  # found by the last checkpoint
+
+    def transfer(self, from_account: str, to_account: str, asset: str, amount: float, reason: str,
+                 reference: Optional[str] = None) -> Entry:
+        """Post a transfer between two accounts"""
+        entry = transfer(from_account, to_account, asset, amount, reason, reference)
+        self.post(entry)
+        return entry
+
+    def post(self, *entries: Entry):
+        """Queue entries for the next batch; committed at once while the commit loop is not running"""
+        for entry in entries:
+            _check_balanced(entry)
+        for entry in entries:
+            self._pending.append(entry)
+            for posting in entry.postings:
+                key = (posting.account, posting.asset)
+                self._pending_deltas[key] = self._pending_deltas.get(key, 0.0) + posting.amount
+        if not self.is_running:
+            self.commit()
+
+    def pending(self, account: str, asset: str = GOLD) -> float:
+        """Net change of an account queued but not yet committed"""
+        return self._pending_deltas.get((account, asset), 0.0)
+
+    def balance(self, account: str, asset: str = GOLD) -> float:
+        """Materialised balance of an account including queued entries"""
+        player_id = _player_id(account)
+        if player_id is None:
+            committed = self._cached_balances().get((account, asset), 0.0)
+        else:
+            with self.db.get_session() as session:
+                if asset == GOLD:
+                    committed = session.query(Player.gold).filter(Player.id == player_id).scalar()
+                else:
+                    committed = session.query(PlayerMaterial.quantity).filter(
+                        PlayerMaterial.player_id == player_id,
+                        PlayerMaterial.material_type == asset[len(MATERIAL_PREFIX):]
+                    ).scalar()
+        return (committed or 0.0) + self.pending(account, asset)
+
+    def commit(self) -> Optional[int]:
+        """Write queued entries as one batch and apply them to player balances; returns the batch id"""
+        if not self._pending:
+            return None
+        entries, self._pending = self._pending, []
+        deltas, self._pending_deltas = self._pending_deltas, {}
+        try:
+            with self.db.get_session() as session:
+                batch_id = self._write(session, entries)
+                self._apply_player_deltas(session, deltas)
+                session.commit()
+        except Exception:
+            self._pending = entries + self._pending
+            for key, delta in deltas.items():
+                self._pending_deltas[key] = self._pending_deltas.get(key, 0.0) + delta
+            raise
+        self._apply_cached(entries)
+        return batch_id
+
+    def record(self, session, entries: Iterable[Entry], apply: bool = False):
+        """Write postings within the caller's transaction.
+
+        The caller applies the movements to player balances itself unless apply is set, in
+        which case they are applied here as part of the same transaction.
+        """
+        entries = list(entries)
+        if not entries:
+            return
+        for entry in entries:
+            _check_balanced(entry)
+        self._write(session, entries)
+        if apply:
+            deltas: Dict[Tuple[str, str], float] = {}
+            for entry in entries:
+                for posting in entry.postings:
+                    key = (posting.account, posting.asset)
+                    deltas[key] = deltas.get(key, 0.0) + posting.amount
+            session.flush()
+            self._apply_player_deltas(session, deltas)
+        event.listen(session, "after_commit", lambda _: self._apply_cached(entries), once=True)
+
+    def checkpoint(self) -> int:
+        """Fold the postings since the last checkpoint into a new snapshot; returns the checkpoint id
+
+        The snapshot is built from the ledger alone. Player accounts whose materialised
+        balance disagrees are logged and kept in drift rather than becoming the new baseline.
+        """
+        self.commit()
+        with self.db.get_session() as session:
+            previous = session.query(LedgerCheckpoint).order_by(LedgerCheckpoint.id.desc()).first()
+            balances = {account: dict(assets) for account, assets in previous.balances.items()} if previous else {}
+            since = previous.last_posting_id if previous else 0
+            last_posting_id = session.query(func.max(LedgerPosting.id)).scalar() or since
+            for account, asset, amount in session.query(
+                LedgerPosting.account, LedgerPosting.asset, func.sum(LedgerPosting.amount)
+            ).filter(
+                LedgerPosting.id > since, LedgerPosting.id <= last_posting_id
+            ).group_by(LedgerPosting.account, LedgerPosting.asset):
+                assets = balances.setdefault(account, {})
+                assets[asset] = assets.get(asset, 0.0) + amount
+            actual = self._materialised(session)
+
+            checkpoint = LedgerCheckpoint(last_posting_id=last_posting_id, balances=balances)
+            session.add(checkpoint)
+            session.commit()
+            checkpoint_id = checkpoint.id
+
+        self.drift = {}
+        for account in set(actual) | {account for account in balances if _player_id(account) is not None}:
+            differences = _differences(balances.get(account, {}), actual.get(account, {}))
+            if differences:
+                self.drift[account] = differences
+        if self.drift:
+            logger.warning(f"Ledger checkpoint {checkpoint_id}: {len(self.drift)} player accounts differ "
+                           f"from their materialised balances")
+        self._last_checkpoint = time.monotonic()
+        return checkpoint_id
+
+    def reconstruct(self, account: str) -> Dict[str, float]:
+        """Rebuild an account's balances from the latest checkpoint and the postings after it"""
+        with self.db.get_session() as session:
+            checkpoint = session.query(LedgerCheckpoint).order_by(LedgerCheckpoint.id.desc()).first()
+            balances = dict(checkpoint.balances.get(account, {})) if checkpoint else {}
+            since = checkpoint.last_posting_id if checkpoint else 0
+            for asset, amount in session.query(LedgerPosting.asset, func.sum(LedgerPosting.amount)).filter(
+                LedgerPosting.account == account, LedgerPosting.id > since
+            ).group_by(LedgerPosting.asset):
+                balances[asset] = balances.get(asset, 0.0) + amount
+        return balances
+
+    def audit(self, player_id: int, tolerance: float = 1e-6) -> Dict[str, Tuple[float, float]]:
+        """Assets whose rebuilt balance differs from the player's materialised one: {asset: (ledger, actual)}"""
+        self.commit()
+        account = player_account(player_id)
+        rebuilt = self.reconstruct(account)
+        with self.db.get_session() as session:
+            actual = self._materialised(session, player_id).get(account, {GOLD: 0.0})
+        return _differences(rebuilt, actual, tolerance)
+
+    def history(self, account: str, limit: int = 20) -> List[LedgerPosting]:
+        """Most recent committed postings of an account, newest first"""
+        with self.db.get_session() as session:
+            return session.query(LedgerPosting).filter(
+                LedgerPosting.account == account
+            ).order_by(LedgerPosting.id.desc()).limit(limit).all()
+
+    async def run(self):
+        """Background task committing batches every few milliseconds and checkpointing periodically"""
+        self.is_running = True
+        while self.is_running:
+            try:
+                self.commit()
+                if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                logger.error(f"Error committing ledger batch: {e}")
+            await asyncio.sleep(self.commit_interval)
+
+    def stop(self):
+        """Stop the commit loop after a final commit"""
+        self.is_running = False
+        self.commit()
+
+    @staticmethod
+    def _materialised(session, player_id: Optional[int] = None) -> Dict[str, Dict[str, float]]:
+        """players.gold and player_materials as balances of player accounts"""
+        golds = session.query(Player.id, Player.gold)
+        materials = session.query(PlayerMaterial.player_id, PlayerMaterial.material_type, PlayerMaterial.quantity)
+        if player_id is not None:
+            golds = golds.filter(Player.id == player_id)
+            materials = materials.filter(PlayerMaterial.player_id == player_id)
+        balances = {player_account(pid): {GOLD: gold or 0.0} for pid, gold in golds}
+        for pid, material, quantity in materials:
+            balances.setdefault(player_account(pid), {})[material_asset(material)] = quantity or 0.0
+        return balances
+
+    def _write(self, session, entries: List[Entry]) -> int:
+        batch = LedgerBatch(entry_count=len(entries))
+        session.add(batch)
+        session.flush()
+        session.execute(LedgerPosting.__table__.insert(), [
+            {
+                "batch_id": batch.id,
+                "entry_index": index,
+                "account": posting.account,
+                "asset": posting.asset,
+                "amount": posting.amount,
+                "reason": entry.reason,
+                "reference": entry.reference,
+                "created_at": entry.created_at
+            }
+            for index, entry in enumerate(entries)
+            for posting in entry.postings
+        ])
+        return batch.id
+
+    def _apply_player_deltas(self, session, deltas: Dict[Tuple[str, str], float]):
+        """Add net changes of player accounts to players.gold and player_materials"""
+        now = datetime.utcnow()
+        gold_deltas = []
+        material_deltas: Dict[Tuple[int, str], float] = {}
+        for (account, asset), delta in deltas.items():
+            player_id = _player_id(account)
+            if player_id is None or not delta:
+                continue
+            if asset == GOLD:
+                gold_deltas.append({"b_player_id": player_id, "delta": delta})
+            else:
+                material_deltas[(player_id, asset[len(MATERIAL_PREFIX):])] = delta
+
+        if gold_deltas:
+            players = Player.__table__
+            session.execute(
+                players.update().where(players.c.id == bindparam("b_player_id")).values(
+                    gold=players.c.gold + bindparam("delta")
+                ),
+                gold_deltas
+            )
+        if not material_deltas:
+            return
+
+        materials = PlayerMaterial.__table__
+        keys = sorted(material_deltas)
+        existing = {
+            (player_id, material_type)
+            for player_id, material_type in session.query(
+                PlayerMaterial.player_id, PlayerMaterial.material_type
+            ).filter(tuple_(PlayerMaterial.player_id, PlayerMaterial.material_type).in_(keys))
+        }
+        updates = [
+            {"b_player_id": player_id, "b_material_type": material_type,
+             "delta": material_deltas[(player_id, material_type)], "now": now}
+            for player_id, material_type in keys if (player_id, material_type) in existing
+        ]
+        if updates:
+            session.execute(
+                materials.update().where(
+                    (materials.c.player_id == bindparam("b_player_id")) &
+                    (materials.c.material_type == bindparam("b_material_type"))
+                ).values(quantity=materials.c.quantity + bindparam("delta"), last_updated=bindparam("now")),
+                updates
+            )
+        inserts = [
+            {"player_id": player_id, "material_type": material_type,
+             "quantity": material_deltas[(player_id, material_type)], "last_updated": now}
+            for player_id, material_type in keys if (player_id, material_type) not in existing
+        ]
+        if inserts:
+            session.execute(materials.insert(), inserts)
+
+    def _cached_balances(self) -> Dict[Tuple[str, str], float]:
+        """Balances of non-player accounts, loaded from the ledger on first use"""
+        if self._balances is None:
+            balances: Dict[Tuple[str, str], float] = {}
+            with self.db.get_session() as session:
+                checkpoint = session.query(LedgerCheckpoint).order_by(LedgerCheckpoint.id.desc()).first()
+                since = 0
+                if checkpoint:
+                    since = checkpoint.last_posting_id
+                    for account, assets in checkpoint.balances.items():
+                        if _player_id(account) is None:
+                            for asset, amount in assets.items():
+                                balances[(account, asset)] = amount
+                for account, asset, amount in session.query(
+                    LedgerPosting.account, LedgerPosting.asset, func.sum(LedgerPosting.amount)
+                ).filter(
+                    LedgerPosting.id > since, ~LedgerPosting.account.startswith(PLAYER_PREFIX)
+                ).group_by(LedgerPosting.account, LedgerPosting.asset):
+                    balances[(account, asset)] = balances.get((account, asset), 0.0) + amount
+            self._balances = balances
+        return self._balances
+
+    def _apply_cached(self, entries: List[Entry]):
+        if self._balances is None:
+            return  # loaded from the committed postings on first use
+        for entry in entries:
+            for posting in entry.postings:
+                if _player_id(posting.account) is None:
+                    key = (posting.account, posting.asset)
+                    self._balances[key] = self._balances.get(key, 0.0) + posting.amount
@@ -4,17 +4,26 @@ Military System for World War Telegram Bot
 import random
 import math
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 from database import DatabaseManager, Player, PlayerUnit, Battle, Province
+from ledger import GOLD, SHOP, UPKEEP, Ledger, player_account, require_ledger, transfer
 from military_assets import MilitaryAssetsDatabase, MilitaryAsset
+from nation_modifiers import UNIT_EFFECT_NAMES, NationModifiers
+from battle_log import BattleLogCodec, BattleRound, LazyBattleReplay
 
 class MilitaryManager:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, rng: Optional[random.Random] = None):
         self.config = config
+        self.rng = rng or random.Random()
         self.unit_types = config["unit_types"]
         self.battle_cooldown = config["battle_cooldown"]
         self.db = None  # Will be set by bot
+        self.ledger: Optional[Ledger] = None  # Shared ledger, set by bot
+        self.on_units_changed: Optional[Callable[[int], None]] = None  # Called with a player id, set by bot
+        self.modifiers: Optional[NationModifiers] = None  # Technology effects, set by bot
+        self._modifier_columns: Dict[str, Tuple] = {}
         self.assets_db = MilitaryAssetsDatabase()
+        self.battle_codec = BattleLogCodec()
     
     def get_unit_stats(self, unit_name: str) -> Optional[MilitaryAsset]:
         """Get unit statistics from assets database"""
@@ -45,11 +54,14 @@ class MilitaryManager:
     def can_afford_units(self, player: Player, unit_type: str, quantity: int) -> bool:
         """Check if player can afford to build units"""
         cost = self.calculate_unit_cost(unit_type, quantity)
-        return player.gold >= cost
+        # Counting ledger entries not yet committed
+        pending = self.ledger.pending(player_account(player.id)) if self.ledger else 0.0
+        return player.gold + pending >= cost
     
     def build_units(self, player_id: int, unit_name: str, quantity: int, 
                    province_id: Optional[int] = None) -> bool:
         """Build units for a player"""
+        ledger = require_ledger(self.ledger, "MilitaryManager")
         with self.db.get_session() as session:
             player = session.query(Player).filter_by(id=player_id).first()
             if not player:
@@ -59,7 +71,6 @@ class MilitaryManager:
                 return False
             
             cost = self.calculate_unit_cost(unit_name, quantity)
-            player.gold -= cost
             
             # Get asset information
             asset = self.get_unit_stats(unit_name)
@@ -88,7 +99,12 @@ class MilitaryManager:
                 session.add(new_unit)
             
             session.commit()
-            return True
+        
+        # Paid through the ledger
+        ledger.transfer(player_account(player_id), SHOP, GOLD, cost, "unit_purchase", f"units:{unit_name}")
+        if self.on_units_changed:
+            self.on_units_changed(player_id)
+        return True
     
     def get_player_units(self, player_id: int) -> List[PlayerUnit]:
         """Get all units for a player"""
@@ -122,9 +138,25 @@ class MilitaryManager:
         
         return category_units
     
-    def calculate_combat_power(self, units: Dict[str, int], morale: float = 100.0) -> float:
+    def _unit_modifiers(self, vector, category: str) -> Tuple[float, float]:
+        """Technology attack and defense multipliers for a unit category"""
+        columns = self._modifier_columns.get(category)
+        if columns is None:
+            prefix = UNIT_EFFECT_NAMES.get(category, category)
+            columns = self._modifier_columns[category] = tuple(self.modifiers.columns(
+                f"{prefix}_attack", f"{prefix}_defense", "attack_power", "combat_bonus"))
+        attack_column, defense_column, attack_power, combat_bonus = columns
+        bonus = vector[combat_bonus] if combat_bonus is not None else 1.0
+        attack = bonus * (vector[attack_column] if attack_column is not None else 1.0)
+        attack *= vector[attack_power] if attack_power is not None else 1.0
+        defense = bonus * (vector[defense_column] if defense_column is not None else 1.0)
+        return attack, defense
+    
+    def calculate_combat_power(self, units: Dict[str, int], morale: float = 100.0,
+                               nation_id: Optional[int] = None) -> float:
         """Calculate total combat power of units"""
         total_power = 0.0
+        vector = self.modifiers.vector(nation_id) if self.modifiers and nation_id else None
         
         for unit_name, quantity in units.items():
             asset = self.get_unit_stats(unit_name)
@@ -132,11 +164,19 @@ class MilitaryManager:
                 # Use asset stats
                 attack = asset.attack
                 defense = asset.defense
+                category = asset.category
             else:
                 # Fallback to legacy system
                 stats = self.get_legacy_unit_stats(unit_name)
                 attack = stats.get("attack", 0)
                 defense = stats.get("defense", 0)
+                category = unit_name
+            
+            # Apply the nation's technology effects
+            if vector is not None:
+                attack_modifier, defense_modifier = self._unit_modifiers(vector, category)
+                attack *= attack_modifier
+                defense *= defense_modifier
             
             # Average of attack and defense
             unit_power = (attack + defense) / 2
@@ -151,10 +191,12 @@ class MilitaryManager:
     
     def calculate_combat_odds(self, attacker_units: Dict[str, int], defender_units: Dict[str, int],
                              attacker_morale: float = 100.0, defender_morale: float = 100.0,
-                             terrain_modifier: float = 1.0, weather_modifier: float = 1.0) -> float:
+                             terrain_modifier: float = 1.0, weather_modifier: float = 1.0,
+                             attacker_nation_id: Optional[int] = None,
+                             defender_nation_id: Optional[int] = None) -> float:
         """Calculate combat odds (0.0 to 1.0, where 0.5 is even)"""
-        attacker_power = self.calculate_combat_power(attacker_units, attacker_morale)
-        defender_power = self.calculate_combat_power(defender_units, defender_morale)
+        attacker_power = self.calculate_combat_power(attacker_units, attacker_morale, attacker_nation_id)
+        defender_power = self.calculate_combat_power(defender_units, defender_morale, defender_nation_id)
         
         # Apply terrain and weather modifiers
         attacker_power *= terrain_modifier * weather_modifier
@@ -187,17 +229,25 @@ class MilitaryManager:
             odds = self.calculate_combat_odds(
                 attacker_units, defender_units,
                 attacker.morale, defender.morale,
-                terrain_modifier, weather_modifier
+                terrain_modifier, weather_modifier,
+                attacker.nation_id, defender.nation_id
             )
             
             # Determine winner
-            winner_id = attacker_id if random.random() < odds else defender_id
+            winner_id = attacker_id if self.rng.random() < odds else defender_id
             
             # Calculate casualties
             casualties = self._calculate_casualties(
                 attacker_units, defender_units, odds, winner_id == attacker_id
             )
             
+            # Encode the replay (single round for now)
+            rounds = [BattleRound(
+                attacker_power=self.calculate_combat_power(attacker_units, attacker.morale, attacker.nation_id),
+                defender_power=self.calculate_combat_power(defender_units, defender.morale, defender.nation_id),
+                losses=casualties
+            )]
+            
             # Create battle record
             battle = Battle(
                 attacker_id=attacker_id,
@@ -205,10 +255,11 @@ class MilitaryManager:
                 province_id=province_id,
                 battle_type=battle_type,
                 status="completed",
-                attacker_units=attacker_units,
-                defender_units=defender_units,
                 winner_id=winner_id,
-                casualties=casualties,
+                rounds=len(rounds),
+                attacker_losses=sum(casualties["attacker"].values()),
+                defender_losses=sum(casualties["defender"].values()),
+                replay=self.battle_codec.encode(attacker_units, defender_units, rounds),
                 ended_at=datetime.utcnow()
             )
             
@@ -222,7 +273,11 @@ class MilitaryManager:
             self._update_morale_after_battle(session, attacker, defender, winner_id == attacker_id)
             
             session.commit()
-            return battle
+        
+        if self.on_units_changed:
+            self.on_units_changed(attacker_id)
+            self.on_units_changed(defender_id)
+        return battle
     
     def _get_terrain_modifier(self, province: Province) -> float:
         """Get terrain combat modifier"""
@@ -309,12 +364,20 @@ class MilitaryManager:
             defender.morale = min(100, defender.morale + 5)
     
     def get_battle_history(self, player_id: int, limit: int = 10) -> List[Battle]:
-        """Get battle history for a player"""
+        """Get battle history for a player (summaries only, replays stay deferred)"""
         with self.db.get_session() as session:
             return session.query(Battle).filter(
                 (Battle.attacker_id == player_id) | (Battle.defender_id == player_id)
             ).order_by(Battle.started_at.desc()).limit(limit).all()
     
+    def get_battle_replay(self, battle_id: int) -> Optional[LazyBattleReplay]:
+        """Get the full replay of a battle, decoded on first access"""
+        with self.db.get_session() as session:
+            blob = session.query(Battle.replay).filter(Battle.id == battle_id).scalar()
+            if not blob:
+                return None
+            return LazyBattleReplay(blob, self.battle_codec)
+    
     def can_attack(self, attacker_id: int, target_id: int) -> Tuple[bool, str]:
         """Check if player can attack target"""
         with self.db.get_session() as session:
@@ -365,13 +428,15 @@ class MilitaryManager:
             return available_targets
 
 class UnitUpkeepManager:
-    def __init__(self, db_manager: DatabaseManager, config: Dict):
+    def __init__(self, db_manager: DatabaseManager, config: Dict, ledger: Ledger):
         self.db = db_manager
+        self.ledger = require_ledger(ledger, "UnitUpkeepManager")
         self.config = config
         self.morale_decay = config["morale_decay"]
     
     def process_daily_upkeep(self):
         """Process daily upkeep for all units"""
+        entries = []
         with self.db.get_session() as session:
             players = session.query(Player).filter(Player.is_banned == False).all()
             
@@ -385,9 +450,11 @@ class UnitUpkeepManager:
                     upkeep_per_unit = stats.get("upkeep", 0)
                     total_upkeep += upkeep_per_unit * unit.quantity
                 
-                # Deduct upkeep from player gold
-                if player.gold >= total_upkeep:
-                    player.gold -= total_upkeep
+                # Deduct upkeep from player gold, counting ledger entries not yet committed
+                account = player_account(player.id)
+                if player.gold + self.ledger.pending(account) >= total_upkeep:
+                    if total_upkeep > 0:
+                        entries.append(transfer(account, UPKEEP, GOLD, total_upkeep, "unit_upkeep"))
                 else:
                     # If can't afford upkeep, reduce morale
                     player.morale = max(0, player.morale - 10)
@@ -396,6 +463,9 @@ class UnitUpkeepManager:
                 player.morale = max(0, player.morale - self.morale_decay)
             
             session.commit()
+        
+        # Charged in one ledger batch
+        self.ledger.post(*entries)
     
     def get_unit_stats(self, unit_type: str) -> Dict:
         """Get unit statistics (placeholder)"""
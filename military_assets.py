@@ -2,10 +2,15 @@
 Comprehensive Military Assets Database for World War Telegram Bot
 250+ military units, weapons, and defense systems
 """
-from typing import Dict, List, Optional
+import sys
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass
+from catalogue_cache import load_catalogue
 
-@dataclass
+_GRAM_SIZE = 3  # search index key length; shorter queries use their whole text as the key
+_SEARCH_CACHE_SIZE = 1024
+
+@dataclass(frozen=True, slots=True)
 class MilitaryAsset:
     name: str
     category: str
@@ -20,13 +25,67 @@ class MilitaryAsset:
     capacity: int
     fuel_consumption: float
     description: str
-    requirements: List[str]
-    special_abilities: List[str]
+    requirements: Tuple[str, ...]
+    special_abilities: Tuple[str, ...]
     emoji: str
+    
+    def __post_init__(self):
+        # Share repeated strings and store lists as tuples to keep records compact
+        object.__setattr__(self, "category", sys.intern(self.category))
+        object.__setattr__(self, "subcategory", sys.intern(self.subcategory))
+        object.__setattr__(self, "requirements", tuple(sys.intern(r) for r in self.requirements))
+        object.__setattr__(self, "special_abilities", tuple(sys.intern(a) for a in self.special_abilities))
 
 class MilitaryAssetsDatabase:
     def __init__(self):
+        # Assets and indexes are built once and shared via the catalogue cache
+        self.__dict__.update(load_catalogue("military_assets", [__file__], self._compile))
+        self._search_cache: Dict[str, Tuple[MilitaryAsset, ...]] = {}
+    
+    def _compile(self) -> Dict[str, object]:
+        """Build the asset catalogue together with its indexes"""
         self.assets = self._create_assets_database()
+        
+        # Positions used by the search indexes; not stable across catalogue changes
+        self._asset_keys = list(self.assets.keys())
+        
+        self._build_indexes()
+        return dict(vars(self))
+    
+    def _build_indexes(self):
+        """Build secondary indexes and the search n-gram index"""
+        by_category: Dict[str, List[MilitaryAsset]] = {}
+        by_tier: Dict[int, List[MilitaryAsset]] = {}
+        by_subcategory: Dict[Tuple[str, str], List[MilitaryAsset]] = {}
+        subcategories: Dict[str, List[str]] = {}
+        grams: Dict[str, Set[int]] = {}
+        
+        self._search_fields: List[Tuple[str, ...]] = []
+        for asset_id, key in enumerate(self._asset_keys):
+            asset = self.assets[key]
+            by_category.setdefault(asset.category, []).append(asset)
+            by_tier.setdefault(asset.tier, []).append(asset)
+            by_subcategory.setdefault((asset.category, asset.subcategory), []).append(asset)
+            category_subcategories = subcategories.setdefault(asset.category, [])
+            if asset.subcategory not in category_subcategories:
+                category_subcategories.append(asset.subcategory)
+            
+            # Lowercase the searchable fields once
+            fields = (asset.name.lower(), asset.description.lower(),
+                      asset.category.lower(), asset.subcategory.lower())
+            self._search_fields.append(fields)
+            for text in fields:
+                for start in range(len(text)):
+                    for size in range(1, _GRAM_SIZE + 1):
+                        if start + size <= len(text):
+                            grams.setdefault(text[start:start + size], set()).add(asset_id)
+        
+        self._by_category = {k: tuple(v) for k, v in by_category.items()}
+        self._by_tier = {k: tuple(v) for k, v in by_tier.items()}
+        self._by_subcategory = {k: tuple(v) for k, v in by_subcategory.items()}
+        self._categories = tuple(by_category.keys())
+        self._subcategories = {k: tuple(v) for k, v in subcategories.items()}
+        self._gram_index = {k: frozenset(v) for k, v in grams.items()}
     
     def _create_assets_database(self) -> Dict[str, MilitaryAsset]:
         """Create comprehensive military assets database"""
@@ -488,40 +547,60 @@ class MilitaryAssetsDatabase:
         """Get asset by name"""
         return self.assets.get(name.lower().replace(" ", "_"))
     
-    def get_assets_by_category(self, category: str) -> List[MilitaryAsset]:
+    def get_assets_by_category(self, category: str) -> Tuple[MilitaryAsset, ...]:
         """Get all assets in a category"""
-        return [asset for asset in self.assets.values() if asset.category == category]
+        return self._by_category.get(category, ())
     
-    def get_assets_by_tier(self, tier: int) -> List[MilitaryAsset]:
+    def get_assets_by_tier(self, tier: int) -> Tuple[MilitaryAsset, ...]:
         """Get all assets of a specific tier"""
-        return [asset for asset in self.assets.values() if asset.tier == tier]
+        return self._by_tier.get(tier, ())
     
-    def get_assets_by_subcategory(self, category: str, subcategory: str) -> List[MilitaryAsset]:
+    def get_assets_by_subcategory(self, category: str, subcategory: str) -> Tuple[MilitaryAsset, ...]:
         """Get assets by category and subcategory"""
-        return [asset for asset in self.assets.values() 
-                if asset.category == category and asset.subcategory == subcategory]
+        return self._by_subcategory.get((category, subcategory), ())
     
-    def search_assets(self, query: str) -> List[MilitaryAsset]:
-        """Search assets by name or description"""
+    def search_assets(self, query: str) -> Tuple[MilitaryAsset, ...]:
+        """Search assets by name, description, category or subcategory"""
         query = query.lower()
-        results = []
-        for asset in self.assets.values():
-            if (query in asset.name.lower() or 
-                query in asset.description.lower() or
-                query in asset.category.lower() or
-                query in asset.subcategory.lower()):
-                results.append(asset)
+        cached = self._search_cache.get(query)
+        if cached is not None:
+            return cached
+        
+        # Every n-gram of a substring occurs in the field, so intersecting the index
+        # entries of the query's n-grams narrows to a superset of the matches
+        if not query:
+            candidates = range(len(self._asset_keys))
+        else:
+            candidates = None
+            for start in range(max(1, len(query) - _GRAM_SIZE + 1)):
+                matching = self._gram_index.get(query[start:start + _GRAM_SIZE], frozenset())
+                candidates = matching if candidates is None else candidates & matching
+                if not candidates:
+                    break
+        
+        results = tuple(
+            self.assets[self._asset_keys[asset_id]]
+            for asset_id in sorted(candidates)
+            if any(query in field for field in self._search_fields[asset_id])
+        )
+        
+        if len(self._search_cache) >= _SEARCH_CACHE_SIZE:
+            self._search_cache.clear()
+        self._search_cache[query] = results
         return results
     
     def get_total_assets(self) -> int:
         """Get total number of assets"""
         return len(self.assets)
     
-    def get_asset_categories(self) -> List[str]:
+    def get_tier_counts(self) -> Dict[int, int]:
+        """Get number of assets per tier"""
+        return {tier: len(assets) for tier, assets in self._by_tier.items()}
+    
+    def get_asset_categories(self) -> Tuple[str, ...]:
         """Get all asset categories"""
-        return list(set(asset.category for asset in self.assets.values()))
+        return self._categories
     
-    def get_asset_subcategories(self, category: str) -> List[str]:
+    def get_asset_subcategories(self, category: str) -> Tuple[str, ...]:
         """Get subcategories for a category"""
-        return list(set(asset.subcategory for asset in self.assets.values() 
-                       if asset.category == category))
\ No newline at end of file
+        return self._subcategories.get(category, ())
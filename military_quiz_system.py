@@ -4,6 +4,7 @@ Random military questions with points, leaderboards, and knowledge rewards
 """
 
 import random
+import sys
 import time
 import asyncio
 from typing import Dict, List, Any, Optional, Tuple
@@ -12,6 +13,10 @@ from datetime import datetime, timedelta
 from enum import Enum
 import json
 import os
+from catalogue_cache import load_catalogue
+from quiz_leaderboard import QuizLeaderboards
+from quiz_results import DEFAULT_RESULTS_FILE, QuizResultStore
+from quiz_sampler import QuestionSampler
 
 class DifficultyLevel(Enum):
     EASY = "easy"
@@ -37,20 +42,25 @@ class QuestionCategory(Enum):
     CYBER_WARFARE = "cyber_warfare"
     NUCLEAR = "nuclear"
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class QuizQuestion:
     """Military quiz question"""
     question_id: str
     category: QuestionCategory
     difficulty: DifficultyLevel
     question: str
-    options: List[str]
+    options: Tuple[str, ...]
     correct_answer: int  # Index of correct option
     explanation: str
     points: int
     time_limit: int  # Seconds
     knowledge_reward: int  # Knowledge points gained
-    tags: List[str]
+    tags: Tuple[str, ...]
+    
+    def __post_init__(self):
+        # Store lists as tuples and share repeated tags to keep records compact
+        object.__setattr__(self, "options", tuple(self.options))
+        object.__setattr__(self, "tags", tuple(sys.intern(tag) for tag in self.tags))
 
 @dataclass
 class QuizSession:
@@ -88,15 +98,34 @@ class QuizResult:
     points_gained: int
     rank: str
     timestamp: datetime
+    
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "QuizResult":
+        """Rebuild a result from its logged JSON form"""
+        record["difficulty"] = DifficultyLevel(record["difficulty"])
+        if record.get("category") is not None:
+            record["category"] = QuestionCategory(record["category"])
+        record["timestamp"] = datetime.fromisoformat(record["timestamp"])
+        return cls(**record)
 
 class MilitaryQuizDatabase:
     """Database of military knowledge questions"""
     
     def __init__(self):
+        self.questions, self.categories, self.difficulties = load_catalogue(
+            "military_quiz_questions", [__file__], self._build_catalogue
+        )
+        self.sampler = QuestionSampler(self.questions)
+    
+    def _build_catalogue(self) -> Tuple[Dict[str, QuizQuestion],
+                                        Dict[QuestionCategory, List[str]],
+                                        Dict[DifficultyLevel, List[str]]]:
+        """Build the question catalogue and its indexes from scratch"""
         self.questions: Dict[str, QuizQuestion] = {}
         self.categories: Dict[QuestionCategory, List[str]] = {}
         self.difficulties: Dict[DifficultyLevel, List[str]] = {}
         self._load_questions()
+        return self.questions, self.categories, self.difficulties
     
     def _load_questions(self):
         """Load military knowledge questions"""
@@ -778,23 +807,10 @@ class MilitaryQuizDatabase:
             self.difficulties[question.difficulty].append(question.question_id)
     
     def get_random_questions(self, count: int, difficulty: Optional[DifficultyLevel] = None, 
-                           category: Optional[QuestionCategory] = None) -> List[QuizQuestion]:
-        """Get random questions with optional filters"""
-        available_questions = list(self.questions.values())
-        
-        # Filter by difficulty
-        if difficulty:
-            available_questions = [q for q in available_questions if q.difficulty == difficulty]
-        
-        # Filter by category
-        if category:
-            available_questions = [q for q in available_questions if q.category == category]
-        
-        # Randomly select questions
-        if len(available_questions) <= count:
-            return available_questions
-        else:
-            return random.sample(available_questions, count)
+                           category: Optional[QuestionCategory] = None,
+                           user_id: Optional[int] = None) -> List[QuizQuestion]:
+        """Get random questions with optional filters, avoiding ones user_id has already seen"""
+        return self.sampler.sample(count, difficulty, category, user_id)
     
     def get_question_by_id(self, question_id: str) -> Optional[QuizQuestion]:
         """Get question by ID"""
@@ -813,21 +829,19 @@ class MilitaryQuizDatabase:
 class MilitaryQuizSystem:
     """Main quiz system with scoring, leaderboards, and rewards"""
     
-    def __init__(self, database_manager):
+    def __init__(self, database_manager, results: Optional[QuizResultStore] = None):
         self.db_manager = database_manager
         self.quiz_db = MilitaryQuizDatabase()
         self.active_sessions: Dict[str, QuizSession] = {}
-        self.quiz_results: List[QuizResult] = []
-        self.leaderboards: Dict[str, List[Dict]] = {}
+        self.results = results if results is not None else QuizResultStore(DEFAULT_RESULTS_FILE)
+        self.leaderboards = QuizLeaderboards(overall_size=100, category_size=50)
         self.load_quiz_data()
     
     def load_quiz_data(self):
-        """Load quiz data from database"""
-        # Load quiz results from database
+        """Load quiz results from the results log"""
         try:
-            with self.db_manager.get_session() as session:
-                # This would load from a QuizResult table
-                pass
+            for result in self.results.load(QuizResult.from_record):
+                self._update_leaderboards(result)
         except Exception as e:
             print(f"Error loading quiz data: {e}")
     
@@ -837,7 +851,7 @@ class MilitaryQuizSystem:
         session_id = f"quiz_{user_id}_{int(time.time())}"
         
         # Get random questions
-        questions = self.quiz_db.get_random_questions(question_count, difficulty, category)
+        questions = self.quiz_db.get_random_questions(question_count, difficulty, category, user_id)
         
         if not questions:
             raise ValueError("No questions available for the selected criteria")
@@ -963,101 +977,29 @@ class MilitaryQuizSystem:
             timestamp=datetime.now()
         )
         
-        self.quiz_results.append(result)
-        
-        # Update leaderboards
+        # Record and update leaderboards
+        self.results.add(result)
         self._update_leaderboards(result)
         
-        # Save to database
-        self._save_quiz_result(result)
-        
         return result
     
     def _update_leaderboards(self, result: QuizResult):
         """Update leaderboards with new result"""
-        # Overall leaderboard
-        if "overall" not in self.leaderboards:
-            self.leaderboards["overall"] = []
-        
-        self.leaderboards["overall"].append({
-            "user_id": result.user_id,
-            "score": result.score,
-            "accuracy": result.accuracy,
-            "rank": result.rank,
-            "timestamp": result.timestamp
-        })
-        
-        # Sort by score
-        self.leaderboards["overall"].sort(key=lambda x: x["score"], reverse=True)
-        
-        # Keep only top 100
-        self.leaderboards["overall"] = self.leaderboards["overall"][:100]
-        
-        # Category leaderboard
-        if result.category:
-            category_key = f"category_{result.category.value}"
-            if category_key not in self.leaderboards:
-                self.leaderboards[category_key] = []
-            
-            self.leaderboards[category_key].append({
-                "user_id": result.user_id,
-                "score": result.score,
-                "accuracy": result.accuracy,
-                "rank": result.rank,
-                "timestamp": result.timestamp
-            })
-            
-            self.leaderboards[category_key].sort(key=lambda x: x["score"], reverse=True)
-            self.leaderboards[category_key] = self.leaderboards[category_key][:50]
+        self.leaderboards.add(result)
     
-    def _save_quiz_result(self, result: QuizResult):
-        """Save quiz result to database"""
-        try:
-            with self.db_manager.get_session() as session:
-                # This would save to a QuizResult table
-                # For now, we'll just log it
-                print(f"Quiz result saved: {result.user_id} scored {result.score} points")
-        except Exception as e:
-            print(f"Error saving quiz result: {e}")
-    
-    def get_leaderboard(self, category: Optional[str] = None, limit: int = 10) -> List[Dict]:
-        """Get leaderboard for a category"""
+    def get_leaderboard(self, category: Optional[str] = None, limit: int = 10,
+                        period: Optional[str] = None) -> List[Dict]:
+        """Get leaderboard for a category, all-time or for the current "daily"/"weekly" period"""
         if category:
             key = f"category_{category}" if category != "overall" else "overall"
         else:
             key = "overall"
         
-        return self.leaderboards.get(key, [])[:limit]
+        return self.leaderboards.top(key, limit, period)
     
     def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Get user's quiz statistics"""
-        user_results = [r for r in self.quiz_results if r.user_id == user_id]
-        
-        if not user_results:
-            return {
-                "total_quizzes": 0,
-                "total_score": 0,
-                "average_accuracy": 0,
-                "best_rank": "None",
-                "total_knowledge": 0,
-                "longest_streak": 0
-            }
-        
-        total_quizzes = len(user_results)
-        total_score = sum(r.score for r in user_results)
-        average_accuracy = sum(r.accuracy for r in user_results) / total_quizzes
-        best_rank = max(user_results, key=lambda x: x.score).rank
-        total_knowledge = sum(r.knowledge_gained for r in user_results)
-        longest_streak = max(r.max_streak for r in user_results)
-        
-        return {
-            "total_quizzes": total_quizzes,
-            "total_score": total_score,
-            "average_accuracy": average_accuracy,
-            "best_rank": best_rank,
-            "total_knowledge": total_knowledge,
-            "longest_streak": longest_streak
-        }
+        return self.results.user_stats(user_id)
     
     def get_current_question(self, session_id: str) -> Optional[Dict[str, Any]]:
         """Get current question for an active session"""
@@ -1100,7 +1042,7 @@ if __name__ == "__main__":
             pass
     
     db_manager = MockDatabaseManager()
-    quiz_system = MilitaryQuizSystem(db_manager)
+    quiz_system = MilitaryQuizSystem(db_manager, QuizResultStore())
     
     # Test starting a quiz
     user_id = 12345
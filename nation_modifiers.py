@@ -0,0 +1,90 @@
+"""
+Nation Modifiers for World War Telegram Bot
+Per-nation technology effect multipliers kept up to date as research completes
+"""
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from tech_graph import TechGraph, TechNode
+
+# Unit categories whose technology effects use a different name
+UNIT_EFFECT_NAMES = {"armor": "tank"}
+
+class NationModifiers:
+    """Technology effects as one multiplier vector per nation.
+
+    Every numeric effect in the technology graph gets a column; a nation's row holds
+    1 + the sum of that effect over its researched technologies. Rows are built from the
+    nation's researched mask on first use and updated in place when research completes,
+    so readers pay one dict lookup and one array index.
+    """
+
+    def __init__(self, graph: TechGraph, load_mask: Optional[Callable[[int], int]] = None):
+        self.graph = graph
+        self.load_mask = load_mask  # nation id -> researched bitmask
+        self.names: List[str] = sorted({name for node in graph.nodes for name, value in node.effects.items()
+                                        if not isinstance(value, bool)})
+        self.index: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+        # Additive bonus of each technology, one row per graph bit
+        self.tech_vectors = np.zeros((len(graph), len(self.names)), dtype=np.float64)
+        for node in graph.nodes:
+            for name, value in node.effects.items():
+                if name in self.index:
+                    self.tech_vectors[node.bit, self.index[name]] = value
+
+        self.neutral = np.ones(len(self.names), dtype=np.float64)
+        self.neutral.flags.writeable = False
+        self.values = np.ones((64, len(self.names)), dtype=np.float64)
+        self.rows: Dict[int, int] = {}
+        self._free_rows: List[int] = []
+
+    def vector(self, nation_id: Optional[int]) -> np.ndarray:
+        """Multiplier vector of a nation (all ones without a nation)"""
+        if nation_id is None:
+            return self.neutral
+        row = self.rows.get(nation_id)
+        if row is None:
+            if self.load_mask is None:
+                return self.neutral
+            row = self._build(nation_id, self.load_mask(nation_id))
+        return self.values[row]
+
+    def value(self, nation_id: Optional[int], name: str) -> float:
+        """One multiplier, 1.0 for effects no technology grants"""
+        column = self.index.get(name)
+        return 1.0 if column is None else float(self.vector(nation_id)[column])
+
+    def columns(self, *names: str) -> List[Optional[int]]:
+        """Column indexes for names, None for unknown effects"""
+        return [self.index.get(name) for name in names]
+
+    def rebuild(self, nation_id: int, researched: int):
+        """Recompute a nation's row from its researched mask"""
+        self._build(nation_id, researched)
+
+    def apply(self, nation_id: int, node: TechNode):
+        """Add a newly researched technology to a nation's row, if the row is built"""
+        row = self.rows.get(nation_id)
+        if row is not None:
+            self.values[row] += self.tech_vectors[node.bit]
+
+    def invalidate(self, nation_id: Optional[int] = None):
+        """Drop cached rows so they are rebuilt on next read (all nations if None)"""
+        if nation_id is None:
+            self.rows.clear()
+            self._free_rows.clear()
+        elif nation_id in self.rows:
+            self._free_rows.append(self.rows.pop(nation_id))
+
+    def _build(self, nation_id: int, researched: int) -> int:
+        row = self.rows.get(nation_id)
+        if row is None:
+            row = self._free_rows.pop() if self._free_rows else len(self.rows)
+            if row >= len(self.values):
+                self.values = np.concatenate([self.values, np.ones_like(self.values)])
+            self.rows[nation_id] = row
+        bits = [node.bit for node in self.graph.nodes_in(researched)]
+        self.values[row] = 1.0 + self.tech_vectors[bits].sum(axis=0)
+        return row
@@ -0,0 +1,639 @@
+"""
+Order Book Matching Engine for World War Telegram Bot
+Price-time priority limit and market orders per material, persisted in batches
+"""
+import asyncio
+import heapq
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, func
+
+from database import DatabaseManager, LedgerPosting, Player, PlayerMaterial, MarketOrder, MarketFill
+from ledger import GOLD, ORDER_ESCROW, Entry, Ledger, material_asset, player_account, require_ledger, transfer
+from trade_settlement import locked_transaction
+
+logger = logging.getLogger(__name__)
+
+BUY = "buy"
+SELL = "sell"
+LIMIT = "limit"
+MARKET = "market"
+
+# Quantities below this are treated as fully filled
+EPSILON = 1e-9
+
+@dataclass(slots=True, eq=False)
+class Order:
+    """Order held in memory by the matching engine"""
+    order_id: int
+    player_id: int
+    material: str
+    side: str
+    order_type: str
+    price: Optional[float]
+    quantity: float
+    remaining: float
+    sequence: int
+    created_at: datetime
+    status: str = "open"  # open, filled, cancelled
+
+    @property
+    def is_open(self) -> bool:
+        return self.status == "open"
+
+    @property
+    def filled(self) -> float:
+        return self.quantity - self.remaining
+
+    @property
+    def held_asset(self) -> str:
+        """Ledger asset the order pays with: gold for buys, the material for sells"""
+        return GOLD if self.side == BUY else material_asset(self.material)
+
+    @property
+    def held(self) -> float:
+        """Escrow covering the unfilled remainder of a limit order"""
+        return self.price * self.remaining if self.side == BUY else self.remaining
+
+@dataclass(frozen=True, slots=True)
+class Fill:
+    """Executed match between a buy and a sell order"""
+    buy_order_id: int
+    sell_order_id: int
+    buyer_id: int
+    seller_id: int
+    material: str
+    price: float
+    quantity: float
+    timestamp: datetime
+
+    @property
+    def total_price(self) -> float:
+        return self.price * self.quantity
+
+class OrderBook:
+    """Bid and ask heaps for a single material.
+
+    Cancelled and filled orders are dropped lazily when they reach the top of a heap.
+    """
+
+    def __init__(self, material: str):
+        self.material = material
+        self.bids: List[Tuple[float, int, Order]] = []  # (-price, sequence, order)
+        self.asks: List[Tuple[float, int, Order]] = []  # (price, sequence, order)
+
+    @staticmethod
+    def _top(heap: List[Tuple[float, int, Order]]) -> Optional[Order]:
+        while heap and not heap[0][2].is_open:
+            heapq.heappop(heap)
+        return heap[0][2] if heap else None
+
+    def best_bid(self) -> Optional[Order]:
+        return self._top(self.bids)
+
+    def best_ask(self) -> Optional[Order]:
+        return self._top(self.asks)
+
+    def rest(self, order: Order):
+        """Add an unfilled limit order to the book"""
+        if order.side == BUY:
+            heapq.heappush(self.bids, (-order.price, order.sequence, order))
+        else:
+            heapq.heappush(self.asks, (order.price, order.sequence, order))
+
+    def depth(self, levels: int = 5) -> Dict[str, List[Tuple[float, float]]]:
+        """Aggregated (price, quantity) levels on each side, best first"""
+        result = {}
+        for side, heap, sign in ((BUY, self.bids, -1), (SELL, self.asks, 1)):
+            aggregated: Dict[float, float] = {}
+            for key, _, order in sorted(heap):
+                if not order.is_open:
+                    continue
+                price = key * sign
+                if price not in aggregated and len(aggregated) == levels:
+                    break
+                aggregated[price] = aggregated.get(price, 0.0) + order.remaining
+            result[side] = list(aggregated.items())
+        return result
+
+class MatchingEngine:
+    """In-memory matching engine for all materials.
+
+    Every change is journalled so it can be persisted in one batch by OrderBookStore.
+    """
+
+    def __init__(self, next_order_id: int = 1, next_sequence: int = 1):
+        self.books: Dict[str, OrderBook] = {}
+        self.open_orders: Dict[int, Order] = {}
+        self.player_orders: Dict[int, Set[int]] = {}
+        self.next_order_id = next_order_id
+        self.next_sequence = next_sequence
+
+        # Journal of changes since the last drain
+        self._new_orders: Dict[int, Order] = {}
+        self._updated_orders: Dict[int, Order] = {}
+        self._fills: List[Fill] = []
+        # Called with every resting order cancelled by its owner or by self-trade prevention
+        self.on_cancel: Optional[Callable[[Order], None]] = None
+
+    def get_book(self, material: str) -> OrderBook:
+        book = self.books.get(material)
+        if book is None:
+            book = self.books[material] = OrderBook(material)
+        return book
+
+    def submit_limit(self, player_id: int, material: str, side: str, price: float,
+                     quantity: float) -> Tuple[Order, List[Fill]]:
+        """Match a limit order and rest any remainder in the book"""
+        order = self._new_order(player_id, material, side, LIMIT, price, quantity)
+        fills = self._match(order)
+        if order.remaining > EPSILON:
+            self.get_book(material).rest(order)
+            self.open_orders[order.order_id] = order
+            self.player_orders.setdefault(player_id, set()).add(order.order_id)
+        else:
+            order.remaining = 0.0
+            order.status = "filled"
+        return order, fills
+
+    def submit_market(self, player_id: int, material: str, side: str, quantity: float,
+                      budget: Optional[float] = None) -> Tuple[Order, List[Fill]]:
+        """Match a market order immediately; the unfilled remainder is cancelled.
+
+        A buy order can be capped by a gold budget.
+        """
+        order = self._new_order(player_id, material, side, MARKET, None, quantity)
+        fills = self._match(order, budget)
+        if order.remaining > EPSILON:
+            order.status = "cancelled"
+        else:
+            order.remaining = 0.0
+            order.status = "filled"
+        return order, fills
+
+    def cancel(self, order_id: int, player_id: Optional[int] = None) -> bool:
+        """Cancel an open order (optionally only if owned by player_id)"""
+        order = self.open_orders.get(order_id)
+        if not order or (player_id is not None and order.player_id != player_id):
+            return False
+        self._close(order, "cancelled")
+        return True
+
+    def restore(self, order: Order):
+        """Put a persisted open order back into its book (used at startup)"""
+        self.get_book(order.material).rest(order)
+        self.open_orders[order.order_id] = order
+        self.player_orders.setdefault(order.player_id, set()).add(order.order_id)
+        self.next_order_id = max(self.next_order_id, order.order_id + 1)
+        self.next_sequence = max(self.next_sequence, order.sequence + 1)
+
+    def get_player_orders(self, player_id: int) -> List[Order]:
+        """Open orders of a player"""
+        return [self.open_orders[order_id] for order_id in self.player_orders.get(player_id, ())]
+
+    def has_pending_changes(self) -> bool:
+        return bool(self._new_orders or self._updated_orders or self._fills)
+
+    def drain(self) -> Tuple[List[Order], List[Order], List[Fill]]:
+        """Take all journalled changes: (new orders, updated orders, fills)"""
+        batch = (list(self._new_orders.values()), list(self._updated_orders.values()), self._fills)
+        self._new_orders = {}
+        self._updated_orders = {}
+        self._fills = []
+        return batch
+
+    def requeue(self, batch: Tuple[List[Order], List[Order], List[Fill]]):
+        """Return a drained batch to the journal after a failed flush"""
+        new_orders, updated_orders, fills = batch
+        for order in new_orders:
+            self._new_orders[order.order_id] = order
+            self._updated_orders.pop(order.order_id, None)
+        for order in updated_orders:
+            if order.order_id not in self._new_orders:
+                self._updated_orders[order.order_id] = order
+        self._fills = fills + self._fills
+
+    def _new_order(self, player_id: int, material: str, side: str, order_type: str,
+                   price: Optional[float], quantity: float) -> Order:
+        if side not in (BUY, SELL):
+            raise ValueError(f"Invalid order side: {side}")
+        if quantity <= 0:
+            raise ValueError("Order quantity must be positive")
+        if order_type == LIMIT and (price is None or price <= 0):
+            raise ValueError("Limit orders need a positive price")
+
+        order = Order(
+            order_id=self.next_order_id,
+            player_id=player_id,
+            material=material,
+            side=side,
+            order_type=order_type,
+            price=price,
+            quantity=quantity,
+            remaining=quantity,
+            sequence=self.next_sequence,
+            created_at=datetime.utcnow()
+        )
+        self.next_order_id += 1
+        self.next_sequence += 1
+        self._new_orders[order.order_id] = order
+        return order
+
+    def _match(self, order: Order, budget: Optional[float] = None) -> List[Fill]:
+        book = self.get_book(order.material)
+        is_buy = order.side == BUY
+        fills = []
+
+        while order.remaining > EPSILON:
+            resting = book.best_ask() if is_buy else book.best_bid()
+            if resting is None:
+                break
+            if order.order_type == LIMIT:
+                if is_buy and resting.price > order.price:
+                    break
+                if not is_buy and resting.price < order.price:
+                    break
+            if resting.player_id == order.player_id:
+                # Self-trade prevention: the older resting order is cancelled
+                self._close(resting, "cancelled")
+                continue
+
+            quantity = min(order.remaining, resting.remaining)
+            if budget is not None:
+                quantity = min(quantity, budget / resting.price)
+                if quantity <= EPSILON:
+                    break
+                budget -= quantity * resting.price
+
+            order.remaining -= quantity
+            resting.remaining -= quantity
+            if resting.remaining <= EPSILON:
+                self._close(resting, "filled")
+            else:
+                self._touch(resting)
+
+            buy_order, sell_order = (order, resting) if is_buy else (resting, order)
+            fills.append(Fill(
+                buy_order_id=buy_order.order_id,
+                sell_order_id=sell_order.order_id,
+                buyer_id=buy_order.player_id,
+                seller_id=sell_order.player_id,
+                material=order.material,
+                price=resting.price,
+                quantity=quantity,
+                timestamp=datetime.utcnow()
+            ))
+
+        self._fills.extend(fills)
+        return fills
+
+    def _close(self, order: Order, status: str):
+        if status == "filled":
+            order.remaining = 0.0
+        order.status = status
+        self.open_orders.pop(order.order_id, None)
+        player_orders = self.player_orders.get(order.player_id)
+        if player_orders is not None:
+            player_orders.discard(order.order_id)
+            if not player_orders:
+                del self.player_orders[order.player_id]
+        self._touch(order)
+        if status == "cancelled" and self.on_cancel:
+            self.on_cancel(order)
+
+    def _touch(self, order: Order):
+        if order.order_id not in self._new_orders:
+            self._updated_orders[order.order_id] = order
+
+class OrderBookStore:
+    """Persists matching engine batches and settles fills in one transaction per batch.
+
+    Orders pay from escrow: what an order can spend is moved to ORDER_ESCROW when it is
+    placed, so a fill only credits the buyer's material and the seller's gold.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, ledger: Ledger):
+        self.db = db_manager
+        self.ledger = require_ledger(ledger, "OrderBookStore")
+
+    def load_engine(self) -> MatchingEngine:
+        """Create an engine holding every persisted open order.
+
+        Orders persisted before escrow existed have their remainder escrowed now, under
+        row locks; orders their player can no longer cover are cancelled.
+        """
+        with locked_transaction(self.db) as session:
+            max_id, max_sequence = session.query(
+                func.max(MarketOrder.id), func.max(MarketOrder.sequence)
+            ).one()
+            engine = MatchingEngine((max_id or 0) + 1, (max_sequence or 0) + 1)
+
+            rows = session.query(MarketOrder).filter(MarketOrder.status == "open").order_by(
+                MarketOrder.sequence
+            ).all()
+            held = {reference for (reference,) in session.query(LedgerPosting.reference).filter(
+                LedgerPosting.reason == "order_escrow",
+                LedgerPosting.reference.in_([f"order:{row.id}" for row in rows])
+            )} if rows else set()
+            cancelled = self._hold_unescrowed(session, [row for row in rows if f"order:{row.id}" not in held])
+            for row in rows:
+                if row.id in cancelled:
+                    continue
+                engine.restore(Order(
+                    order_id=row.id,
+                    player_id=row.player_id,
+                    material=row.material_type,
+                    side=row.side,
+                    order_type=row.order_type,
+                    price=row.price,
+                    quantity=row.quantity,
+                    remaining=row.remaining,
+                    sequence=row.sequence,
+                    created_at=row.created_at
+                ))
+            session.commit()
+        return engine
+
+    def _hold_unescrowed(self, session, rows: List[MarketOrder]) -> Set[int]:
+        """Escrow the remainder of open orders that hold nothing; returns the ids cancelled instead"""
+        if not rows:
+            return set()
+        player_ids = sorted({row.player_id for row in rows})
+        gold = dict(session.query(Player.id, Player.gold).filter(
+            Player.id.in_(player_ids)
+        ).order_by(Player.id).with_for_update())
+        materials = {
+            (player_id, material_type): quantity
+            for player_id, material_type, quantity in session.query(
+                PlayerMaterial.player_id, PlayerMaterial.material_type, PlayerMaterial.quantity
+            ).filter(PlayerMaterial.player_id.in_(player_ids)).order_by(
+                PlayerMaterial.player_id, PlayerMaterial.material_type
+            ).with_for_update()
+        }
+
+        available: Dict[Tuple[int, str], float] = {}
+        entries: List[Entry] = []
+        cancelled = set()
+        now = datetime.utcnow()
+        for row in rows:
+            asset = GOLD if row.side == BUY else material_asset(row.material_type)
+            key = (row.player_id, asset)
+            if key not in available:
+                committed = gold.get(row.player_id) if row.side == BUY else materials.get(
+                    (row.player_id, row.material_type))
+                # Counting ledger entries not yet committed
+                available[key] = (committed or 0.0) + self.ledger.pending(player_account(row.player_id), asset)
+            needed = row.price * row.remaining if row.side == BUY else row.remaining
+            if needed > available[key] + EPSILON:
+                row.status = "cancelled"
+                row.updated_at = now
+                cancelled.add(row.id)
+                continue
+            available[key] -= needed
+            entries.append(transfer(player_account(row.player_id), ORDER_ESCROW, asset, needed,
+                                    "order_escrow", f"order:{row.id}"))
+        self.ledger.record(session, entries, apply=True)
+        return cancelled
+
+    def flush(self, new_orders: List[Order], updated_orders: List[Order], fills: List[Fill]):
+        """Write a batch of order changes and fills, settling gold and materials"""
+        if not (new_orders or updated_orders or fills):
+            return
+
+        now = datetime.utcnow()
+        with self.db.get_session() as session:
+            if new_orders:
+                session.execute(MarketOrder.__table__.insert(), [
+                    {
+                        "id": order.order_id,
+                        "player_id": order.player_id,
+                        "material_type": order.material,
+                        "side": order.side,
+                        "order_type": order.order_type,
+                        "price": order.price,
+                        "quantity": order.quantity,
+                        "remaining": order.remaining,
+                        "sequence": order.sequence,
+                        "status": order.status,
+                        "created_at": order.created_at,
+                        "updated_at": now
+                    }
+                    for order in new_orders
+                ])
+            if updated_orders:
+                orders = MarketOrder.__table__
+                session.execute(
+                    orders.update().where(orders.c.id == bindparam("b_id")),
+                    [
+                        {"b_id": order.order_id, "remaining": order.remaining,
+                         "status": order.status, "updated_at": now}
+                        for order in updated_orders
+                    ]
+                )
+            if fills:
+                session.execute(MarketFill.__table__.insert(), [
+                    {
+                        "buy_order_id": fill.buy_order_id,
+                        "sell_order_id": fill.sell_order_id,
+                        "buyer_id": fill.buyer_id,
+                        "seller_id": fill.seller_id,
+                        "material_type": fill.material,
+                        "price": fill.price,
+                        "quantity": fill.quantity,
+                        "created_at": fill.timestamp
+                    }
+                    for fill in fills
+                ])
+                self._settle(session, fills)
+            session.commit()
+
+    def _settle(self, session, fills: List[Fill]):
+        """Pay every fill out of escrow within the caller's transaction.
+
+        Both sides were escrowed when their orders were placed, so settling only credits
+        players and can never overdraw one.
+        """
+        self.ledger.record(session, [
+            entry
+            for fill in fills
+            for entry in (
+                transfer(ORDER_ESCROW, player_account(fill.seller_id), GOLD,
+                         fill.total_price, "order_fill", f"order:{fill.buy_order_id}"),
+                transfer(ORDER_ESCROW, player_account(fill.buyer_id), material_asset(fill.material),
+                         fill.quantity, "order_fill", f"order:{fill.sell_order_id}")
+            )
+        ], apply=True)
+
+def settlement_credits(fills: List[Fill]) -> Tuple[Dict[int, float], Dict[Tuple[int, str], float]]:
+    """Gold per seller and material per (buyer, material) paid out of escrow by fills"""
+    gold_credits: Dict[int, float] = {}
+    material_credits: Dict[Tuple[int, str], float] = {}
+    for fill in fills:
+        gold_credits[fill.seller_id] = gold_credits.get(fill.seller_id, 0.0) + fill.total_price
+        key = (fill.buyer_id, fill.material)
+        material_credits[key] = material_credits.get(key, 0.0) + fill.quantity
+    return gold_credits, material_credits
+
+class MarketExchange:
+    """Player-facing order book market: validation, matching and periodic batched persistence.
+
+    Placing an order posts what it pays with to ORDER_ESCROW through the shared ledger, so
+    every other spend path sees the hold straight away; cancelling releases the remainder.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, economy_manager, ledger: Ledger, flush_interval: float = 0.05):
+        self.db = db_manager
+        self.economy = economy_manager
+        self.ledger = require_ledger(ledger, "MarketExchange")
+        self.store = OrderBookStore(db_manager, ledger)
+        self.engine = self._attach(MatchingEngine())
+        self.flush_interval = flush_interval
+        self.is_running = False
+
+        # Escrow paid out by fills matched but not yet flushed
+        self._pending_gold: Dict[int, float] = {}
+        self._pending_materials: Dict[Tuple[int, str], float] = {}
+
+    def load(self):
+        """Restore the open order book from the database"""
+        self.engine = self._attach(self.store.load_engine())
+
+    def place_limit_order(self, player_id: int, material: str, side: str, price: float,
+                          quantity: float) -> Tuple[bool, str, Optional[Order], List[Fill]]:
+        """Place a limit order after checking the player can cover it"""
+        valid, reason = self._validate(player_id, material, side, quantity)
+        if not valid:
+            return False, reason, None, []
+        if price <= 0:
+            return False, "Price must be positive", None, []
+
+        gold, held = self._available_balances(player_id, material)
+        if side == BUY and gold < price * quantity:
+            return False, "Insufficient gold", None, []
+        if side == SELL and held < quantity:
+            return False, f"Insufficient {material}", None, []
+
+        order, fills = self.engine.submit_limit(player_id, material, side, price, quantity)
+        self._hold(order, fills)
+        self._record_fills(fills, side)
+        return True, "Order placed", order, fills
+
+    def place_market_order(self, player_id: int, material: str, side: str,
+                           quantity: float) -> Tuple[bool, str, Optional[Order], List[Fill]]:
+        """Place a market order; buys are capped by the player's available gold"""
+        valid, reason = self._validate(player_id, material, side, quantity)
+        if not valid:
+            return False, reason, None, []
+
+        gold, held = self._available_balances(player_id, material)
+        if side == BUY:
+            if gold <= 0:
+                return False, "Insufficient gold", None, []
+            order, fills = self.engine.submit_market(player_id, material, side, quantity, budget=gold)
+        else:
+            if held < quantity:
+                return False, f"Insufficient {material}", None, []
+            order, fills = self.engine.submit_market(player_id, material, side, quantity)
+
+        self._hold(order, fills)
+        self._record_fills(fills, side)
+        if not fills:
+            return False, "No matching orders", order, []
+        return True, "Order filled" if order.status == "filled" else "Order partially filled", order, fills
+
+    def cancel_order(self, order_id: int, player_id: int) -> bool:
+        """Cancel an open order (only by its owner)"""
+        return self.engine.cancel(order_id, player_id)
+
+    def get_order_book(self, material: str, levels: int = 5) -> Dict[str, List[Tuple[float, float]]]:
+        """Aggregated order book depth for a material"""
+        return self.engine.get_book(material).depth(levels)
+
+    def flush(self):
+        """Persist all changes since the last flush in one transaction"""
+        if not self.engine.has_pending_changes():
+            return
+        batch = self.engine.drain()
+        try:
+            self.store.flush(*batch)
+        except Exception:
+            self.engine.requeue(batch)
+            raise
+        self._pending_gold.clear()
+        self._pending_materials.clear()
+
+    async def flush_loop(self):
+        """Background task committing order book batches every few milliseconds"""
+        self.is_running = True
+        while self.is_running:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing order book: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def stop(self):
+        """Stop the flush loop after a final flush"""
+        self.is_running = False
+        self.flush()
+
+    def _validate(self, player_id: int, material: str, side: str, quantity: float) -> Tuple[bool, str]:
+        if material not in self.economy.materials:
+            return False, "Unknown material"
+        if side not in (BUY, SELL):
+            return False, "Invalid order side"
+        if quantity <= 0:
+            return False, "Quantity must be positive"
+        return True, "OK"
+
+    def _available_balances(self, player_id: int, material: str) -> Tuple[float, float]:
+        """Gold and material the player can still commit to new orders"""
+        with self.db.get_session() as session:
+            gold = session.query(Player.gold).filter(Player.id == player_id).scalar() or 0.0
+            held = session.query(PlayerMaterial.quantity).filter(
+                PlayerMaterial.player_id == player_id,
+                PlayerMaterial.material_type == material
+            ).scalar() or 0.0
+
+        # Open orders are already escrowed through the ledger, queued holds included
+        account = player_account(player_id)
+        gold += self.ledger.pending(account) + self._pending_gold.get(player_id, 0.0)
+        held += (self.ledger.pending(account, material_asset(material)) +
+                 self._pending_materials.get((player_id, material), 0.0))
+        return gold, held
+
+    def _attach(self, engine: MatchingEngine) -> MatchingEngine:
+        engine.on_cancel = self._release
+        return engine
+
+    def _hold(self, order: Order, fills: List[Fill]):
+        """Escrow what an order pays with: everything it filled plus any resting remainder"""
+        if order.side == BUY:
+            amount = sum(fill.total_price for fill in fills)
+        else:
+            amount = sum(fill.quantity for fill in fills)
+        if order.is_open:
+            amount += order.held
+        if amount > EPSILON:
+            self.ledger.post(transfer(player_account(order.player_id), ORDER_ESCROW, order.held_asset, amount,
+                                      "order_escrow", f"order:{order.order_id}"))
+
+    def _release(self, order: Order):
+        """Return the escrow of a cancelled order's remainder"""
+        if order.held > EPSILON:
+            self.ledger.post(transfer(ORDER_ESCROW, player_account(order.player_id), order.held_asset, order.held,
+                                      "order_release", f"order:{order.order_id}"))
+
+    def _record_fills(self, fills: List[Fill], taker_side: str):
+        if not fills:
+            return
+        gold_credits, material_credits = settlement_credits(fills)
+        for player_id, credit in gold_credits.items():
+            self._pending_gold[player_id] = self._pending_gold.get(player_id, 0.0) + credit
+        for key, credit in material_credits.items():
+            self._pending_materials[key] = self._pending_materials.get(key, 0.0) + credit
+        for fill in fills:
+            self.economy.apply_market_impact(fill.material, fill.quantity, taker_side)
@@ -0,0 +1,158 @@
+"""
+Price Engine for World War Telegram Bot
+Vectorised price simulation shared by EconomyManager and ComplexResourceManager
+"""
+import heapq
+from datetime import datetime
+from typing import Any, Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+class PriceEngine:
+    """Prices of every tradable material and resource, held in arrays.
+
+    A step combines, per instrument, mean reversion with Gaussian noise (EconomyManager
+    materials) and supply/demand pressure with uniform noise and market events
+    (ComplexResourceManager resources). Trade impact accumulates in an order-flow buffer
+    and is applied in one pass before prices are read or advanced.
+    """
+
+    PARAMETERS = ("base", "min_price", "max_price", "reversion", "gauss_scale", "uniform_scale",
+                  "supply_demand_scale", "impact_depth", "max_impact")
+
+    def __init__(self, rng: Optional[np.random.Generator] = None):
+        self.rng = rng or np.random.default_rng()
+        self.names: List[Hashable] = []
+        self.index: Dict[Hashable, int] = {}
+
+        self.prices = np.zeros(0)
+        self.previous = np.zeros(0)
+        self.demand = np.zeros(0)
+        self.supply = np.zeros(0)
+        self.flow = np.zeros(0)  # net traded quantity since the last flush (buys positive)
+        self.event_impact = np.zeros(0)  # summed impact of active market events
+        self.params: Dict[str, np.ndarray] = {name: np.zeros(0) for name in self.PARAMETERS}
+
+        # (expires, sequence, event) for active events; events indexed by affected instrument
+        self._event_expiry: List[tuple] = []
+        self._event_sequence = 0
+        self.events_by_instrument: Dict[int, List[Dict[str, Any]]] = {}
+        self._pending_flow = False
+
+    def register(self, names: Sequence[Hashable], prices, base, min_price, max_price,
+                 reversion=0.0, gauss_scale=0.0, uniform_scale=0.0, supply_demand_scale=0.0,
+                 demand=0.5, supply=0.5, impact_depth=1000.0, max_impact=0.1) -> slice:
+        """Add instruments and return the slice addressing them"""
+        duplicates = [name for name in names if name in self.index]
+        if duplicates:
+            raise ValueError(f"Instruments already registered: {duplicates}")
+
+        start, count = len(self.names), len(names)
+        for offset, name in enumerate(names):
+            self.index[name] = start + offset
+        self.names.extend(names)
+
+        def column(value):
+            return np.broadcast_to(np.asarray(value, dtype=np.float64), (count,))
+
+        values = dict(base=base, min_price=min_price, max_price=max_price, reversion=reversion,
+                      gauss_scale=gauss_scale, uniform_scale=uniform_scale,
+                      supply_demand_scale=supply_demand_scale, impact_depth=impact_depth,
+                      max_impact=max_impact)
+        for name in self.PARAMETERS:
+            self.params[name] = np.concatenate([self.params[name], column(values[name])])
+
+        self.prices = np.concatenate([self.prices, column(prices)])
+        self.previous = np.concatenate([self.previous, column(prices)])
+        self.demand = np.concatenate([self.demand, column(demand)])
+        self.supply = np.concatenate([self.supply, column(supply)])
+        self.flow = np.concatenate([self.flow, np.zeros(count)])
+        self.event_impact = np.concatenate([self.event_impact, np.zeros(count)])
+        return slice(start, start + count)
+
+    def step(self, group: slice = slice(None), now: Optional[datetime] = None):
+        """Advance the prices of a group of instruments (all by default) by one tick"""
+        self.apply_order_flow()
+        self.expire_events(now or datetime.now())
+
+        params = {name: values[group] for name, values in self.params.items()}
+        prices = self.prices[group]
+        demand, supply = self.demand[group], self.supply[group]
+        count = len(prices)
+
+        relative = (
+            (supply / np.maximum(demand, 0.1) - 1) * params["supply_demand_scale"]
+            + self.rng.uniform(-1.0, 1.0, count) * params["uniform_scale"]
+            + self.event_impact[group]
+        )
+        new_prices = (
+            prices * (1 + relative)
+            + self.rng.normal(0.0, 1.0, count) * params["gauss_scale"]
+            + (params["base"] - prices) * params["reversion"]
+        )
+        np.clip(new_prices, params["min_price"], params["max_price"], out=new_prices)
+
+        self.previous[group] = prices
+        self.prices[group] = new_prices
+
+        # Supply and demand only drift for instruments priced by them
+        driven = params["supply_demand_scale"] > 0
+        if driven.any():
+            drift = self.rng.uniform(-0.1, 0.1, (2, count))
+            self.demand[group] = np.where(driven, np.clip(demand + drift[0], 0.1, 1.0), demand)
+            self.supply[group] = np.where(driven, np.clip(supply + drift[1], 0.1, 1.0), supply)
+
+    def record_trade(self, name: Hashable, quantity: float, side: str):
+        """Add a trade to the order-flow buffer"""
+        if side == "buy":
+            self.flow[self.index[name]] += quantity
+        elif side == "sell":
+            self.flow[self.index[name]] -= quantity
+        else:
+            return
+        self._pending_flow = True
+
+    def apply_order_flow(self):
+        """Move prices by the net order flow since the last flush (capped at max_impact)"""
+        if not self._pending_flow:
+            return
+        params = self.params
+        impact = np.clip(self.flow / params["impact_depth"], -params["max_impact"], params["max_impact"])
+        self.prices *= 1 + impact
+        np.clip(self.prices, params["min_price"], params["max_price"], out=self.prices)
+        self.flow[:] = 0.0
+        self._pending_flow = False
+
+    def add_event(self, names: Sequence[Hashable], impact: float, expires: datetime, **details) -> Dict[str, Any]:
+        """Apply a market event's impact to the named instruments until it expires"""
+        indices = np.array([self.index[name] for name in names if name in self.index], dtype=np.intp)
+        event = dict(details, impact=impact, expires=expires, indices=indices)
+        np.add.at(self.event_impact, indices, impact)
+        for i in indices.tolist():
+            self.events_by_instrument.setdefault(i, []).append(event)
+        self._event_sequence += 1
+        heapq.heappush(self._event_expiry, (expires, self._event_sequence, event))
+        return event
+
+    def expire_events(self, now: datetime):
+        """Remove the impact of events that have expired"""
+        while self._event_expiry and self._event_expiry[0][0] <= now:
+            _, _, event = heapq.heappop(self._event_expiry)
+            np.subtract.at(self.event_impact, event["indices"], event["impact"])
+            for i in event["indices"].tolist():
+                self.events_by_instrument[i].remove(event)
+        if not self._event_expiry:
+            self.event_impact[:] = 0.0  # drop accumulated rounding error
+
+    def get_events(self, name: Hashable) -> List[Dict[str, Any]]:
+        """Active events affecting an instrument"""
+        return list(self.events_by_instrument.get(self.index[name], ()))
+
+    def get_prices(self, group: slice = slice(None)) -> Dict[Hashable, float]:
+        """Current prices of a group as a dict"""
+        self.apply_order_flow()
+        return dict(zip(self.names[group], self.prices[group].tolist()))
+
+    def get_price(self, name: Hashable) -> float:
+        self.apply_order_flow()
+        return float(self.prices[self.index[name]])
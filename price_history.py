@@ -0,0 +1,167 @@
+"""
+Price History Store for World War Telegram Bot
+Fixed-size NumPy ring buffers of price ticks with 1m/1h/1d OHLC rollups
+"""
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rollup resolution -> (bar length in seconds, bars kept)
+RESOLUTIONS = {
+    "1m": (60, 24 * 60),          # one day of minute bars
+    "1h": (3600, 24 * 7 * 8),     # eight weeks of hourly bars
+    "1d": (86400, 2 * 365),       # two years of daily bars
+}
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+
+class RingBuffer:
+    """Fixed-capacity buffer of rows for all materials, oldest rows overwritten first"""
+
+    def __init__(self, capacity: int, row_shape: Sequence[int] = ()):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros((capacity, *row_shape), dtype=np.float64)
+        self.count = 0  # total rows ever appended
+
+    @property
+    def size(self) -> int:
+        return min(self.count, self.capacity)
+
+    @property
+    def last_index(self) -> int:
+        return (self.count - 1) % self.capacity
+
+    def append(self, timestamp: float, row: np.ndarray):
+        index = self.count % self.capacity
+        self.times[index] = timestamp
+        self.values[index] = row
+        self.count += 1
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        """Indices of the newest n rows in chronological order"""
+        n = self.size if n is None else min(n, self.size)
+        return np.arange(self.count - n, self.count) % self.capacity
+
+class PriceHistoryStore:
+    """Price ticks and OHLC rollups for a fixed set of materials.
+
+    Every tick records all materials at once, so each buffer is a (time, material) array
+    and queries for one material or for all of them are slices, not rebuilt lists.
+    """
+
+    def __init__(self, materials: Sequence[str], tick_capacity: int = 2048):
+        self.materials: List[str] = list(materials)
+        self.index: Dict[str, int] = {material: i for i, material in enumerate(self.materials)}
+        self.ticks = RingBuffer(tick_capacity, (len(self.materials),))
+        self.bars = {
+            resolution: RingBuffer(capacity, (len(self.materials), 4))
+            for resolution, (_, capacity) in RESOLUTIONS.items()
+        }
+        self._last_saved = 0.0
+
+    @property
+    def tick_count(self) -> int:
+        """Number of ticks recorded so far (changes on every record)"""
+        return self.ticks.count
+
+    def record(self, prices: Dict[str, float], timestamp: Optional[datetime] = None):
+        """Record one price tick for all materials and update the rollups (naive times are UTC)"""
+        ts = time.time() if timestamp is None else timestamp.replace(tzinfo=timezone.utc).timestamp()
+        row = np.array([prices[material] for material in self.materials], dtype=np.float64)
+        self.ticks.append(ts, row)
+
+        for resolution, (seconds, _) in RESOLUTIONS.items():
+            buffer = self.bars[resolution]
+            bar_start = ts - ts % seconds
+            if buffer.count and buffer.times[buffer.last_index] == bar_start:
+                bar = buffer.values[buffer.last_index]
+                np.maximum(bar[:, HIGH], row, out=bar[:, HIGH])
+                np.minimum(bar[:, LOW], row, out=bar[:, LOW])
+                bar[:, CLOSE] = row
+            else:
+                buffer.append(bar_start, np.repeat(row[:, None], 4, axis=1))
+
+    def recent(self, material: str, n: Optional[int] = None) -> np.ndarray:
+        """Last n tick prices of a material, oldest first"""
+        return self.ticks.values[self.ticks.latest(n), self.index[material]]
+
+    def recent_matrix(self, n: Optional[int] = None) -> np.ndarray:
+        """Last n ticks for all materials as a (ticks, materials) array, oldest first"""
+        return self.ticks.values[self.ticks.latest(n)]
+
+    def get_ohlc(self, material: str, resolution: str = "1h", limit: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """OHLC bars of a material at a rollup resolution, oldest first"""
+        buffer = self.bars[resolution]
+        rows = buffer.latest(limit)
+        bars = buffer.values[rows, self.index[material]]
+        return {
+            "timestamp": buffer.times[rows],
+            "open": bars[:, OPEN],
+            "high": bars[:, HIGH],
+            "low": bars[:, LOW],
+            "close": bars[:, CLOSE],
+        }
+
+    def __len__(self) -> int:
+        return self.ticks.size
+
+    def save(self, path: str):
+        """Write the store to an .npz file atomically"""
+        arrays = {
+            "materials": np.array(self.materials),
+            "ticks_times": self.ticks.times,
+            "ticks_values": self.ticks.values,
+            "ticks_count": np.array(self.ticks.count),
+        }
+        for resolution, buffer in self.bars.items():
+            arrays[f"{resolution}_times"] = buffer.times
+            arrays[f"{resolution}_values"] = buffer.values
+            arrays[f"{resolution}_count"] = np.array(buffer.count)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        self._last_saved = time.monotonic()
+
+    def save_if_due(self, path: str, interval: float) -> bool:
+        """Save when at least interval seconds have passed since the last save"""
+        if time.monotonic() - self._last_saved < interval:
+            return False
+        self.save(path)
+        return True
+
+    def load(self, path: str) -> bool:
+        """Restore history saved by save(); materials are matched by name"""
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path) as data:
+                saved_index = {str(material): i for i, material in enumerate(data["materials"])}
+                missing = [material for material in self.materials if material not in saved_index]
+                if missing:
+                    logger.warning(f"Not loading price history {path}: no data for {', '.join(missing)}")
+                    return False
+                columns = [saved_index[material] for material in self.materials]
+
+                for name, buffer in [("ticks", self.ticks)] + list(self.bars.items()):
+                    times, values = data[f"{name}_times"], data[f"{name}_values"]
+                    saved = RingBuffer(len(times))
+                    saved.count = int(data[f"{name}_count"])
+                    rows = saved.latest(buffer.capacity)
+
+                    buffer.times[:len(rows)] = times[rows]
+                    buffer.values[:len(rows)] = values[rows][:, columns]
+                    buffer.count = len(rows)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable price history {path}: {e}")
+            return False
+        return True
@@ -5,9 +5,13 @@ import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager, Player, Province, Nation
+from ledger import GOLD, SHOP, Ledger, player_account, require_ledger
+from nation_modifiers import NationModifiers
 
 class ProvinceManager:
     def __init__(self):
+        self.ledger: Optional[Ledger] = None  # Shared ledger, set by bot
+        self.modifiers: Optional[NationModifiers] = None  # Technology effects, set by bot
         self.building_types = {
             "factory": {"cost": 1000, "production_bonus": 0.1, "description": "Increases material production"},
             "airbase": {"cost": 2000, "military_bonus": 0.15, "description": "Improves air unit effectiveness"},
@@ -97,7 +101,9 @@ class ProvinceManager:
                 return False, "Invalid building type"
             
             building_cost = self.building_types[building_type]["cost"]
-            if player.gold < building_cost:
+            # Counting ledger entries not yet committed
+            pending = self.ledger.pending(player_account(player.id)) if self.ledger else 0.0
+            if player.gold + pending < building_cost:
                 return False, "Not enough gold to build"
             
             # Check if building already exists
@@ -113,12 +119,10 @@ class ProvinceManager:
         if not can_build:
             return False
         
+        ledger = require_ledger(self.ledger, "ProvinceManager")
         with self.db.get_session() as session:
-            player = session.query(Player).filter_by(id=player_id).first()
             province = session.query(Province).filter_by(id=province_id).first()
-            
             building_cost = self.building_types[building_type]["cost"]
-            player.gold -= building_cost
             
             # Add building to province
             buildings = province.buildings or []
@@ -129,7 +133,11 @@ class ProvinceManager:
             self._apply_building_effects(province, building_type)
             
             session.commit()
-            return True
+        
+        # Paid through the ledger
+        ledger.transfer(player_account(player_id), SHOP, GOLD, building_cost, "building_purchase",
+                        f"province:{province_id}")
+        return True
     
     def _apply_building_effects(self, province: Province, building_type: str):
         """Apply building effects to province"""
@@ -172,6 +180,16 @@ class ProvinceManager:
                 if "mineral_bonus" in building:
                     production["iron"] *= (1 + building["mineral_bonus"])
             
+            # Apply the owner's technology effects
+            if self.modifiers and province.owner_id:
+                vector = self.modifiers.vector(province.owner_id)
+                all_production = self.modifiers.columns("all_production")[0]
+                for material, column in zip(production, self.modifiers.columns(*(f"{m}_production" for m in production))):
+                    if column is not None:
+                        production[material] *= vector[column]
+                    if all_production is not None:
+                        production[material] *= vector[all_production]
+            
             return production
     
     def process_daily_production(self):
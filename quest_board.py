@@ -0,0 +1,165 @@
+"""
+Quest Board for World War Telegram Bot
+Per-difficulty quest pools and personalised boards that rotate on a schedule
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from database import DatabaseManager, Quest
+from quest_eligibility import QuestEligibility
+
+logger = logging.getLogger(__name__)
+
+@dataclass(slots=True)
+class PlayerBoard:
+    """Quests picked for one player in one rotation"""
+    epoch: int
+    level: int
+    quest_ids: List[int]
+
+class QuestBoard:
+    """Shows each player a stable board of quests they can actually accept.
+
+    Active quests are kept in per-difficulty pools that each rotation brings up to date.
+    A player's board is drawn from the pools up to a little above their level, filtered
+    by the quests' level and unit requirements and kept until the next rotation or until
+    the player levels up or their units change.
+    """
+
+    LOAD_BATCH = 500
+
+    def __init__(self, db_manager: DatabaseManager, eligibility: QuestEligibility, board_size: int = 5,
+                 rotation_interval: float = 3600.0, level_window: int = 2, max_cached: int = 10000,
+                 seed: Optional[int] = None):
+        self.db = db_manager
+        self.eligibility = eligibility
+        self.board_size = board_size
+        self.rotation_interval = rotation_interval
+        self.level_window = level_window
+        self.max_cached = max_cached
+        self.seed = random.Random().getrandbits(32) if seed is None else seed
+        self.is_running = False
+
+        self.epoch = 0
+        self.pools: Dict[int, List[int]] = {}
+        self.quests: Dict[int, Quest] = {}
+        self._boards: "OrderedDict[int, PlayerBoard]" = OrderedDict()
+        self._loaded = False
+
+    def rotate(self):
+        """Sync the pools with the active quests and start a new rotation.
+
+        Only the ids of active quests are read each time; quests activated since the
+        last rotation are loaded in full and retired ones dropped, so nothing unchanged
+        is reloaded.
+        """
+        with self.db.get_session() as session:
+            if not self._loaded:
+                added = session.query(Quest).filter(Quest.is_active == True).order_by(Quest.id).all()
+                removed = []
+            else:
+                active = {quest_id for (quest_id,) in session.query(Quest.id).filter(Quest.is_active == True)}
+                removed = [quest_id for quest_id in self.quests if quest_id not in active]
+                new_ids = sorted(active.difference(self.quests))
+                added = []
+                for start in range(0, len(new_ids), self.LOAD_BATCH):
+                    added.extend(session.query(Quest).filter(
+                        Quest.id.in_(new_ids[start:start + self.LOAD_BATCH])
+                    ).order_by(Quest.id))
+            session.expunge_all()
+
+        changed = set()
+        for quest_id in removed:
+            changed.add(self.quests.pop(quest_id).difficulty or 1)
+        for quest in added:
+            self.quests[quest.id] = quest
+            changed.add(quest.difficulty or 1)
+        if changed:
+            pools = defaultdict(list)
+            for quest_id, quest in self.quests.items():
+                if (quest.difficulty or 1) in changed:
+                    pools[quest.difficulty or 1].append(quest_id)
+            for difficulty in changed:
+                if pools.get(difficulty):
+                    self.pools[difficulty] = sorted(pools[difficulty])
+                else:
+                    self.pools.pop(difficulty, None)
+
+        # Retired quests are re-read as inactive if a player still looks them up
+        self.eligibility.forget_quests(removed)
+        self.eligibility.requirements(added)
+        self.epoch += 1
+        self._boards.clear()
+        self._loaded = True
+
+    def invalidate(self, player_id: Optional[int] = None):
+        """Drop a player's board after a level-up or unit change (all players if None)"""
+        if player_id is None:
+            self._boards.clear()
+        else:
+            self._boards.pop(player_id, None)
+
+    def board(self, player_id: int, limit: Optional[int] = None) -> List[Quest]:
+        """Quests the player can accept right now, from their board for this rotation"""
+        if not self._loaded:
+            self.rotate()
+        context = self.eligibility.context(player_id)
+        if context is None:
+            return []
+
+        board = self._boards.get(player_id)
+        if board is None or board.epoch != self.epoch or board.level != context.level:
+            board = self._draw(player_id, context)
+        else:
+            self._boards.move_to_end(player_id)
+
+        # Accepted quests and newly unmet requirements drop off without a redraw
+        requirements = self.eligibility.requirements(board.quest_ids)
+        shown = [self.quests[quest_id] for quest_id, compiled in zip(board.quest_ids, requirements)
+                 if compiled is not None and self.eligibility.check(context, compiled)[0]]
+        return shown[:limit] if limit is not None else shown
+
+    def _draw(self, player_id: int, context) -> PlayerBoard:
+        """Pick a player's board from the pools around their level"""
+        # Easier quests stay on offer; harder ones only up to level_window above the player
+        candidates = []
+        for difficulty in sorted(self.pools):
+            if difficulty > context.level + self.level_window:
+                break
+            candidates.extend(self.pools[difficulty])
+        # Seeded by player and rotation so a redraw within a rotation shows the same quests
+        random.Random(hash((self.seed, self.epoch, player_id))).shuffle(candidates)
+
+        # Active quests and the active-quest limit change without a redraw, so they are only
+        # applied when the board is shown
+        quest_ids = []
+        for quest_id, compiled in zip(candidates, self.eligibility.requirements(candidates)):
+            if compiled is not None and self.eligibility.meets_requirements(context, compiled)[0]:
+                quest_ids.append(quest_id)
+                if len(quest_ids) >= self.board_size:
+                    break
+
+        board = PlayerBoard(self.epoch, context.level, quest_ids)
+        self._boards[player_id] = board
+        while len(self._boards) > self.max_cached:
+            self._boards.popitem(last=False)
+        return board
+
+    async def run(self):
+        """Background task rotating the boards"""
+        self.is_running = True
+        while self.is_running:
+            try:
+                self.rotate()
+            except Exception as e:
+                logger.error(f"Error rotating quest board: {e}")
+            await asyncio.sleep(self.rotation_interval)
+
+    def stop(self):
+        """Stop the rotation loop"""
+        self.is_running = False
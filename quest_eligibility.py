@@ -0,0 +1,211 @@
+"""
+Quest Eligibility Engine for World War Telegram Bot
+Cached per-player contexts, batch requirement checks and atomic quest acceptance
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import exists, func, literal, select
+
+from database import DatabaseManager, Player, PlayerQuest, PlayerUnit, Quest
+from trade_settlement import locked_transaction
+
+MAX_ACTIVE_QUESTS = 3
+
+@dataclass(slots=True)
+class EligibilityContext:
+    """Everything quest requirements are checked against, loaded once per player"""
+    player_id: int
+    level: int
+    units: Dict[str, int]
+    active_quest_ids: Set[int]
+    loaded_at: float
+
+@dataclass(frozen=True, slots=True)
+class QuestRequirements:
+    """A quest's requirements in a form that is cheap to test"""
+    quest_id: int
+    is_active: bool
+    min_level: int
+    units: Tuple[Tuple[str, int], ...]
+
+    @classmethod
+    def from_quest(cls, quest: Quest) -> "QuestRequirements":
+        requirements = quest.requirements or {}
+        return cls(
+            quest_id=quest.id,
+            is_active=bool(quest.is_active),
+            min_level=requirements.get("level", 1),
+            units=tuple(sorted(requirements.get("units", {}).items()))
+        )
+
+class QuestEligibility:
+    """Decides which quests players may accept.
+
+    A player's level, unit totals and active quests are loaded together and cached for
+    ttl seconds (or until invalidated), so checking a whole quest board costs no queries.
+    Acceptance re-checks the active-quest limit in the INSERT itself.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, ttl: float = 60.0, max_cached: int = 10000):
+        self.db = db_manager
+        self.ttl = ttl
+        self.max_cached = max_cached
+        self.on_accepted: Optional[Callable[[int, int], None]] = None  # Called with (player_id, quest_id)
+        self._contexts: "OrderedDict[int, EligibilityContext]" = OrderedDict()
+        self._requirements: Dict[int, QuestRequirements] = {}
+
+    def context(self, player_id: int) -> Optional[EligibilityContext]:
+        """Eligibility context of a player, from the cache when fresh"""
+        context = self._contexts.get(player_id)
+        if context is not None and time.monotonic() - context.loaded_at < self.ttl:
+            self._contexts.move_to_end(player_id)
+            return context
+
+        with self.db.get_session() as session:
+            level = session.query(Player.level).filter(Player.id == player_id).scalar()
+            if level is None:
+                self._contexts.pop(player_id, None)
+                return None
+            units = dict(session.query(PlayerUnit.unit_type, func.sum(PlayerUnit.quantity)).filter(
+                PlayerUnit.player_id == player_id
+            ).group_by(PlayerUnit.unit_type))
+            active = {quest_id for (quest_id,) in session.query(PlayerQuest.quest_id).filter(
+                PlayerQuest.player_id == player_id, PlayerQuest.status == "active"
+            )}
+
+        context = EligibilityContext(player_id, level, {k: int(v or 0) for k, v in units.items()}, active,
+                                     time.monotonic())
+        self._contexts[player_id] = context
+        self._contexts.move_to_end(player_id)
+        while len(self._contexts) > self.max_cached:
+            self._contexts.popitem(last=False)
+        return context
+
+    def invalidate(self, player_id: Optional[int] = None):
+        """Forget cached contexts after level, unit or quest changes (all players if None)"""
+        if player_id is None:
+            self._contexts.clear()
+        else:
+            self._contexts.pop(player_id, None)
+
+    def requirements(self, quests: Iterable) -> List[Optional[QuestRequirements]]:
+        """Compiled requirements for Quest objects or quest ids (None for unknown ids)"""
+        quests = list(quests)
+        missing = [q for q in quests if isinstance(q, int) and q not in self._requirements]
+        if missing:
+            with self.db.get_session() as session:
+                for quest in session.query(Quest).filter(Quest.id.in_(missing)):
+                    self._requirements[quest.id] = QuestRequirements.from_quest(quest)
+
+        compiled = []
+        for quest in quests:
+            if isinstance(quest, int):
+                compiled.append(self._requirements.get(quest))
+            else:
+                requirements = QuestRequirements.from_quest(quest)
+                self._requirements[quest.id] = requirements
+                compiled.append(requirements)
+        return compiled
+
+    def forget_quests(self, quest_ids: Optional[Iterable[int]] = None):
+        """Drop compiled requirements after quests change (all if None)"""
+        if quest_ids is None:
+            self._requirements.clear()
+        else:
+            for quest_id in quest_ids:
+                self._requirements.pop(quest_id, None)
+
+    @staticmethod
+    def meets_requirements(context: EligibilityContext, requirements: QuestRequirements) -> Tuple[bool, str]:
+        """Test a quest's own requirements (availability, level, units), ignoring the player's active quests"""
+        if not requirements.is_active:
+            return False, "Quest is not available"
+        if context.level < requirements.min_level:
+            return False, "Level too low for this quest"
+        for unit_type, required_count in requirements.units:
+            if context.units.get(unit_type, 0) < required_count:
+                return False, f"Not enough {unit_type} units (need {required_count})"
+        return True, "Requirements met"
+
+    @staticmethod
+    def check(context: EligibilityContext, requirements: QuestRequirements) -> Tuple[bool, str]:
+        """Test one quest against a player's context"""
+        met, reason = QuestEligibility.meets_requirements(context, requirements)
+        if not met:
+            return False, reason
+        if requirements.quest_id in context.active_quest_ids:
+            return False, "You already have this quest"
+        if len(context.active_quest_ids) >= MAX_ACTIVE_QUESTS:
+            return False, f"You can only have {MAX_ACTIVE_QUESTS} active quests at a time"
+        return True, "Can accept quest"
+
+    def evaluate(self, player_id: int, quests: Iterable) -> Dict[int, Tuple[bool, str]]:
+        """Check many quests (objects or ids) for one player in a single pass"""
+        quests = list(quests)
+        context = self.context(player_id)
+        results = {}
+        for quest, requirements in zip(quests, self.requirements(quests)):
+            quest_id = quest if isinstance(quest, int) else quest.id
+            if context is None or requirements is None:
+                results[quest_id] = (False, "Player or quest not found")
+            else:
+                results[quest_id] = self.check(context, requirements)
+        return results
+
+    def eligible(self, player_id: int, quests: Iterable) -> List:
+        """The quests a player can accept now, in the given order"""
+        quests = list(quests)
+        results = self.evaluate(player_id, quests)
+        return [quest for quest in quests if results[quest if isinstance(quest, int) else quest.id][0]]
+
+    def accept(self, player_id: int, quest_id: int) -> Tuple[bool, str]:
+        """Accept a quest; the duplicate and active-limit checks run inside the INSERT"""
+        can_accept, reason = self.evaluate(player_id, [quest_id])[quest_id]
+        if not can_accept:
+            return False, reason
+
+        player_quests = PlayerQuest.__table__
+        active_count = select(func.count()).select_from(player_quests).where(
+            player_quests.c.player_id == player_id, player_quests.c.status == "active"
+        ).scalar_subquery()
+        duplicate = exists().where(
+            player_quests.c.player_id == player_id,
+            player_quests.c.quest_id == quest_id,
+            player_quests.c.status == "active"
+        )
+        row = select(
+            literal(player_id), literal(quest_id), literal("active"), literal(datetime.utcnow()), literal(0.0)
+        ).where(active_count < MAX_ACTIVE_QUESTS, ~duplicate)
+
+        with locked_transaction(self.db) as session:
+            # Serialise acceptances by the same player on backends with row locks
+            session.query(Player.id).filter(Player.id == player_id).with_for_update().scalar()
+            result = session.execute(player_quests.insert().from_select(
+                ["player_id", "quest_id", "status", "started_at", "progress"], row
+            ))
+            session.commit()
+
+        if result.rowcount != 1:
+            # Another acceptance got there first; reload to report why
+            self.invalidate(player_id)
+            return self.evaluate(player_id, [quest_id])[quest_id]
+        context = self._contexts.get(player_id)
+        if context is not None:
+            context.active_quest_ids.add(quest_id)
+        if self.on_accepted:
+            self.on_accepted(player_id, quest_id)
+        return True, "Quest accepted"
+
+    def quest_finished(self, player_id: int, quest_id: int, level_changed: bool = False):
+        """Update a cached context after a quest completes, fails or expires"""
+        context = self._contexts.get(player_id)
+        if context is None:
+            return
+        if level_changed:
+            self.invalidate(player_id)
+        else:
+            context.active_quest_ids.discard(quest_id)
@@ -0,0 +1,167 @@
+"""
+Quest Generator for World War Telegram Bot
+Batch procedural quest generation with per-level variants
+"""
+from datetime import datetime, time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from database import DatabaseManager, Quest
+
+REWARD_MATERIALS = ["iron", "oil", "food", "gold", "uranium", "steel"]
+MILITARY_QUEST_TYPES = ("invasion", "sabotage")
+
+# Codenames keep generated titles distinct: 32 x 32 operations per template title
+CODENAME_ADJECTIVES = [
+    "Iron", "Silent", "Crimson", "Northern", "Black", "Golden", "Frozen", "Burning",
+    "Hidden", "Swift", "Steel", "Shattered", "Distant", "Thunder", "Midnight", "Broken",
+    "Scarlet", "Grey", "Copper", "Desert", "Arctic", "Emerald", "Hollow", "Rising",
+    "Savage", "Southern", "Storm", "Twilight", "Valiant", "Winter", "Amber", "Obsidian"
+]
+CODENAME_NOUNS = [
+    "Anvil", "Falcon", "Harvest", "Lance", "Tempest", "Citadel", "Dawn", "Spear",
+    "Viper", "Bastion", "Comet", "Eagle", "Forge", "Glacier", "Hammer", "Horizon",
+    "Jackal", "Kestrel", "Lantern", "Meridian", "Nomad", "Oracle", "Phoenix", "Rampart",
+    "Sentinel", "Talon", "Trident", "Vanguard", "Warden", "Wolf", "Zephyr", "Cobra"
+]
+
+TitleKey = Tuple[str, str]  # (title, quest_type)
+# Every generated title starts with its codename
+GENERATED_TITLE_PREFIX = "Operation "
+
+class QuestGenerator:
+    """Generates many quests at once from the QuestManager templates.
+
+    All random draws for a quest type and level are made as arrays, titles are checked
+    against an in-memory index of active (title, quest_type) pairs, and the result is
+    written with a single bulk INSERT. Each daily run retires the generated quests of
+    earlier days, so only the current set stays on the boards.
+    """
+
+    def __init__(self, templates: Dict[str, Dict], generator: Optional[np.random.Generator] = None):
+        self.templates = templates
+        self.generator = generator if generator is not None else np.random.default_rng()
+
+    @staticmethod
+    def load_title_index(session) -> Set[TitleKey]:
+        """Every (title, quest_type) pair of an active quest"""
+        return set(session.query(Quest.title, Quest.quest_type).filter(Quest.is_active == True).all())
+
+    @staticmethod
+    def retire(session, before: datetime) -> int:
+        """Deactivate generated quests created before a moment; returns how many were retired.
+
+        Players who already accepted one can still finish it.
+        """
+        return session.query(Quest).filter(
+            Quest.is_active == True,
+            Quest.created_at < before,
+            Quest.title.startswith(GENERATED_TITLE_PREFIX)
+        ).update({Quest.is_active: False}, synchronize_session=False)
+
+    def title(self, quest_type: str, title: int, codename: int, level: Optional[int]) -> str:
+        adjective, noun = divmod(codename, len(CODENAME_NOUNS))
+        name = (f"{GENERATED_TITLE_PREFIX}{CODENAME_ADJECTIVES[adjective]} {CODENAME_NOUNS[noun]}: "
+                f"{self.templates[quest_type]['titles'][title]}")
+        return name if level is None else f"{name} (Lv {level})"
+
+    def generate(self, quest_type: str, count: int, level: int = 1, variant: bool = False,
+                 title_index: Optional[Set[TitleKey]] = None) -> List[Dict]:
+        """Rows for up to count new quests of one type tuned for a player level.
+
+        Variants carry the level in their title and may go past the template's difficulty
+        range so high-level players get harder quests. New titles are added to title_index.
+        """
+        template = self.templates[quest_type]
+        title_index = set() if title_index is None else title_index
+        titles = len(template["titles"])
+        codenames = len(CODENAME_ADJECTIVES) * len(CODENAME_NOUNS)
+        rng = self.generator
+
+        # Oversample so that collisions with existing titles rarely leave the batch short
+        size = count + count // 2 + 8
+        title_ids = rng.integers(0, titles, size)
+        codename_ids = rng.integers(0, codenames, size)
+        keep = []
+        for i in range(size):
+            key = (self.title(quest_type, title_ids[i], codename_ids[i], level if variant else None), quest_type)
+            if key not in title_index:
+                title_index.add(key)
+                keep.append(key[0])
+                if len(keep) == count:
+                    break
+        n = len(keep)
+        if n == 0:
+            return []
+
+        min_diff, max_diff = template["difficulty_range"]
+        if variant:
+            max_diff = max(max_diff, level + 1)
+        difficulty = np.clip(level + rng.integers(-1, 2, n), min_diff, max_diff)
+        min_dur, max_dur = template["duration_range"]
+        duration = rng.integers(min_dur, max_dur + 1, n)
+        base = template["base_rewards"]
+        gold = (base.get("gold", 0) * difficulty * rng.uniform(0.8, 1.2, n)).astype(np.int64)
+        experience = (base.get("experience", 0) * difficulty * rng.uniform(0.8, 1.2, n)).astype(np.int64)
+        material = rng.integers(0, len(REWARD_MATERIALS), n)
+        material_quantity = rng.integers(10, 51, n) * difficulty
+        descriptions = rng.integers(0, len(template["descriptions"]), n)
+
+        units = {}
+        if quest_type in MILITARY_QUEST_TYPES:
+            # Unit needs grow with difficulty past the template range
+            scale = np.maximum(1, difficulty - 4)
+            units = {
+                "infantry": (3, rng.integers(5, 21, n) * scale),
+                "tank": (4, rng.integers(2, 9, n) * scale),
+                "aircraft": (5, rng.integers(1, 4, n) * scale),
+            }
+
+        now = datetime.utcnow()
+        rows = []
+        for i in range(n):
+            d = int(difficulty[i])
+            rewards = {"gold": int(gold[i]), "experience": int(experience[i])}
+            for reward_type, amount in base.items():
+                rewards.setdefault(reward_type, amount)
+            if d >= 3:
+                rewards["materials"] = {REWARD_MATERIALS[material[i]]: int(material_quantity[i])}
+            requirements = {"level": max(1, d - 1)}
+            unit_requirements = {unit: int(counts[i]) for unit, (from_difficulty, counts) in units.items()
+                                 if d >= from_difficulty}
+            if unit_requirements:
+                requirements["units"] = unit_requirements
+            rows.append({
+                "title": keep[i],
+                "description": template["descriptions"][descriptions[i]],
+                "quest_type": quest_type,
+                "difficulty": d,
+                "duration": int(duration[i]),
+                "rewards": rewards,
+                "requirements": requirements,
+                "is_active": True,
+                "created_at": now,
+            })
+        return rows
+
+    def generate_daily(self, db_manager: DatabaseManager, per_type: int = 5,
+                       levels: Optional[Iterable[int]] = None) -> int:
+        """Generate and insert per_type quests of every type, as variants for each level if given
+
+        Generated quests from previous days are retired first. Returns the number of
+        quests inserted.
+        """
+        variant = levels is not None
+        levels = sorted(set(levels)) if variant else [1]
+        with db_manager.get_session() as session:
+            self.retire(session, datetime.combine(datetime.utcnow().date(), time.min))
+            title_index = self.load_title_index(session)
+            rows = []
+            for quest_type in self.templates:
+                for level in levels:
+                    rows.extend(self.generate(quest_type, per_type, level, variant, title_index))
+            if rows:
+                session.execute(Quest.__table__.insert(), rows)
+            session.commit()
+        return len(rows)
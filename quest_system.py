@@ -3,13 +3,25 @@ Quest System for World War Telegram Bot
 """
 import random
 import json
+import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager, Player, Quest, PlayerQuest, PlayerUnit, PlayerMaterial
+from ledger import GOLD, QUEST_REWARDS, Ledger, material_asset, player_account, require_ledger, transfer
+from quest_board import QuestBoard
+from quest_eligibility import QuestEligibility
+from quest_generator import QuestGenerator
+from quest_timers import QuestNotification, QuestTimerQueue
 
 class QuestManager:
-    def __init__(self):
+    def __init__(self, rng: Optional[random.Random] = None):
         self.db = None  # Will be set by bot
+        self.ledger: Optional[Ledger] = None  # Shared ledger, set by bot
+        self._eligibility: Optional[QuestEligibility] = None
+        self._board: Optional[QuestBoard] = None
+        self._timers: Optional[QuestTimerQueue] = None
+        self.on_notify = None  # Called with a list of QuestNotification, set by bot
+        self.rng = rng or random.Random()
         self.quest_templates = {
             "recon": {
                 "titles": [
@@ -106,33 +118,33 @@ class QuestManager:
         template = self.quest_templates[quest_type]
         
         # Select random title and description
-        title = random.choice(template["titles"])
-        description = random.choice(template["descriptions"])
+        title = self.rng.choice(template["titles"])
+        description = self.rng.choice(template["descriptions"])
         
         # Calculate difficulty based on player level
         min_diff, max_diff = template["difficulty_range"]
-        difficulty = min(max_diff, max(min_diff, player_level + random.randint(-1, 1)))
+        difficulty = min(max_diff, max(min_diff, player_level + self.rng.randint(-1, 1)))
         
         # Calculate duration
         min_dur, max_dur = template["duration_range"]
-        duration = random.randint(min_dur, max_dur)
+        duration = self.rng.randint(min_dur, max_dur)
         
         # Calculate rewards based on difficulty
         base_rewards = template["base_rewards"].copy()
         rewards = {}
         for reward_type, base_amount in base_rewards.items():
             if reward_type == "gold":
-                rewards[reward_type] = int(base_amount * difficulty * random.uniform(0.8, 1.2))
+                rewards[reward_type] = int(base_amount * difficulty * self.rng.uniform(0.8, 1.2))
             elif reward_type == "experience":
-                rewards[reward_type] = int(base_amount * difficulty * random.uniform(0.8, 1.2))
+                rewards[reward_type] = int(base_amount * difficulty * self.rng.uniform(0.8, 1.2))
             else:
                 rewards[reward_type] = base_amount
         
         # Add random material rewards for higher difficulty quests
         if difficulty >= 3:
             materials = ["iron", "oil", "food", "gold", "uranium", "steel"]
-            material_reward = random.choice(materials)
-            rewards["materials"] = {material_reward: random.randint(10, 50) * difficulty}
+            material_reward = self.rng.choice(materials)
+            rewards["materials"] = {material_reward: self.rng.randint(10, 50) * difficulty}
         
         # Create quest requirements
         requirements = {"level": max(1, difficulty - 1)}
@@ -141,11 +153,11 @@ class QuestManager:
         if quest_type in ["invasion", "sabotage"]:
             unit_requirements = {}
             if difficulty >= 3:
-                unit_requirements["infantry"] = random.randint(5, 20)
+                unit_requirements["infantry"] = self.rng.randint(5, 20)
             if difficulty >= 4:
-                unit_requirements["tank"] = random.randint(2, 8)
+                unit_requirements["tank"] = self.rng.randint(2, 8)
             if difficulty >= 5:
-                unit_requirements["aircraft"] = random.randint(1, 3)
+                unit_requirements["aircraft"] = self.rng.randint(1, 3)
             
             if unit_requirements:
                 requirements["units"] = unit_requirements
@@ -162,79 +174,63 @@ class QuestManager:
     
     def get_available_quests(self, player_id: int, limit: int = 10) -> List[Quest]:
         """Get available quests for a player"""
+        return self.board.board(player_id, limit)
+    
+    @property
+    def eligibility(self) -> QuestEligibility:
+        """Eligibility engine over the current database"""
+        if self._eligibility is None or self._eligibility.db is not self.db:
+            self._eligibility = QuestEligibility(self.db)
+            self._eligibility.on_accepted = self._schedule_deadline
+        return self._eligibility
+    
+    @property
+    def board(self) -> QuestBoard:
+        """Quest board over the current eligibility engine"""
+        eligibility = self.eligibility
+        if self._board is None or self._board.eligibility is not eligibility:
+            self._board = QuestBoard(self.db, eligibility, seed=self.rng.getrandbits(32))
+        return self._board
+    
+    @property
+    def timers(self) -> QuestTimerQueue:
+        """Deadline queue over the current database"""
+        if self._timers is None or self._timers.db is not self.db:
+            self._timers = QuestTimerQueue(self.db, on_expired=self._on_quests_expired, on_notify=self._notify)
+        return self._timers
+    
+    def _schedule_deadline(self, player_id: int, quest_id: int):
+        """Put a newly accepted quest on the deadline queue"""
         with self.db.get_session() as session:
-            player = session.query(Player).filter_by(id=player_id).first()
-            if not player:
-                return []
-            
-            # Get quests that player can accept
-            available_quests = session.query(Quest).filter(
-                Quest.is_active == True,
-                Quest.difficulty <= player.level + 2  # Allow some higher level quests
-            ).limit(limit).all()
-            
-            return available_quests
+            row = session.query(PlayerQuest.id, PlayerQuest.started_at, Quest.duration).join(
+                Quest, PlayerQuest.quest_id == Quest.id
+            ).filter(
+                PlayerQuest.player_id == player_id, PlayerQuest.quest_id == quest_id, PlayerQuest.status == "active"
+            ).first()
+        if row:
+            self.timers.schedule(row.id, player_id, quest_id, row.started_at + timedelta(seconds=row.duration or 0))
+    
+    def _on_quests_expired(self, expired: List[Tuple[int, int]]):
+        for player_id, quest_id in expired:
+            self.eligibility.quest_finished(player_id, quest_id)
+    
+    def _notify(self, notifications: List[QuestNotification]):
+        if self.on_notify:
+            self.on_notify(notifications)
+    
+    def player_changed(self, player_id: int):
+        """Refresh a player's eligibility and quest board after their level or units change"""
+        self.eligibility.invalidate(player_id)
+        self.board.invalidate(player_id)
     
     def can_accept_quest(self, player_id: int, quest_id: int) -> Tuple[bool, str]:
         """Check if player can accept a quest"""
-        with self.db.get_session() as session:
-            player = session.query(Player).filter_by(id=player_id).first()
-            quest = session.query(Quest).filter_by(id=quest_id).first()
-            
-            if not player or not quest:
-                return False, "Player or quest not found"
-            
-            if not quest.is_active:
-                return False, "Quest is not available"
-            
-            # Check level requirement
-            if player.level < quest.requirements.get("level", 1):
-                return False, "Level too low for this quest"
-            
-            # Check unit requirements
-            if "units" in quest.requirements:
-                player_units = self._get_player_units(session, player_id)
-                for unit_type, required_count in quest.requirements["units"].items():
-                    if player_units.get(unit_type, 0) < required_count:
-                        return False, f"Not enough {unit_type} units (need {required_count})"
-            
-            # Check if player already has this quest
-            existing_quest = session.query(PlayerQuest).filter_by(
-                player_id=player_id,
-                quest_id=quest_id,
-                status="active"
-            ).first()
-            
-            if existing_quest:
-                return False, "You already have this quest"
-            
-            # Check quest limit (max 3 active quests)
-            active_quests = session.query(PlayerQuest).filter_by(
-                player_id=player_id,
-                status="active"
-            ).count()
-            
-            if active_quests >= 3:
-                return False, "You can only have 3 active quests at a time"
-            
-            return True, "Can accept quest"
+        return self.eligibility.evaluate(player_id, [quest_id])[quest_id]
     
     def accept_quest(self, player_id: int, quest_id: int) -> bool:
         """Accept a quest for a player"""
-        can_accept, reason = self.can_accept_quest(player_id, quest_id)
-        if not can_accept:
-            return False
-        
-        with self.db.get_session() as session:
-            player_quest = PlayerQuest(
-                player_id=player_id,
-                quest_id=quest_id,
-                status="active",
-                started_at=datetime.utcnow()
-            )
-            session.add(player_quest)
-            session.commit()
-            return True
+        accepted, _ = self.eligibility.accept(player_id, quest_id)
+        return accepted
     
     def get_player_quests(self, player_id: int) -> List[PlayerQuest]:
         """Get all quests for a player"""
@@ -264,6 +260,7 @@ class QuestManager:
     
     def complete_quest(self, player_id: int, quest_id: int) -> bool:
         """Complete a quest and give rewards"""
+        ledger = require_ledger(self.ledger, "QuestManager")
         with self.db.get_session() as session:
             player_quest = session.query(PlayerQuest).filter_by(
                 player_id=player_id,
@@ -276,13 +273,17 @@ class QuestManager:
             
             quest = player_quest.quest
             player = player_quest.player
+            level = player.level
             
             # Give rewards
             rewards = quest.rewards or {}
+            account = player_account(player_id)
+            reference = f"quest:{quest_id}"
+            entries = []
             
             # Gold reward
             if "gold" in rewards:
-                player.gold += rewards["gold"]
+                entries.append(transfer(QUEST_REWARDS, account, GOLD, rewards["gold"], "quest_reward", reference))
             
             # Experience reward
             if "experience" in rewards:
@@ -293,28 +294,24 @@ class QuestManager:
             # Material rewards
             if "materials" in rewards:
                 for material_type, quantity in rewards["materials"].items():
-                    player_material = session.query(PlayerMaterial).filter_by(
-                        player_id=player_id,
-                        material_type=material_type
-                    ).first()
-                    
-                    if player_material:
-                        player_material.quantity += quantity
-                    else:
-                        player_material = PlayerMaterial(
-                            player_id=player_id,
-                            material_type=material_type,
-                            quantity=quantity
-                        )
-                        session.add(player_material)
+                    entries.append(transfer(QUEST_REWARDS, account, material_asset(material_type), quantity,
+                                            "quest_reward", reference))
             
             # Update quest status
             player_quest.status = "completed"
             player_quest.completed_at = datetime.utcnow()
             player_quest.progress = 1.0
             
+            # Rewards are paid in the same transaction that completes the quest
+            ledger.record(session, entries, apply=True)
             session.commit()
-            return True
+            level_changed = player.level != level
+            self.timers.cancel(player_quest.id)
+            notification = QuestNotification(player_id, player.telegram_id, quest_id, quest.title, "completed")
+        
+        self.eligibility.quest_finished(player_id, quest_id, level_changed)
+        self.timers.notify([notification])
+        return True
     
     def fail_quest(self, player_id: int, quest_id: int) -> bool:
         """Mark a quest as failed"""
@@ -332,27 +329,14 @@ class QuestManager:
             player_quest.completed_at = datetime.utcnow()
             
             session.commit()
-            return True
-    
-    def process_quest_timeouts(self):
-        """Process quest timeouts and failures"""
-        with self.db.get_session() as session:
-            # Get expired active quests
-            expired_quests = session.query(PlayerQuest).filter(
-                PlayerQuest.status == "active",
-                PlayerQuest.started_at < datetime.utcnow() - timedelta(seconds=PlayerQuest.quest.duration)
-            ).all()
-            
-            for player_quest in expired_quests:
-                player_quest.status = "expired"
-                player_quest.completed_at = datetime.utcnow()
-            
-            session.commit()
+            self.timers.cancel(player_quest.id)
+        
+        self.eligibility.quest_finished(player_id, quest_id)
+        return True
     
-    def _get_player_units(self, session, player_id: int) -> Dict[str, int]:
-        """Get player unit counts"""
-        units = session.query(PlayerUnit).filter_by(player_id=player_id).all()
-        return {unit.unit_type: unit.quantity for unit in units}
+    def process_quest_timeouts(self) -> int:
+        """Expire quests past their deadline; the bot runs timers.run() to do this as they come due"""
+        return self.timers.expire()
     
     def _check_level_up(self, session, player: Player):
         """Check if player should level up"""
@@ -374,21 +358,10 @@ class QuestManager:
             else:
                 player.rank = "Commander"
     
-    def generate_daily_quests(self):
-        """Generate new daily quests"""
-        with self.db.get_session() as session:
-            # Generate 5 random quests of each type
-            for quest_type in self.quest_templates.keys():
-                for _ in range(5):
-                    quest = self.generate_random_quest(quest_type)
-                    if quest:
-                        # Check if similar quest already exists
-                        existing = session.query(Quest).filter_by(
-                            title=quest.title,
-                            quest_type=quest.quest_type
-                        ).first()
-                        
-                        if not existing:
-                            session.add(quest)
-            
-            session.commit()
\ No newline at end of file
+    def generate_daily_quests(self, per_type: int = 5, levels: Optional[List[int]] = None) -> int:
+        """Generate new daily quests, as per-level variants when levels are given"""
+        generator = QuestGenerator(self.quest_templates, np.random.default_rng(self.rng.getrandbits(64)))
+        created = generator.generate_daily(self.db, per_type, levels)
+        
+        self.board.rotate()
+        return created
\ No newline at end of file
@@ -0,0 +1,191 @@
+"""
+Quest Timers for World War Telegram Bot
+Deadline queue expiring active quests when they run out
+"""
+import asyncio
+import heapq
+import logging
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from database import DatabaseManager, Player, PlayerQuest, Quest
+from trade_settlement import locked_transaction
+
+logger = logging.getLogger(__name__)
+
+_EPOCH = datetime(1970, 1, 1)
+
+@dataclass(frozen=True, slots=True)
+class QuestNotification:
+    """A quest outcome to tell a player about"""
+    player_id: int
+    telegram_id: Optional[int]
+    quest_id: int
+    title: str
+    status: str  # completed, expired
+
+class QuestTimerQueue:
+    """Expires active quests when their duration runs out.
+
+    Deadlines are rounded up to whole ticks and kept in a min-heap of (tick, player
+    quest id); cancelling only forgets the quest, and its heap item is skipped as stale
+    when it surfaces. The loop sleeps until the earliest tick, and due quests are
+    expired one committed batch at a time.
+    """
+
+    BATCH_SIZE = 500
+    RETRY_DELAY = 5.0  # seconds
+
+    def __init__(self, db_manager: DatabaseManager, tick: float = 1.0,
+                 on_expired: Optional[Callable[[List[Tuple[int, int]]], None]] = None,
+                 on_notify: Optional[Callable[[List[QuestNotification]], None]] = None):
+        self.db = db_manager
+        self.tick = tick
+        # Called after each committed batch with the (player_id, quest_id) pairs that expired
+        self.on_expired = on_expired
+        self.on_notify = on_notify
+        self.is_running = False
+        self._due: Dict[int, Tuple[int, int, int]] = {}  # player quest id -> (tick, player_id, quest_id)
+        self._heap: List[Tuple[int, int]] = []  # (tick, player quest id); stale once cancelled or rescheduled
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def _tick_of(self, when: datetime) -> int:
+        return math.ceil((when - _EPOCH).total_seconds() / self.tick)
+
+    def _push(self, player_quest_id: int, tick: int, player_id: int, quest_id: int):
+        earliest = self.next_tick()
+        self._due[player_quest_id] = (tick, player_id, quest_id)
+        heapq.heappush(self._heap, (tick, player_quest_id))
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due[0], pq_id) for pq_id, due in self._due.items()]
+            heapq.heapify(self._heap)
+        if earliest is None or tick < earliest:
+            self._wakeup.set()
+
+    def schedule(self, player_quest_id: int, player_id: int, quest_id: int, deadline: datetime):
+        """Track an active quest; wakes the loop if it is now the earliest due"""
+        self._push(player_quest_id, self._tick_of(deadline), player_id, quest_id)
+
+    def cancel(self, player_quest_id: int) -> bool:
+        """Stop tracking a quest that was completed or failed"""
+        return self._due.pop(player_quest_id, None) is not None
+
+    def load(self):
+        """Schedule every active quest (used at startup)"""
+        with self.db.get_session() as session:
+            rows = session.query(
+                PlayerQuest.id, PlayerQuest.player_id, PlayerQuest.quest_id, PlayerQuest.started_at, Quest.duration
+            ).join(Quest, PlayerQuest.quest_id == Quest.id).filter(PlayerQuest.status == "active").all()
+        for player_quest_id, player_id, quest_id, started_at, duration in rows:
+            self.schedule(player_quest_id, player_id, quest_id, started_at + timedelta(seconds=duration or 0))
+
+    def next_tick(self) -> Optional[int]:
+        """Earliest live tick, dropping stale heap items above it"""
+        heap = self._heap
+        while heap:
+            tick, player_quest_id = heap[0]
+            due = self._due.get(player_quest_id)
+            if due is not None and due[0] == tick:
+                return tick
+            heapq.heappop(heap)
+        return None
+
+    def next_due(self) -> Optional[datetime]:
+        tick = self.next_tick()
+        return _EPOCH + timedelta(seconds=tick * self.tick) if tick is not None else None
+
+    def pop_due(self, now: Optional[datetime] = None,
+                limit: Optional[int] = None) -> Dict[int, Tuple[int, int, int]]:
+        """Remove and return quests due by now (at most limit), keyed by player quest id"""
+        now_tick = math.floor(((now or datetime.utcnow()) - _EPOCH).total_seconds() / self.tick)
+        due = {}
+        while limit is None or len(due) < limit:
+            tick = self.next_tick()
+            if tick is None or tick > now_tick:
+                break
+            _, player_quest_id = heapq.heappop(self._heap)
+            due[player_quest_id] = self._due.pop(player_quest_id)
+        return due
+
+    def expire(self, now: Optional[datetime] = None) -> int:
+        """Expire every quest due by now; returns how many were still active.
+
+        Each batch is popped, committed and reported (on_expired and notify) before the
+        next is popped; a batch that fails goes back on the queue for the next run.
+        """
+        now = now or datetime.utcnow()
+        expired = 0
+        while True:
+            batch = self.pop_due(now, self.BATCH_SIZE)
+            if not batch:
+                return expired
+            try:
+                rows = self._expire_batch(list(batch), now)
+            except Exception:
+                for player_quest_id, due in batch.items():
+                    if player_quest_id not in self._due:
+                        self._push(player_quest_id, *due)
+                raise
+            if not rows:
+                continue
+            expired += len(rows)
+            if self.on_expired:
+                self.on_expired([(row.player_id, row.quest_id) for row in rows])
+            self.notify([QuestNotification(row.player_id, row.telegram_id, row.quest_id, row.title, "expired")
+                         for row in rows])
+
+    def _expire_batch(self, player_quest_ids: List[int], now: datetime) -> list:
+        """Expire one batch of due quests in its own transaction; returns the rows expired"""
+        # Quests completed or failed since scheduling are skipped by the status filter
+        with locked_transaction(self.db) as session:
+            rows = session.query(
+                PlayerQuest.id, PlayerQuest.player_id, PlayerQuest.quest_id, Player.telegram_id, Quest.title
+            ).join(Player, PlayerQuest.player_id == Player.id).join(Quest, PlayerQuest.quest_id == Quest.id).filter(
+                PlayerQuest.id.in_(player_quest_ids), PlayerQuest.status == "active"
+            ).order_by(PlayerQuest.id).with_for_update(of=PlayerQuest).all()
+            if not rows:
+                return []
+            session.query(PlayerQuest).filter(
+                PlayerQuest.id.in_([row.id for row in rows]), PlayerQuest.status == "active"
+            ).update({PlayerQuest.status: "expired", PlayerQuest.completed_at: now}, synchronize_session=False)
+            session.commit()
+        return rows
+
+    def notify(self, notifications: List[QuestNotification]):
+        """Hand notifications to the bot; delivery problems never undo an expiry"""
+        if not self.on_notify:
+            return
+        try:
+            self.on_notify(notifications)
+        except Exception as e:
+            logger.error(f"Error sending quest notifications: {e}")
+
+    async def run(self):
+        """Background task expiring quests as they come due"""
+        self.is_running = True
+        while self.is_running:
+            self._wakeup.clear()
+            retry = 0.0
+            try:
+                self.expire()
+            except Exception as e:
+                logger.error(f"Error expiring quests: {e}")
+                # Failed batches are still due; back off instead of spinning on them
+                retry = self.RETRY_DELAY
+
+            due = self.next_due()
+            timeout = None if due is None else max((due - datetime.utcnow()).total_seconds(), retry)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self):
+        """Stop the expiry loop"""
+        self.is_running = False
+        self._wakeup.set()
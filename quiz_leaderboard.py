@@ -0,0 +1,150 @@
+"""
+Quiz Leaderboards for World War Telegram Bot
+Bounded top-K boards keeping each user's best score, with daily and weekly windows
+"""
+import heapq
+import itertools
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+PERIODS = ("daily", "weekly")
+
+def window_start(period: Optional[str], moment: datetime) -> Optional[date]:
+    """First day of the window containing moment (None for all-time boards)"""
+    if period is None:
+        return None
+    day = moment.date()
+    if period == "daily":
+        return day
+    if period == "weekly":
+        return day - timedelta(days=day.weekday())
+    raise ValueError(f"Unknown leaderboard period: {period}")
+
+class Leaderboard:
+    """Top size users by best score.
+
+    A min-heap holds the current board so the lowest entry is evicted in O(log K).
+    Raising a user's score pushes a new heap item and leaves the old one stale; stale
+    items are skipped when they reach the top and purged once they outnumber live ones.
+    Ties keep whoever reached the score first.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: Dict[int, Dict[str, Any]] = {}  # user id -> board entry
+        self._heap: List[Tuple[int, int, int]] = []  # (score, -order, user id)
+        self._order: Dict[int, int] = {}
+        self._counter = itertools.count()
+        self._sorted: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, result) -> bool:
+        """Offer a result; returns whether the board changed"""
+        user_id = result.user_id
+        current = self.entries.get(user_id)
+        if current is not None:
+            if result.score <= current["score"]:
+                return False
+        elif len(self.entries) >= self.size:
+            lowest = self._lowest()
+            if result.score <= lowest[0]:
+                return False
+            heapq.heappop(self._heap)
+            del self.entries[lowest[2]]
+            del self._order[lowest[2]]
+
+        order = next(self._counter)
+        self.entries[user_id] = {
+            "user_id": user_id,
+            "score": result.score,
+            "accuracy": result.accuracy,
+            "rank": result.rank,
+            "timestamp": result.timestamp
+        }
+        self._order[user_id] = order
+        heapq.heappush(self._heap, (result.score, -order, user_id))
+        if len(self._heap) > 2 * self.size:
+            self._heap = [(entry["score"], -self._order[uid], uid) for uid, entry in self.entries.items()]
+            heapq.heapify(self._heap)
+        self._sorted = None
+        return True
+
+    def _lowest(self) -> Tuple[int, int, int]:
+        """Lowest live heap item, dropping stale ones above it"""
+        heap = self._heap
+        while -heap[0][1] != self._order.get(heap[0][2]):
+            heapq.heappop(heap)
+        return heap[0]
+
+    def top(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Entries from best to worst"""
+        if self._sorted is None:
+            self._sorted = sorted(self.entries.values(),
+                                  key=lambda entry: (-entry["score"], self._order[entry["user_id"]]))
+        return self._sorted[:limit]
+
+class WindowedLeaderboard:
+    """Leaderboard for the current day or week.
+
+    Results from a newer window replace the board outright, so rolling over never
+    rescans past results; results from an older window are ignored.
+    """
+
+    def __init__(self, size: int, period: str):
+        window_start(period, datetime.now())  # validate the period
+        self.size = size
+        self.period = period
+        self.window: Optional[date] = None
+        self.board = Leaderboard(size)
+
+    def add(self, result) -> bool:
+        window = window_start(self.period, result.timestamp)
+        if self.window is None or window > self.window:
+            self.window = window
+            self.board = Leaderboard(self.size)
+        elif window < self.window:
+            return False
+        return self.board.add(result)
+
+    def top(self, limit: Optional[int] = None, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """Entries of the window containing now (empty once that window has passed)"""
+        if self.window != window_start(self.period, now or datetime.now()):
+            return []
+        return self.board.top(limit)
+
+class QuizLeaderboards:
+    """Overall and per-category boards, each all-time and per period"""
+
+    def __init__(self, overall_size: int = 100, category_size: int = 50):
+        self.overall_size = overall_size
+        self.category_size = category_size
+        self.boards: Dict[Tuple[str, Optional[str]], Any] = {}
+
+    def _board(self, key: str, period: Optional[str]):
+        board = self.boards.get((key, period))
+        if board is None:
+            size = self.overall_size if key == "overall" else self.category_size
+            board = Leaderboard(size) if period is None else WindowedLeaderboard(size, period)
+            self.boards[(key, period)] = board
+        return board
+
+    def add(self, result):
+        """Offer a result to every board it belongs on"""
+        keys = ["overall"]
+        if result.category:
+            keys.append(f"category_{result.category.value}")
+        for key in keys:
+            for period in (None,) + PERIODS:
+                self._board(key, period).add(result)
+
+    def top(self, key: str = "overall", limit: Optional[int] = None, period: Optional[str] = None,
+            now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        board = self.boards.get((key, period))
+        if board is None:
+            window_start(period, datetime.now())  # unknown periods still raise
+            return []
+        if period is None:
+            return board.top(limit)
+        return board.top(limit, now)
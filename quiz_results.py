@@ -0,0 +1,103 @@
+"""
+Quiz Results Store for World War Telegram Bot
+Append-only quiz result log with per-user running statistics
+"""
+import json
+import logging
+import os
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from resource_ledger import TransactionLog
+
+logger = logging.getLogger(__name__)
+
+# Relative result files live here, wherever the bot is started from
+DATA_DIR = os.environ.get(
+    "WORLD_WAR_DATA_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+)
+DEFAULT_RESULTS_FILE = "quiz_results.jsonl"
+
+@dataclass(slots=True)
+class QuizStats:
+    """Running totals of one user's quiz results"""
+    total_quizzes: int = 0
+    total_score: int = 0
+    accuracy_sum: float = 0.0
+    best_score: int = -1
+    best_rank: str = "None"
+    total_knowledge: int = 0
+    longest_streak: int = 0
+
+    def add(self, result):
+        self.total_quizzes += 1
+        self.total_score += result.score
+        self.accuracy_sum += result.accuracy
+        if result.score > self.best_score:
+            self.best_score = result.score
+            self.best_rank = result.rank
+        self.total_knowledge += result.knowledge_gained
+        self.longest_streak = max(self.longest_streak, result.max_streak)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "total_quizzes": self.total_quizzes,
+            "total_score": self.total_score,
+            "average_accuracy": self.accuracy_sum / self.total_quizzes if self.total_quizzes else 0,
+            "best_rank": self.best_rank,
+            "total_knowledge": self.total_knowledge,
+            "longest_streak": self.longest_streak
+        }
+
+class QuizResultStore:
+    """Quiz results written once to a JSON lines file and summarised per user.
+
+    Only the most recent results stay in memory; statistics are kept as running totals
+    updated in O(1) per result and rebuilt by replaying the file at startup. Relative
+    paths are resolved against data_dir; without a path nothing is persisted.
+    """
+
+    def __init__(self, path: Optional[str] = None, recent: int = 1000, data_dir: str = DATA_DIR):
+        self.path = os.path.join(data_dir, path) if path else None
+        self.log = TransactionLog(capacity=recent, spill_path=self.path)
+        self.stats: Dict[int, QuizStats] = {}
+
+    def add(self, result):
+        """Record a completed quiz and append it to the log file"""
+        self.log.append(result)
+        self.stats.setdefault(result.user_id, QuizStats()).add(result)
+        if self.path:
+            try:
+                self.log.spill()
+            except Exception as e:
+                logger.error(f"Error saving quiz result: {e}")
+
+    def load(self, parse: Callable[[Dict], Any]) -> Iterator:
+        """Replay the log file into the statistics, yielding each parsed result (used at startup)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, encoding="utf-8") as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    result = parse(json.loads(line))
+                except (ValueError, TypeError, KeyError) as e:
+                    logger.warning(f"Skipping unreadable quiz result at {self.path}:{line_number}: {e}")
+                    continue
+                self.log.entries.append(result)
+                self.stats.setdefault(result.user_id, QuizStats()).add(result)
+                yield result
+
+    def close(self):
+        """Flush and close the log file (used at shutdown)"""
+        if self.path:
+            self.log.spill()
+        self.log.close()
+
+    def user_stats(self, user_id: int) -> Dict[str, Any]:
+        stats = self.stats.get(user_id)
+        return (stats or QuizStats()).as_dict()
+
+    def recent(self, limit: Optional[int] = None, user_id: Optional[int] = None) -> List:
+        """Newest results first, optionally for one user"""
+        return self.log.recent(limit, user_id)
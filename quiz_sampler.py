@@ -0,0 +1,84 @@
+"""
+Quiz Question Sampler for World War Telegram Bot
+Precomputed (difficulty, category) buckets with per-user no-repeat sampling
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+class QuestionSampler:
+    """Draws quiz questions without scanning the catalogue.
+
+    Questions are numbered once and grouped into arrays for every (difficulty, category)
+    pair, including "any" on either side, so a filter is one dict lookup. Each user has a
+    bitmap of questions already served; draws skip those until a bucket runs out, then
+    that bucket starts over for the user.
+    """
+
+    def __init__(self, questions: Dict, rng: Optional[random.Random] = None):
+        self.rng = rng or random.Random()
+        self.questions = list(questions.values())
+        self.bitmap_size = (len(self.questions) + 7) // 8
+        self.seen: Dict[int, bytearray] = {}
+
+        groups: Dict[Tuple, List[int]] = {}
+        for ordinal, question in enumerate(self.questions):
+            for key in ((question.difficulty, question.category), (question.difficulty, None),
+                        (None, question.category), (None, None)):
+                groups.setdefault(key, []).append(ordinal)
+        self.buckets: Dict[Tuple, np.ndarray] = {key: np.array(ordinals, dtype=np.int32)
+                                                  for key, ordinals in groups.items()}
+
+    def bucket(self, difficulty=None, category=None) -> np.ndarray:
+        """Ordinals of the questions matching the filters"""
+        return self.buckets.get((difficulty, category), np.empty(0, dtype=np.int32))
+
+    def sample(self, count: int, difficulty=None, category=None, user_id: Optional[int] = None) -> List:
+        """Up to count distinct questions, unseen by user_id first when given"""
+        bucket = self.bucket(difficulty, category)
+        if user_id is None:
+            if len(bucket) <= count:
+                return [self.questions[ordinal] for ordinal in bucket]
+            return [self.questions[bucket[i]] for i in self.rng.sample(range(len(bucket)), count)]
+
+        seen = self.seen.setdefault(user_id, bytearray(self.bitmap_size))
+        chosen = self._draw_unseen(bucket, count, seen)
+        if len(chosen) < count:
+            chosen = self._draw_exhausted(bucket, count, seen)
+        for ordinal in chosen:
+            seen[ordinal >> 3] |= 1 << (ordinal & 7)
+        return [self.questions[ordinal] for ordinal in chosen]
+
+    def _draw_unseen(self, bucket: np.ndarray, count: int, seen: bytearray) -> List[int]:
+        """Rejection sampling: a few random probes per question while most of the bucket is unseen"""
+        chosen = []
+        picked = set()
+        for _ in range(min(4 * count, 4 * len(bucket))):
+            ordinal = int(bucket[self.rng.randrange(len(bucket))])
+            if ordinal in picked or seen[ordinal >> 3] >> (ordinal & 7) & 1:
+                continue
+            picked.add(ordinal)
+            chosen.append(ordinal)
+            if len(chosen) == count:
+                break
+        return chosen
+
+    def _draw_exhausted(self, bucket: np.ndarray, count: int, seen: bytearray) -> List[int]:
+        """Take every unseen question, then start the bucket over and fill up from the rest"""
+        bits = np.unpackbits(np.frombuffer(seen, dtype=np.uint8), bitorder="little")
+        unseen = bucket[bits[bucket] == 0]
+        if len(unseen) >= count:
+            return [int(unseen[i]) for i in self.rng.sample(range(len(unseen)), count)]
+
+        chosen = [int(ordinal) for ordinal in unseen]
+        bits[bucket] = 0
+        seen[:] = np.packbits(bits, bitorder="little").tobytes()
+        rest = bucket[np.isin(bucket, unseen, invert=True)]
+        fill = min(count - len(chosen), len(rest))
+        chosen.extend(int(rest[i]) for i in self.rng.sample(range(len(rest)), fill))
+        return chosen
+
+    def forget(self, user_id: int):
+        """Let a user see every question again"""
+        self.seen.pop(user_id, None)
@@ -0,0 +1,95 @@
+"""
+Research Tick for World War Telegram Bot
+Advances research points and projects for every nation with set-based statements
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case
+
+from database import DatabaseManager, Nation, NationTechnology
+from trade_settlement import locked_transaction
+
+logger = logging.getLogger(__name__)
+
+POINTS_PER_POPULATION = 0.001  # research points per citizen per hour
+MAX_RESEARCH_POINTS = 10000
+BASE_PROGRESS = 0.01  # share of a project finished per tick at speed 1.0
+
+Completion = Tuple[int, int]  # (nation_id, technology_id)
+
+class ResearchTick:
+    """Runs the hourly research update for all nations at once.
+
+    A tick is one transaction of four statements however many nations and projects there
+    are: add research points, advance every active project, read the projects that reached
+    100% and stamp them completed. Completions are handed to on_completed after commit.
+    """
+
+    def __init__(self, db_manager: DatabaseManager,
+                 on_completed: Optional[Callable[[List[Completion]], None]] = None,
+                 speeds: Optional[Callable[[], Dict[int, float]]] = None, interval: float = 3600.0):
+        self.db = db_manager
+        self.on_completed = on_completed
+        self.speeds = speeds  # Research speed of nations not at 1.0, used by the background loop
+        self.interval = interval
+        self.is_running = False
+
+    def tick(self, research_speed: float = 1.0, nation_ids: Optional[Iterable[int]] = None,
+             generate_points: bool = True, speeds: Optional[Dict[int, float]] = None) -> List[Completion]:
+        """Advance research by one tick; returns the projects completed
+
+        speeds overrides research_speed for individual nations.
+        """
+        nation_ids = None if nation_ids is None else list(nation_ids)
+        now = datetime.utcnow()
+        with locked_transaction(self.db) as session:
+            if generate_points:
+                self.generate_points(session, nation_ids)
+
+            projects = session.query(NationTechnology).filter(NationTechnology.completed_at.is_(None))
+            if nation_ids is not None:
+                projects = projects.filter(NationTechnology.nation_id.in_(nation_ids))
+            speed = case(speeds, value=NationTechnology.nation_id, else_=research_speed) if speeds else research_speed
+            progress = NationTechnology.research_progress + BASE_PROGRESS * speed
+            projects.update({NationTechnology.research_progress: case((progress > 1.0, 1.0), else_=progress)},
+                            synchronize_session=False)
+
+            finished = projects.filter(NationTechnology.research_progress >= 1.0)
+            completed = [(nation_id, tech_id) for nation_id, tech_id in finished.with_entities(
+                NationTechnology.nation_id, NationTechnology.technology_id)]
+            if completed:
+                finished.update({NationTechnology.completed_at: now}, synchronize_session=False)
+            session.commit()
+
+        if completed and self.on_completed:
+            self.on_completed(completed)
+        return completed
+
+    @staticmethod
+    def generate_points(session, nation_ids: Optional[List[int]] = None):
+        """Add an hour of research points to nations, capped at MAX_RESEARCH_POINTS"""
+        nations = session.query(Nation)
+        if nation_ids is not None:
+            nations = nations.filter(Nation.id.in_(nation_ids))
+        points = Nation.research_points + Nation.population * POINTS_PER_POPULATION
+        nations.update({Nation.research_points: case((points > MAX_RESEARCH_POINTS, MAX_RESEARCH_POINTS),
+                                                     else_=points)}, synchronize_session=False)
+
+    async def run(self):
+        """Background task running a research tick every interval"""
+        self.is_running = True
+        while self.is_running:
+            await asyncio.sleep(self.interval)
+            try:
+                completed = self.tick(speeds=self.speeds() if self.speeds else None)
+                if completed:
+                    logger.info(f"Completed {len(completed)} research projects")
+            except Exception as e:
+                logger.error(f"Error running research tick: {e}")
+
+    def stop(self):
+        """Stop the research loop"""
+        self.is_running = False
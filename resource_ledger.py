@@ -0,0 +1,227 @@
+"""
+Resource Ledger for World War Telegram Bot
+Per-user resource balances in fixed-width arrays with write-behind persistence
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict, deque
+from dataclasses import asdict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Deque, Iterable, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam
+
+from database import DatabaseManager, ResourceBalance
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any):
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialise {type(value).__name__}")
+
+class TransactionLog:
+    """Recent transactions in a bounded deque; every entry is appended to a JSON lines file on flush.
+
+    The spill file stays open for appending between flushes and is closed by close().
+    """
+
+    def __init__(self, capacity: int = 1000, spill_path: Optional[str] = None):
+        self.entries: Deque[Any] = deque(maxlen=capacity)
+        self.spill_path = spill_path
+        self._unspilled: List[Any] = []
+        self._file = None
+
+    def append(self, entry: Any):
+        self.entries.append(entry)
+        if self.spill_path:
+            self._unspilled.append(entry)
+
+    def recent(self, limit: Optional[int] = None, user_id: Optional[int] = None) -> List[Any]:
+        """Newest entries first, optionally for one user"""
+        entries = (e for e in reversed(self.entries) if user_id is None or e.user_id == user_id)
+        result = []
+        for entry in entries:
+            if limit is not None and len(result) >= limit:
+                break
+            result.append(entry)
+        return result
+
+    def spill(self) -> int:
+        """Append unwritten entries to the spill file"""
+        if not self._unspilled:
+            return 0
+        entries, self._unspilled = self._unspilled, []
+        try:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spill_path)), exist_ok=True)
+                self._file = open(self.spill_path, "a", encoding="utf-8")
+            self._file.writelines(json.dumps(asdict(entry), default=_json_default) + "\n" for entry in entries)
+            self._file.flush()
+        except Exception:
+            self._unspilled = entries + self._unspilled
+            self.close()
+            raise
+        return len(entries)
+
+    def close(self):
+        """Close the spill file; the next spill reopens it"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            finally:
+                self._file = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class ResourceLedger:
+    """Per-user balances and storage capacities as rows of (users, resources) arrays.
+
+    Only recently used users stay resident. Changes mark the user dirty and are written
+    to the resource_balances table by flush(), which flush_loop() runs in the background;
+    callers without the loop flush themselves. Clean users are evicted least recently
+    used first and reloaded from the table on their next access.
+    """
+
+    def __init__(self, width: int, db_manager: Optional[DatabaseManager] = None,
+                 log: Optional[TransactionLog] = None, default_capacity: float = 1000.0,
+                 max_resident: int = 10000, flush_interval: float = 5.0):
+        self.width = width
+        self.db = db_manager
+        self.log = log if log is not None else TransactionLog()
+        self.default_capacity = default_capacity
+        self.max_resident = max_resident
+        self.flush_interval = flush_interval
+        self.is_running = False
+
+        self.balances = np.zeros((64, width), dtype=np.float64)
+        self.capacities = np.full((64, width), default_capacity, dtype=np.float64)
+        self.rows: "OrderedDict[int, int]" = OrderedDict()  # user_id -> row, least recently used first
+        self._free_rows: List[int] = list(range(63, -1, -1))
+        self._dirty: set = set()
+        self._stored: set = set()  # users known to have a resource_balances row
+
+    def row(self, user_id: int) -> int:
+        """Row of a user's balances, loading or creating it on first use"""
+        row = self.rows.get(user_id)
+        if row is not None:
+            self.rows.move_to_end(user_id)
+            return row
+
+        row = self._allocate_row()
+        self.rows[user_id] = row
+        self.balances[row] = 0.0
+        self.capacities[row] = self.default_capacity
+        if self.db is not None:
+            with self.db.get_session() as session:
+                stored = session.get(ResourceBalance, user_id)
+                if stored is not None:
+                    self._stored.add(user_id)
+                    self._copy_in(self.balances[row], stored.balances)
+                    self._copy_in(self.capacities[row], stored.capacities)
+        return row
+
+    def get(self, user_id: int, ordinal: int) -> float:
+        return float(self.balances[self.row(user_id), ordinal])
+
+    def capacity(self, user_id: int, ordinal: int) -> float:
+        return float(self.capacities[self.row(user_id), ordinal])
+
+    def add(self, user_id: int, ordinal: int, amount: float):
+        """Change a balance by amount (negative to spend)"""
+        self.balances[self.row(user_id), ordinal] += amount
+        self._dirty.add(user_id)
+
+    def set_capacity(self, user_id: int, ordinal: int, capacity: float):
+        self.capacities[self.row(user_id), ordinal] = capacity
+        self._dirty.add(user_id)
+
+    def snapshot(self, user_id: int) -> np.ndarray:
+        """Copy of a user's balance row"""
+        return self.balances[self.row(user_id)].copy()
+
+    def flush(self) -> int:
+        """Write dirty users and unspilled transactions; returns the number of users written"""
+        self.log.spill()
+        if self.db is None or not self._dirty:
+            return 0
+
+        dirty = list(self._dirty)
+        now = datetime.utcnow()
+        records = [{
+            "b_user_id": user_id,
+            "b_balances": self.balances[self.rows[user_id]].tobytes(),
+            "b_capacities": self.capacities[self.rows[user_id]].tobytes(),
+            "b_updated_at": now,
+        } for user_id in dirty]
+
+        table = ResourceBalance.__table__
+        with self.db.get_session() as session:
+            unknown = [user_id for user_id in dirty if user_id not in self._stored]
+            if unknown:
+                self._stored.update(user_id for (user_id,) in session.query(ResourceBalance.user_id).filter(
+                    ResourceBalance.user_id.in_(unknown)))
+            updates = [record for record in records if record["b_user_id"] in self._stored]
+            inserts = [{
+                "user_id": record["b_user_id"],
+                "balances": record["b_balances"],
+                "capacities": record["b_capacities"],
+                "updated_at": now,
+            } for record in records if record["b_user_id"] not in self._stored]
+
+            if updates:
+                session.execute(table.update().where(table.c.user_id == bindparam("b_user_id")).values(
+                    balances=bindparam("b_balances"),
+                    capacities=bindparam("b_capacities"),
+                    updated_at=bindparam("b_updated_at")
+                ), updates)
+            if inserts:
+                session.execute(table.insert(), inserts)
+            session.commit()
+
+        self._stored.update(record["b_user_id"] for record in records)
+        self._dirty.difference_update(dirty)
+        return len(dirty)
+
+    async def flush_loop(self):
+        """Background task writing dirty balances behind the game"""
+        self.is_running = True
+        while self.is_running:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing resource ledger: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+    def stop(self):
+        """Stop the flush loop after a final flush"""
+        self.is_running = False
+        self.flush()
+        self.log.close()
+
+    def resident_users(self) -> Iterable[int]:
+        return self.rows.keys()
+
+    def _allocate_row(self) -> int:
+        if self.db is not None and len(self.rows) >= self.max_resident:
+            for user_id in self.rows:
+                if user_id not in self._dirty:
+                    return self.rows.pop(user_id)
+        if not self._free_rows:
+            size = len(self.balances)
+            self.balances = np.concatenate([self.balances, np.zeros_like(self.balances)])
+            self.capacities = np.concatenate([self.capacities, np.full_like(self.capacities, self.default_capacity)])
+            self._free_rows = list(range(2 * size - 1, size - 1, -1))
+        return self._free_rows.pop()
+
+    def _copy_in(self, target: np.ndarray, data: bytes):
+        """Copy a stored row, tolerating rows saved before new resource types were added"""
+        values = np.frombuffer(data, dtype=np.float64)[:self.width]
+        target[:len(values)] = values
@@ -0,0 +1,212 @@
+"""
+Headless Game Simulation for World War Telegram Bot
+Runs economy, world and combat ticks as fast as possible with seeded randomness
+Run with: python simulation.py [--hours N] [--seed S] [--players N]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from sqlalchemy import func
+
+from complex_resources import ComplexResourceManager
+from database import DatabaseManager, Player, PlayerUnit, Nation, Province, Battle
+from economy import EconomyManager
+from military import MilitaryManager
+from price_engine import PriceEngine
+from simulation_rng import SimulationRNG
+from world_simulation import WorldSimulator
+
+DEFAULT_CONFIG = {
+    "economy": {
+        "materials": {
+            "iron": {"base_price": 10, "volatility": 0.1},
+            "oil": {"base_price": 15, "volatility": 0.15},
+            "food": {"base_price": 5, "volatility": 0.05},
+            "gold": {"base_price": 50, "volatility": 0.08},
+            "uranium": {"base_price": 100, "volatility": 0.2},
+            "steel": {"base_price": 25, "volatility": 0.1}
+        },
+        "price_update_interval": 1800
+    },
+    "military": {
+        "unit_types": {
+            "infantry": {"cost": 100, "upkeep": 10, "attack": 5, "defense": 3},
+            "tank": {"cost": 500, "upkeep": 50, "attack": 15, "defense": 10},
+            "artillery": {"cost": 300, "upkeep": 30, "attack": 20, "defense": 2}
+        },
+        "battle_cooldown": 300
+    },
+    "world": {
+        "world_events_interval": 3600,
+        "season_duration": 2592000,
+        "ai_factions": 4
+    }
+}
+
+@dataclass
+class SimulationReport:
+    """Outcome and throughput of a headless run"""
+    seed: int
+    hours: int
+    wall_time: float
+    economy_ticks: int
+    world_ticks: int
+    battles: int
+    state_digest: str
+
+    def summary(self) -> str:
+        wall_time = max(self.wall_time, 1e-9)
+        return "\n".join([
+            f"🎲 Seed {self.seed}: simulated {self.hours} hours in {wall_time:.2f} s "
+            f"({self.hours / wall_time:,.1f} game hours/s)",
+            f"   Economy ticks: {self.economy_ticks:,} ({self.economy_ticks / wall_time:,.0f}/s)",
+            f"   World ticks:   {self.world_ticks:,} ({self.world_ticks / wall_time:,.1f}/s)",
+            f"   Battles:       {self.battles:,} ({self.battles / wall_time:,.1f}/s)",
+            f"   State digest:  {self.state_digest}",
+        ])
+
+class HeadlessSimulation:
+    """Game subsystems wired to one seeded RNG service and a private database"""
+
+    def __init__(self, database_url: str, seed: Optional[int] = None, config: Optional[Dict] = None,
+                 battles_per_hour: int = 5):
+        self.config = config or DEFAULT_CONFIG
+        self.rng = SimulationRNG(seed)
+        self.battles_per_hour = battles_per_hour
+
+        self.db = DatabaseManager(database_url)
+        self.db.create_tables()
+
+        self.economy = EconomyManager(self.config["economy"],
+                                      price_engine=PriceEngine(self.rng.generator("economy")))
+        self.resources = ComplexResourceManager(self.db,
+                                                price_engine=PriceEngine(self.rng.generator("resources")))
+        self.world = WorldSimulator(self.config["world"], rng=self.rng.random("world"))
+        self.world.db = self.db
+        self.military = MilitaryManager(self.config["military"], rng=self.rng.random("military"))
+        self.military.db = self.db
+        self.combat_rng = self.rng.random("combat")  # picks who fights whom
+
+    def populate(self, players: int = 20, provinces: int = 30):
+        """Create players, nations and provinces for the simulation"""
+        setup_rng = self.rng.random("setup")
+        unit_types = list(self.config["military"]["unit_types"])
+        with self.db.get_session() as session:
+            nations = [Nation(name=f"Nation {i}", is_ai=i < self.config["world"]["ai_factions"])
+                       for i in range(max(players // 4, self.config["world"]["ai_factions"] + 1))]
+            session.add_all(nations)
+            session.flush()
+
+            for i in range(provinces):
+                session.add(Province(
+                    name=f"Province {i}", x=i % 10, y=i // 10,
+                    infrastructure=setup_rng.uniform(0.1, 1.0),
+                    owner_id=nations[i % len(nations)].id if i % 3 else None
+                ))
+
+            for i in range(players):
+                player = Player(telegram_id=10_000 + i, username=f"sim_player_{i}",
+                                nation_id=nations[i % len(nations)].id)
+                session.add(player)
+                session.flush()
+                for unit_type in unit_types:
+                    session.add(PlayerUnit(player_id=player.id, unit_name=unit_type, unit_type=unit_type,
+                                           subcategory="basic", quantity=setup_rng.randint(50, 500)))
+            session.commit()
+
+    async def run(self, hours: int) -> SimulationReport:
+        """Simulate hours of game time as fast as possible"""
+        with self.db.get_session() as session:
+            player_ids = [player_id for (player_id,) in session.query(Player.id).order_by(Player.id)]
+            province_ids = [province_id for (province_id,) in session.query(Province.id).order_by(Province.id)]
+        economy_ticks_per_hour = max(1, round(3600 / self.economy.price_update_interval))
+
+        economy_ticks = world_ticks = battles = 0
+        start = time.perf_counter()
+        for _ in range(hours):
+            for _ in range(economy_ticks_per_hour):
+                self.economy.update_prices()
+                self.resources.update_prices()
+                economy_ticks += 1
+
+            await self.world.tick()
+            world_ticks += 1
+
+            if len(player_ids) >= 2 and province_ids:
+                for _ in range(self.battles_per_hour):
+                    attacker_id, defender_id = self.combat_rng.sample(player_ids, 2)
+                    if self._battle(attacker_id, defender_id, self.combat_rng.choice(province_ids)):
+                        battles += 1
+        wall_time = time.perf_counter() - start
+
+        return SimulationReport(
+            seed=self.rng.seed,
+            hours=hours,
+            wall_time=wall_time,
+            economy_ticks=economy_ticks,
+            world_ticks=world_ticks,
+            battles=battles,
+            state_digest=self.state_digest()
+        )
+
+    def _battle(self, attacker_id: int, defender_id: int, province_id: int) -> bool:
+        """Fight one battle with a share of each side's units"""
+        with self.db.get_session() as session:
+            units = {}
+            for player_id in (attacker_id, defender_id):
+                units[player_id] = {
+                    unit.unit_name: unit.quantity // 2
+                    for unit in session.query(PlayerUnit).filter_by(player_id=player_id).order_by(PlayerUnit.id)
+                    if unit.quantity > 1
+                }
+        if not units[attacker_id] or not units[defender_id]:
+            return False
+        return self.military.simulate_battle(attacker_id, defender_id, province_id,
+                                             units[attacker_id], units[defender_id]) is not None
+
+    def state_digest(self) -> str:
+        """Hash of prices and game state; equal seeds must give equal digests"""
+        digest = hashlib.sha256()
+        digest.update(self.economy.price_engine.prices.tobytes())
+        digest.update(self.resources.price_engine.prices.tobytes())
+        with self.db.get_session() as session:
+            state = (
+                session.query(func.sum(PlayerUnit.quantity)).scalar(),
+                session.query(func.count(Battle.id)).filter(Battle.winner_id == Battle.attacker_id).scalar(),
+                [row for row in session.query(Province.id, Province.weather, Province.owner_id).order_by(Province.id)],
+                [row for row in session.query(Player.id, Player.morale).order_by(Player.id)]
+            )
+        digest.update(repr(state).encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+def simulate(hours: int, seed: Optional[int] = None, players: int = 20, provinces: int = 30,
+             battles_per_hour: int = 5) -> SimulationReport:
+    """Run a headless simulation against a throwaway SQLite database"""
+    with tempfile.TemporaryDirectory() as tmp:
+        simulation = HeadlessSimulation(f"sqlite:///{os.path.join(tmp, 'simulation.db')}", seed,
+                                        battles_per_hour=battles_per_hour)
+        simulation.populate(players, provinces)
+        report = asyncio.run(simulation.run(hours))
+        simulation.db.engine.dispose()
+        return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate game time without the bot")
+    parser.add_argument("--hours", type=int, default=24, help="game hours to simulate")
+    parser.add_argument("--seed", type=int, default=None, help="root seed (random if omitted)")
+    parser.add_argument("--players", type=int, default=20)
+    parser.add_argument("--provinces", type=int, default=30)
+    parser.add_argument("--battles-per-hour", type=int, default=5)
+    args = parser.parse_args()
+
+    report = simulate(args.hours, args.seed, args.players, args.provinces, args.battles_per_hour)
+    print(report.summary())
+
+if __name__ == "__main__":
+    main()
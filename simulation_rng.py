@@ -0,0 +1,40 @@
+"""
+Simulation RNG Service for World War Telegram Bot
+Seeded, independent random generators for each game subsystem
+"""
+import random
+import zlib
+from typing import Dict, Optional
+
+import numpy as np
+
+class SimulationRNG:
+    """Hands out reproducible per-subsystem generators derived from one root seed.
+
+    Each subsystem's stream depends only on the root seed and the subsystem name, so adding
+    draws in one subsystem (or asking for generators in a different order) does not change
+    any other subsystem's numbers.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.root = np.random.SeedSequence(seed)
+        self.seed = self.root.entropy
+        self._generators: Dict[str, np.random.Generator] = {}
+        self._randoms: Dict[str, random.Random] = {}
+
+    def _sequence(self, subsystem: str, stream: int) -> np.random.SeedSequence:
+        key = (zlib.crc32(subsystem.encode("utf-8")), stream)
+        return np.random.SeedSequence(self.root.entropy, spawn_key=key)
+
+    def generator(self, subsystem: str) -> np.random.Generator:
+        """NumPy generator for vectorised code paths"""
+        if subsystem not in self._generators:
+            self._generators[subsystem] = np.random.default_rng(self._sequence(subsystem, 0))
+        return self._generators[subsystem]
+
+    def random(self, subsystem: str) -> random.Random:
+        """Standard library generator for scalar choices (choice, sample, randint)"""
+        if subsystem not in self._randoms:
+            state = self._sequence(subsystem, 1).generate_state(4)
+            self._randoms[subsystem] = random.Random(int.from_bytes(state.tobytes(), "little"))
+        return self._randoms[subsystem]
@@ -0,0 +1,154 @@
+"""
+Technology Graph for World War Telegram Bot
+The technology tree compiled into bit-indexed nodes with prerequisite masks
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database import DatabaseManager, Technology
+
+@dataclass(frozen=True, slots=True)
+class TechNode:
+    """One technology; bit is its position in topological order"""
+    bit: int
+    name: str
+    description: str
+    category: str
+    tier: str
+    cost: int
+    prerequisites: Tuple[str, ...]
+    prereq_mask: int
+    effects: Dict = field(hash=False, compare=False)
+
+    @property
+    def mask(self) -> int:
+        return 1 << self.bit
+
+    def as_dict(self) -> Dict:
+        """The technology as the dict shape used by the technology tree"""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "cost": self.cost,
+            "category": self.category,
+            "tier": self.tier,
+            "effects": self.effects
+        }
+
+class TechGraph:
+    """Technology tree compiled once for constant-time lookups.
+
+    Technologies are numbered in topological order, so a set of technologies is an int
+    bitmask and a technology is available when its prerequisite mask is contained in the
+    researched mask. bind() maps the nodes to rows of the technologies table.
+    """
+
+    def __init__(self, technology_tree: Dict[str, Dict[str, List[Dict]]]):
+        entries = [(category, tier, tech) for category, tiers in technology_tree.items()
+                   for tier, technologies in tiers.items() for tech in technologies]
+        names = [tech["name"] for _, _, tech in entries]
+        if len(set(names)) != len(names):
+            raise ValueError("Technology names must be unique")
+        for _, _, tech in entries:
+            unknown = set(tech["prerequisites"]) - set(names)
+            if unknown:
+                raise ValueError(f"{tech['name']} has unknown prerequisites: {sorted(unknown)}")
+
+        # Kahn's algorithm, keeping tree order among technologies that are ready together
+        order = []
+        done = set()
+        pending = entries
+        while pending:
+            ready = [entry for entry in pending if done.issuperset(entry[2]["prerequisites"])]
+            if not ready:
+                raise ValueError(f"Technology prerequisites form a cycle: {[e[2]['name'] for e in pending]}")
+            order.extend(ready)
+            done.update(entry[2]["name"] for entry in ready)
+            pending = [entry for entry in pending if entry[2]["name"] not in done]
+
+        self.nodes: List[TechNode] = []
+        self.by_name: Dict[str, TechNode] = {}
+        for bit, (category, tier, tech) in enumerate(order):
+            prereq_mask = 0
+            for prerequisite in tech["prerequisites"]:
+                prereq_mask |= self.by_name[prerequisite].mask
+            node = TechNode(bit, tech["name"], tech["description"], category, tier, tech["cost"],
+                            tuple(tech["prerequisites"]), prereq_mask, tech["effects"])
+            self.nodes.append(node)
+            self.by_name[node.name] = node
+
+        self.all_mask = (1 << len(self.nodes)) - 1
+        self.tech_ids: List[Optional[int]] = [None] * len(self.nodes)  # technologies.id per bit
+        self.bit_by_id: Dict[int, int] = {}
+        self.db: Optional[DatabaseManager] = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node(self, name: str) -> Optional[TechNode]:
+        return self.by_name.get(name)
+
+    def node_by_id(self, tech_id: int) -> Optional[TechNode]:
+        bit = self.bit_by_id.get(tech_id)
+        return None if bit is None else self.nodes[bit]
+
+    def mask_of(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= self.by_name[name].mask
+        return mask
+
+    def nodes_in(self, mask: int) -> Iterator[TechNode]:
+        """Nodes whose bits are set, in topological order"""
+        while mask:
+            low = mask & -mask
+            yield self.nodes[low.bit_length() - 1]
+            mask ^= low
+
+    def can_research(self, node: TechNode, researched: int) -> bool:
+        return not researched & node.mask and node.prereq_mask & ~researched == 0
+
+    def available_mask(self, researched: int) -> int:
+        """Mask of technologies not yet researched whose prerequisites all are"""
+        available = 0
+        for node in self.nodes:
+            if node.prereq_mask & ~researched == 0:
+                available |= node.mask
+        return available & ~researched
+
+    def missing_prerequisites(self, node: TechNode, researched: int) -> List[str]:
+        return [missing.name for missing in self.nodes_in(node.prereq_mask & ~researched)]
+
+    def bind(self, db_manager: DatabaseManager):
+        """Map nodes to technologies rows by name, creating rows that are missing"""
+        with db_manager.get_session() as session:
+            ids = dict(session.query(Technology.name, Technology.id).filter(
+                Technology.name.in_(list(self.by_name))))
+            missing = [Technology(
+                name=node.name,
+                description=node.description,
+                tier=int(node.tier.rsplit("_", 1)[-1]),
+                cost=node.cost,
+                prerequisites=list(node.prerequisites),
+                effects=node.effects,
+                is_military=node.category == "military",
+                is_economic=node.category == "economic",
+                is_research=node.category == "research"
+            ) for node in self.nodes if node.name not in ids]
+            if missing:
+                session.add_all(missing)
+                session.commit()
+                ids.update((tech.name, tech.id) for tech in missing)
+
+        self.tech_ids = [ids[node.name] for node in self.nodes]
+        self.bit_by_id = {tech_id: bit for bit, tech_id in enumerate(self.tech_ids)}
+        self.db = db_manager
+
+    def mask_of_ids(self, tech_ids: Iterable[int]) -> int:
+        """Mask of bound technology ids; ids of unknown technologies are ignored"""
+        mask = 0
+        for tech_id in tech_ids:
+            bit = self.bit_by_id.get(tech_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
@@ -5,6 +5,9 @@ import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager, Player, Technology, NationTechnology, Nation
+from research_tick import POINTS_PER_POPULATION, ResearchTick
+from nation_modifiers import NationModifiers
+from tech_graph import TechGraph
 
 class TechnologyManager:
     def __init__(self):
@@ -140,83 +143,98 @@ class TechnologyManager:
                 ]
             }
         }
+        self.graph = TechGraph(self.technology_tree)
+        self._researched: Dict[int, int] = {}  # nation id -> bitmask of completed technologies
+        self._in_progress: Dict[int, int] = {}
+        self._research: Optional[ResearchTick] = None
+        self.modifiers = NationModifiers(self.graph, self.researched_mask)
+    
+    def _graph(self) -> TechGraph:
+        """Compiled graph bound to the current database"""
+        if self.graph.db is not self.db:
+            self.graph.bind(self.db)
+            self._researched.clear()
+            self._in_progress.clear()
+            self.modifiers.invalidate()
+        return self.graph
+    
+    def _load_masks(self, nation_id: int):
+        with self.db.get_session() as session:
+            rows = session.query(NationTechnology.technology_id, NationTechnology.completed_at).filter(
+                NationTechnology.nation_id == nation_id
+            ).all()
+        self._researched[nation_id] = self.graph.mask_of_ids(tech_id for tech_id, completed in rows if completed)
+        self._in_progress[nation_id] = self.graph.mask_of_ids(tech_id for tech_id, completed in rows if not completed)
+    
+    def load_research_state(self):
+        """Load every nation's research masks with one query (used at startup)"""
+        graph = self._graph()
+        with self.db.get_session() as session:
+            rows = session.query(NationTechnology.nation_id, NationTechnology.technology_id,
+                                 NationTechnology.completed_at).all()
+        researched, in_progress = {}, {}
+        for nation_id, tech_id, completed in rows:
+            target = researched if completed else in_progress
+            target[nation_id] = target.get(nation_id, 0) | graph.mask_of_ids([tech_id])
+        for nation_id in researched.keys() | in_progress.keys():
+            self._researched[nation_id] = researched.get(nation_id, 0)
+            self._in_progress[nation_id] = in_progress.get(nation_id, 0)
+            self.modifiers.rebuild(nation_id, self._researched[nation_id])
+    
+    def research_speeds(self) -> Dict[int, float]:
+        """Research speed multipliers of loaded nations that differ from 1.0"""
+        speeds = {}
+        for nation_id in self._researched:
+            speed = self.modifiers.value(nation_id, "research_speed")
+            if speed != 1.0:
+                speeds[nation_id] = speed
+        return speeds
+    
+    def researched_mask(self, nation_id: int) -> int:
+        """Bitmask of technologies a nation has completed"""
+        self._graph()
+        if nation_id not in self._researched:
+            self._load_masks(nation_id)
+        return self._researched[nation_id]
+    
+    def in_progress_mask(self, nation_id: int) -> int:
+        """Bitmask of technologies a nation is researching"""
+        self._graph()
+        if nation_id not in self._in_progress:
+            self._load_masks(nation_id)
+        return self._in_progress[nation_id]
     
     def get_available_technologies(self, nation_id: int) -> List[Dict]:
         """Get technologies available for research by a nation"""
-        with self.db.get_session() as session:
-            # Get nation's current technologies
-            nation_techs = session.query(NationTechnology).filter_by(nation_id=nation_id).all()
-            researched_techs = {nt.technology.name for nt in nation_techs if nt.completed_at}
-            
-            available = []
-            
-            for category, tiers in self.technology_tree.items():
-                for tier, technologies in tiers.items():
-                    for tech in technologies:
-                        # Check if already researched
-                        if tech["name"] in researched_techs:
-                            continue
-                        
-                        # Check prerequisites
-                        can_research = True
-                        for prereq in tech["prerequisites"]:
-                            if prereq not in researched_techs:
-                                can_research = False
-                                break
-                        
-                        if can_research:
-                            available.append({
-                                "name": tech["name"],
-                                "description": tech["description"],
-                                "cost": tech["cost"],
-                                "category": category,
-                                "tier": tier,
-                                "effects": tech["effects"]
-                            })
-            
-            return available
+        graph = self._graph()
+        return [node.as_dict() for node in graph.nodes_in(graph.available_mask(self.researched_mask(nation_id)))]
     
     def can_research_technology(self, nation_id: int, tech_name: str) -> Tuple[bool, str]:
         """Check if nation can research a technology"""
+        graph = self._graph()
         with self.db.get_session() as session:
-            nation = session.query(Nation).filter_by(id=nation_id).first()
-            if not nation:
-                return False, "Nation not found"
-            
-            # Find technology in tree
-            tech_data = None
-            for category, tiers in self.technology_tree.items():
-                for tier, technologies in tiers.items():
-                    for tech in technologies:
-                        if tech["name"] == tech_name:
-                            tech_data = tech
-                            break
-            
-            if not tech_data:
-                return False, "Technology not found"
-            
-            # Check if already researched
-            existing = session.query(NationTechnology).filter_by(
-                nation_id=nation_id,
-                technology_id=tech_name  # This should be tech ID, simplified for now
-            ).first()
-            
-            if existing and existing.completed_at:
-                return False, "Technology already researched"
-            
-            # Check prerequisites
-            nation_techs = session.query(NationTechnology).filter_by(nation_id=nation_id).all()
-            researched_techs = {nt.technology.name for nt in nation_techs if nt.completed_at}
-            
-            for prereq in tech_data["prerequisites"]:
-                if prereq not in researched_techs:
-                    return False, f"Prerequisite {prereq} not researched"
-            
-            # Check research points
-            if nation.research_points < tech_data["cost"]:
-                return False, "Not enough research points"
-            
-            return True, "Can research technology"
+            research_points = session.query(Nation.research_points).filter_by(id=nation_id).scalar()
+        if research_points is None:
+            return False, "Nation not found"
+        
+        node = graph.node(tech_name)
+        if not node:
+            return False, "Technology not found"
+        
+        researched = self.researched_mask(nation_id)
+        if researched & node.mask:
+            return False, "Technology already researched"
+        if self.in_progress_mask(nation_id) & node.mask:
+            return False, "Technology already being researched"
+        
+        missing = graph.missing_prerequisites(node, researched)
+        if missing:
+            return False, f"Prerequisite {missing[0]} not researched"
+        
+        if research_points < node.cost:
+            return False, "Not enough research points"
+        
+        return True, "Can research technology"
     
     def start_research(self, nation_id: int, tech_name: str) -> bool:
         """Start researching a technology"""
@@ -224,34 +242,25 @@ class TechnologyManager:
         if not can_research:
             return False
         
+        node = self.graph.node(tech_name)
         with self.db.get_session() as session:
             nation = session.query(Nation).filter_by(id=nation_id).first()
             
-            # Find technology data
-            tech_data = None
-            for category, tiers in self.technology_tree.items():
-                for tier, technologies in tiers.items():
-                    for tech in technologies:
-                        if tech["name"] == tech_name:
-                            tech_data = tech
-                            break
-            
-            if not tech_data:
-                return False
-            
             # Deduct research points
-            nation.research_points -= tech_data["cost"]
+            nation.research_points -= node.cost
             
             # Create research record
             nation_tech = NationTechnology(
                 nation_id=nation_id,
-                technology_id=tech_name,  # Simplified
+                technology_id=self.graph.tech_ids[node.bit],
                 research_progress=0.0,
                 started_at=datetime.utcnow()
             )
             session.add(nation_tech)
             session.commit()
-            return True
+        
+        self._in_progress[nation_id] |= node.mask
+        return True
     
     def get_active_research(self, nation_id: int) -> List[NationTechnology]:
         """Get active research projects for a nation"""
@@ -261,130 +270,50 @@ class TechnologyManager:
                 NationTechnology.completed_at.is_(None)
             ).all()
     
+    @property
+    def research(self) -> ResearchTick:
+        """Research tick engine over the current database"""
+        if self._research is None or self._research.db is not self.db:
+            self._research = ResearchTick(self.db, on_completed=self._apply_technology_effects,
+                                          speeds=self.research_speeds)
+        return self._research
+    
     def update_research_progress(self, nation_id: int, research_speed: float = 1.0):
         """Update research progress for a nation"""
-        with self.db.get_session() as session:
-            active_research = self.get_active_research(nation_id)
-            
-            for research in active_research:
-                # Calculate progress increment
-                base_progress = 0.01  # 1% per update
-                progress_increment = base_progress * research_speed
-                
-                research.research_progress += progress_increment
-                
-                # Check if research is complete
-                if research.research_progress >= 1.0:
-                    research.research_progress = 1.0
-                    research.completed_at = datetime.utcnow()
-                    
-                    # Apply technology effects
-                    self._apply_technology_effects(session, nation_id, research.technology_id)
-            
-            session.commit()
+        self.research.tick(research_speed, [nation_id], generate_points=False)
     
-    def _apply_technology_effects(self, session, nation_id: int, tech_name: str):
-        """Apply technology effects to nation"""
-        # Find technology data
-        tech_data = None
-        for category, tiers in self.technology_tree.items():
-            for tier, technologies in tiers.items():
-                for tech in technologies:
-                    if tech["name"] == tech_name:
-                        tech_data = tech
-                        break
-        
-        if not tech_data:
-            return
-        
-        # Apply effects (simplified - would need more complex implementation)
-        nation = session.query(Nation).filter_by(id=nation_id).first()
-        if not nation:
-            return
-        
-        effects = tech_data["effects"]
-        
-        # This would need to be implemented based on the specific effects
-        # For now, just a placeholder
-        if "research_speed" in effects:
-            # Apply research speed bonus
-            pass
-        if "all_production" in effects:
-            # Apply production bonus
-            pass
-        # ... other effects
+    def _apply_technology_effects(self, completed: List[Tuple[int, int]]):
+        """Apply effects of completed (nation_id, technology_id) research to cached nation state"""
+        graph = self._graph()
+        for nation_id, tech_id in completed:
+            node = graph.node_by_id(tech_id)
+            if not node or nation_id not in self._researched:
+                continue
+            if self._researched[nation_id] & node.mask:
+                continue
+            self._researched[nation_id] |= node.mask
+            self._in_progress[nation_id] &= ~node.mask
+            self.modifiers.apply(nation_id, node)
     
     def get_research_points_per_hour(self, nation_id: int) -> float:
         """Calculate research points generated per hour"""
         with self.db.get_session() as session:
-            nation = session.query(Nation).filter_by(id=nation_id).first()
-            if not nation:
-                return 0.0
-            
-            # Base research points from population and infrastructure
-            base_points = nation.population * 0.001  # 0.1% of population per hour
-            
-            # Research center bonus
-            research_centers = 0  # Would count research centers in provinces
-            research_bonus = research_centers * 0.1
-            
-            # Technology bonuses
-            tech_bonus = 1.0
-            nation_techs = session.query(NationTechnology).filter_by(nation_id=nation_id).all()
-            for nt in nation_techs:
-                if nt.completed_at:  # Only completed technologies
-                    # Apply technology bonuses (simplified)
-                    pass
-            
-            total_points = (base_points + research_bonus) * tech_bonus
-            return max(0, total_points)
+            population = session.query(Nation.population).filter_by(id=nation_id).scalar()
+        if population is None:
+            return 0.0
+        
+        # Base research points from population (research centers and technology bonuses to come)
+        return max(0, population * POINTS_PER_POPULATION)
     
     def generate_research_points(self):
         """Generate research points for all nations"""
         with self.db.get_session() as session:
-            nations = session.query(Nation).all()
-            
-            for nation in nations:
-                points_per_hour = self.get_research_points_per_hour(nation.id)
-                nation.research_points += points_per_hour
-                
-                # Cap research points at 10000
-                nation.research_points = min(10000, nation.research_points)
-            
+            ResearchTick.generate_points(session)
             session.commit()
     
     def get_technology_effects(self, nation_id: int) -> Dict:
         """Get all active technology effects for a nation"""
-        with self.db.get_session() as session:
-            nation_techs = session.query(NationTechnology).filter_by(nation_id=nation_id).all()
-            completed_techs = [nt for nt in nation_techs if nt.completed_at]
-            
-            effects = {
-                "military": {},
-                "economic": {},
-                "research": {}
-            }
-            
-            for nt in completed_techs:
-                tech_name = nt.technology_id  # Simplified
-                
-                # Find technology data
-                tech_data = None
-                for category, tiers in self.technology_tree.items():
-                    for tier, technologies in tiers.items():
-                        for tech in technologies:
-                            if tech["name"] == tech_name:
-                                tech_data = tech
-                                break
-                
-                if tech_data:
-                    category = None
-                    for cat in effects.keys():
-                        if any(tech_name in [t["name"] for t in self.technology_tree[cat].values()]):
-                            category = cat
-                            break
-                    
-                    if category:
-                        effects[category].update(tech_data["effects"])
-            
-            return effects
\ No newline at end of file
+        effects = {category: {} for category in self.technology_tree}
+        for node in self.graph.nodes_in(self.researched_mask(nation_id)):
+            effects[node.category].update(node.effects)
+        return effects
@@ -5,6 +5,8 @@ import asyncio
 import pytest
 import os
 import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
 from unittest.mock import Mock, patch
 from dotenv import load_dotenv
 
@@ -12,11 +14,35 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Import bot components
-from database import DatabaseManager, Player, Nation, Province, PlayerUnit, PlayerMaterial
+from database import (DatabaseManager, Player, Nation, Province, PlayerUnit, PlayerMaterial, MarketOrder, MarketFill,
+                      Trade, Quest, PlayerQuest, LedgerBatch, Technology, NationTechnology)
 from military_assets import MilitaryAssetsDatabase, MilitaryAsset
-from economy import EconomyManager, TradeManager, DailyIncomeManager
+from economy import EconomyManager, TradeManager, DailyIncomeManager, MarketAnalysis
+from price_history import PriceHistoryStore
+from price_engine import PriceEngine
+from resource_ledger import ResourceLedger, TransactionLog
+from simulation import simulate
+from simulation_rng import SimulationRNG
 from military import MilitaryManager, UnitUpkeepManager
+from province_manager import ProvinceManager
+from ledger import Ledger, Entry, Posting, GOLD, INCOME, ORDER_ESCROW, SHOP, material_asset, opening_entries, player_account, transfer
+from order_book import MatchingEngine, MarketExchange, BUY, SELL
+from battle_log import BattleLogCodec, BattleRound, LazyBattleReplay
+from catalogue_cache import load_catalogue, clear_loaded_catalogues
+from enhanced_military_assets import EnhancedMilitaryAssetsDatabase
+from complex_resources import ComplexResourceManager, ResourceType
 from quest_system import QuestManager
+from quest_eligibility import QuestEligibility
+from quest_board import QuestBoard
+from quest_timers import QuestTimerQueue
+from quest_generator import QuestGenerator
+from tech_graph import TechGraph
+from research_tick import ResearchTick, MAX_RESEARCH_POINTS
+from military_quiz_system import MilitaryQuizDatabase, DifficultyLevel, QuestionCategory
+from quiz_sampler import QuestionSampler
+from military_quiz_system import MilitaryQuizSystem
+from quiz_results import DATA_DIR, DEFAULT_RESULTS_FILE, QuizResultStore
+from quiz_leaderboard import Leaderboard, QuizLeaderboards
 from technology import TechnologyManager
 from world_simulation import WorldSimulator
 from admin import AdminManager
@@ -86,6 +112,28 @@ class TestMilitaryAssets:
         stealth_results = db.search_assets("stealth")
         assert len(stealth_results) > 0
     
+    def test_indexed_queries(self):
+        """Test indexed queries return immutable results matching a full scan"""
+        db = MilitaryAssetsDatabase()
+        
+        infantry = db.get_assets_by_category("infantry")
+        assert isinstance(infantry, tuple)
+        assert list(infantry) == [a for a in db.assets.values() if a.category == "infantry"]
+        
+        elite = db.get_assets_by_subcategory("infantry", "elite")
+        assert elite and all(a.subcategory == "elite" for a in elite)
+        assert "elite" in db.get_asset_subcategories("infantry")
+        assert sum(db.get_tier_counts().values()) == db.get_total_assets()
+        assert db.get_assets_by_category("unknown") == ()
+        
+        for query in ["rifle", "Main Battle", "an", "stealth", "zzz", "", "e", "ank", "n s"]:
+            expected = [
+                a for a in db.assets.values()
+                if any(query.lower() in field.lower()
+                       for field in (a.name, a.description, a.category, a.subcategory))
+            ]
+            assert list(db.search_assets(query)) == expected
+    
     def test_asset_properties(self):
         """Test asset properties are correct"""
         db = MilitaryAssetsDatabase()
@@ -110,6 +158,71 @@ class TestMilitaryAssets:
             assert quantum_soldier.cost > 1000
             assert "quantum" in quantum_soldier.special_abilities
 
+class TestCatalogueCache:
+    """Test cached catalogue loading"""
+    
+    def test_catalogue_built_once_and_cached(self):
+        """Test catalogues are built once, then served from memory and disk"""
+        builds = []
+        
+        def builder():
+            builds.append(1)
+            return {"rifleman": MilitaryAssetsDatabase().get_asset("Rifleman")}
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = load_catalogue("test_catalogue", [__file__], builder, cache_dir)
+            assert load_catalogue("test_catalogue", [__file__], builder, cache_dir) is first
+            
+            clear_loaded_catalogues()
+            from_disk = load_catalogue("test_catalogue", [__file__], builder, cache_dir)
+            assert from_disk == first
+            assert len(builds) == 1
+    
+    def test_catalogue_instances_share_data(self):
+        """Test repeated database instances reuse the loaded catalogue"""
+        assert MilitaryAssetsDatabase().assets is MilitaryAssetsDatabase().assets
+    
+    def test_compact_records(self):
+        """Test catalogue records are slotted, frozen and tuple based"""
+        sniper = MilitaryAssetsDatabase().get_asset("Sniper")
+        assert not hasattr(sniper, "__dict__")
+        assert isinstance(sniper.special_abilities, tuple)
+        assert "stealth" in sniper.special_abilities
+        with pytest.raises(AttributeError):
+            sniper.cost = 1
+
+class TestResourcePlanner:
+    """Test whole-catalogue resource requirement queries"""
+    
+    def test_batch_queries_match_single_asset_checks(self):
+        """Test batch affordability and costs agree with per-asset methods"""
+        db = EnhancedMilitaryAssetsDatabase()
+        user_resources = {
+            ResourceType.GOLD: 5000,
+            ResourceType.IRON: 200,
+            ResourceType.MANPOWER: 20,
+            ResourceType.AMMUNITION: 1000,
+            ResourceType.FOOD: 100
+        }
+        
+        affordable = {asset.name for asset in db.get_affordable_assets(user_resources)}
+        quantities = db.get_max_buildable_quantities(user_resources)
+        for key, asset in db.assets.items():
+            can_build, _ = db.check_resource_availability(user_resources, key)
+            assert (asset.name in affordable) == can_build
+            assert (quantities[key] >= 1) == can_build
+        assert quantities["rifleman"] == 10  # Limited by 100 ammunition each
+        
+        resource_manager = ComplexResourceManager(None)
+        prices = {rt: p.price for rt, p in resource_manager.get_all_prices().items()}
+        costs = db.calculate_market_costs(resource_manager)
+        for key in db.assets:
+            assert costs[key] == pytest.approx(db.calculate_total_cost(key, prices))
+        
+        oil_assets = db.get_assets_by_resource_requirement(ResourceType.OIL)
+        assert all(any(r.resource_type == ResourceType.OIL for r in a.resource_requirements)
+                   for a in oil_assets)
+
 class TestDatabase:
     """Test database functionality"""
     
@@ -232,6 +345,559 @@ class TestEconomy:
         assert cost > 0
         assert cost == economy.current_prices["iron"] * 100
 
+class TestPriceEngine:
+    """Test the shared vectorised price engine"""
+    
+    ECONOMY_CONFIG = {
+        "materials": {"iron": {"base_price": 10, "volatility": 0.1}, "oil": {"base_price": 15, "volatility": 0.15}},
+        "price_update_interval": 1800
+    }
+    
+    def test_shared_engine(self):
+        """Test both managers price their instruments in one engine"""
+        engine = PriceEngine()
+        economy = EconomyManager(self.ECONOMY_CONFIG, price_engine=engine)
+        resources = ComplexResourceManager(None, price_engine=engine)
+        assert len(engine.prices) == 2 + len(resources.resources)
+        
+        before = resources.get_resource_price(ResourceType.OIL).price
+        engine.step()
+        for _ in range(50):
+            economy.update_prices()
+            resources.update_prices()
+        
+        for material, price in economy.current_prices.items():
+            assert economy.base_prices[material] * 0.1 <= price <= economy.base_prices[material] * 5
+        oil = resources.resources[ResourceType.OIL]
+        after = resources.get_resource_price(ResourceType.OIL)
+        assert oil.min_price <= after.price <= oil.max_price
+        assert after.price != before
+    
+    def test_order_flow_buffer(self):
+        """Test trade impact is netted and capped before prices are read"""
+        economy = EconomyManager(self.ECONOMY_CONFIG)
+        economy.apply_market_impact("iron", 50, "buy")
+        economy.apply_market_impact("iron", 30, "sell")
+        assert economy.current_prices["iron"] == pytest.approx(10 * 1.02)
+        
+        for _ in range(10):
+            economy.apply_market_impact("oil", 1000, "buy")
+        assert economy.current_prices["oil"] == pytest.approx(15 * 1.1)
+        economy.apply_market_impact("unknown", 1000, "buy")
+    
+    def test_events_indexed_by_resource(self):
+        """Test market events only touch affected resources and expire"""
+        resources = ComplexResourceManager(None)
+        engine = resources.price_engine
+        resources.create_market_event("oil_crisis", "Oil fields attacked",
+                                      [ResourceType.OIL, ResourceType.FUEL], 0.2, 0.5, 1)
+        
+        assert resources._calculate_event_impact(ResourceType.OIL) == pytest.approx(0.1)
+        assert resources._calculate_event_impact(ResourceType.IRON) == 0
+        assert [e["event_type"] for e in resources.get_market_events(ResourceType.FUEL)] == ["oil_crisis"]
+        
+        engine.expire_events(datetime.now() + timedelta(hours=2))
+        assert resources._calculate_event_impact(ResourceType.OIL) == 0
+        assert resources.get_market_events(ResourceType.FUEL) == []
+
+class TestResourceLedger:
+    """Test persistent per-user resource balances"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_balances_survive_restart(self, temp_db):
+        """Test write-behind flush persists balances and evicted users reload"""
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "transactions.jsonl")
+            ledger = ResourceLedger(len(ResourceType), temp_db, TransactionLog(capacity=3, spill_path=log_path),
+                                    max_resident=2)
+            resources = ComplexResourceManager(temp_db, ledger=ledger)
+            ledger.is_running = True  # as if flush_loop() were writing behind
+            resources.add_resource(1, ResourceType.GOLD, 1000, "starting")
+            resources.add_resource(1, ResourceType.OIL, 100, "starting")
+            success, _, cost = resources.buy_resource(1, ResourceType.FOOD, 10)
+            assert success
+            assert resources.get_user_resources(1)[ResourceType.GOLD] == pytest.approx(1000 - cost)
+            assert ledger.flush() == 1
+            
+            # Touching more users than fit evicts the clean user, who reloads from the table
+            resources.add_resource(2, ResourceType.IRON, 5)
+            resources.add_resource(3, ResourceType.IRON, 7)
+            assert 1 not in ledger.rows
+            assert resources.get_user_resources(1)[ResourceType.FOOD] == pytest.approx(10)
+            ledger.stop()
+            
+            # Only the newest transactions stay in memory; all of them are on disk
+            assert len(resources.transactions) == 3
+            assert [t.amount for t in resources.get_user_transactions(1)] == [10]
+            with open(log_path) as f:
+                assert len(f.readlines()) == 5
+            
+            restarted = ComplexResourceManager(temp_db)
+            assert restarted.get_user_resources(1) == resources.get_user_resources(1)
+            assert restarted.get_user_resources(3) == {ResourceType.IRON: 7}
+            assert not restarted.spend_resource(2, ResourceType.IRON, 6)[0]
+            
+            # Without a flush loop every change is written before the call returns
+            assert restarted.spend_resource(3, ResourceType.IRON, 2)[0]
+            assert not restarted.ledger._dirty
+            assert ComplexResourceManager(temp_db).get_user_resources(3) == {ResourceType.IRON: 5}
+    
+    def test_storage_capacity(self):
+        """Test purchases respect per-resource capacity"""
+        resources = ComplexResourceManager(None)
+        resources.add_resource(1, ResourceType.GOLD, 1e6)
+        assert not resources.buy_resource(1, ResourceType.FOOD, 1001)[0]
+        resources.ledger.set_capacity(1, list(ResourceType).index(ResourceType.FOOD), 5000)
+        assert resources.buy_resource(1, ResourceType.FOOD, 1001)[0]
+
+class TestSimulation:
+    """Test seeded subsystem RNGs and the headless simulation driver"""
+    
+    def test_subsystem_streams(self):
+        """Test streams depend only on the seed and subsystem name"""
+        first = SimulationRNG(123)
+        second = SimulationRNG(123)
+        second.random("world").random()  # draws elsewhere must not shift other streams
+        assert first.generator("economy").random(5).tolist() == second.generator("economy").random(5).tolist()
+        assert first.random("combat").random() == second.random("combat").random()
+        assert SimulationRNG(123).random("world").random() != SimulationRNG(123).random("combat").random()
+    
+    def test_reproducible_runs(self):
+        """Test equal seeds reproduce a run exactly and different seeds diverge"""
+        report = simulate(6, seed=7, players=8, provinces=10, battles_per_hour=2)
+        assert report.economy_ticks == 12 and report.world_ticks == 6
+        assert report.battles > 0
+        assert simulate(6, seed=7, players=8, provinces=10, battles_per_hour=2).state_digest == report.state_digest
+        assert simulate(6, seed=8, players=8, provinces=10, battles_per_hour=2).state_digest != report.state_digest
+
+class TestPriceHistory:
+    """Test ring-buffer price history and OHLC rollups"""
+    
+    def test_ring_buffer_keeps_latest_ticks(self):
+        """Test old ticks are overwritten and order is preserved"""
+        store = PriceHistoryStore(["iron", "oil"], tick_capacity=5)
+        start = datetime(2024, 1, 1)
+        for i in range(8):
+            store.record({"iron": float(i), "oil": 100.0 + i}, start + timedelta(seconds=i))
+        
+        assert len(store) == 5
+        assert store.recent("iron").tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+        assert store.recent("oil", 2).tolist() == [106.0, 107.0]
+        assert store.recent_matrix(1).tolist() == [[7.0, 107.0]]
+    
+    def test_ohlc_rollups(self):
+        """Test ticks roll up into minute and hour bars"""
+        store = PriceHistoryStore(["iron"])
+        start = datetime(2024, 1, 1, 12, 0)
+        for seconds, price in [(0, 10.0), (20, 12.0), (40, 9.0), (70, 11.0), (3700, 15.0)]:
+            store.record({"iron": price}, start + timedelta(seconds=seconds))
+        
+        minutes = store.get_ohlc("iron", "1m")
+        assert minutes["open"].tolist() == [10.0, 11.0, 15.0]
+        assert minutes["high"][0] == 12.0 and minutes["low"][0] == 9.0 and minutes["close"][0] == 9.0
+        
+        hours = store.get_ohlc("iron", "1h")
+        assert hours["close"].tolist() == [11.0, 15.0]
+        assert hours["high"].tolist() == [12.0, 15.0]
+        assert store.get_ohlc("iron", "1d")["low"].tolist() == [9.0]
+    
+    def test_persistence(self):
+        """Test the store survives a save and load"""
+        config = {
+            "materials": {"iron": {"base_price": 10, "volatility": 0.1}, "oil": {"base_price": 15, "volatility": 0.15}},
+            "price_update_interval": 1800
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            config["price_history_file"] = os.path.join(tmp, "history.npz")
+            economy = EconomyManager(config)
+            for _ in range(30):
+                economy.update_prices()
+            economy.stop()
+            
+            restored = EconomyManager(config)
+            assert len(restored.price_history) == 30
+            assert restored.price_history.recent("oil").tolist() == economy.price_history.recent("oil").tolist()
+            
+            chart = MarketAnalysis(restored).get_price_chart("iron", "1d")
+            assert len(chart) == 1
+            assert chart[0]["close"] == economy.current_prices["iron"]
+
+class TestMarketAnalysis:
+    """Test vectorised market analysis"""
+    
+    def test_indicators(self):
+        """Test indicators for all materials match per-material calculations"""
+        economy = EconomyManager({
+            "materials": {"iron": {"base_price": 10, "volatility": 0.1}, "oil": {"base_price": 15, "volatility": 0.15}},
+            "price_update_interval": 1800
+        })
+        analysis = MarketAnalysis(economy)
+        assert analysis.get_market_trends() == {}
+        
+        for _ in range(25):
+            economy.update_prices()
+        trends = analysis.get_market_trends()
+        
+        for material in ("iron", "oil"):
+            prices = economy.price_history.recent(material).tolist()
+            recent = prices[-10:]
+            changes = [b - a for a, b in zip(recent, recent[1:])]
+            assert trends[material]["change_percent"] == pytest.approx((recent[-1] - recent[0]) / recent[0] * 100)
+            assert trends[material]["volatility"] == pytest.approx(sum(map(abs, changes)) / len(changes) / recent[0] * 100)
+            assert trends[material]["sma_long"] == pytest.approx(sum(prices[-20:]) / 20)
+            assert 0 <= trends[material]["rsi"] <= 100
+    
+    def test_cached_per_tick(self):
+        """Test trends are reused until a new price tick arrives"""
+        economy = EconomyManager({
+            "materials": {"iron": {"base_price": 10, "volatility": 0.1}},
+            "price_update_interval": 1800
+        })
+        analysis = MarketAnalysis(economy)
+        economy.update_prices()
+        economy.update_prices()
+        
+        trends = analysis.get_market_trends()
+        assert analysis.get_market_trends() is trends
+        economy.update_prices()
+        assert analysis.get_market_trends() is not trends
+
+class TestMarketListings:
+    """Test paginated, cached open-trade listings"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def _trade_manager(self, temp_db):
+        economy = EconomyManager({
+            "materials": {"iron": {"base_price": 10, "volatility": 0.1}, "oil": {"base_price": 15, "volatility": 0.15}},
+            "price_update_interval": 1800
+        })
+        with temp_db.get_session() as session:
+            seller = Player(telegram_id=1, username="seller")
+            session.add(seller)
+            session.commit()
+            seller_id = seller.id
+            session.add_all([
+                PlayerMaterial(player_id=seller_id, material_type="iron", quantity=1000),
+                PlayerMaterial(player_id=seller_id, material_type="oil", quantity=1000)
+            ])
+            session.commit()
+        return TradeManager(temp_db, economy, Ledger(temp_db)), seller_id
+    
+    def test_keyset_pagination(self, temp_db):
+        """Test pages follow the requested order without gaps or repeats"""
+        trade_manager, seller_id = self._trade_manager(temp_db)
+        prices = [12.0, 9.5, 11.0, 9.5, 14.0, 10.0, 13.0]
+        for price in prices:
+            trade_manager.create_trade(seller_id, "iron", 10, price)
+        trade_manager.create_trade(seller_id, "oil", 10, 1.0)
+        
+        seen, cursor = [], None
+        while True:
+            page = trade_manager.listings.get_page("iron", "price", cursor, page_size=3)
+            seen.extend(listing.price_per_unit for listing in page.listings)
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert seen == sorted(prices)
+        
+        newest = trade_manager.get_market_page(sort="age").listings
+        assert [listing.material_type for listing in newest][0] == "oil"
+        assert len(newest) == len(prices) + 1
+    
+    def test_cache_invalidation(self, temp_db):
+        """Test listings are served from cache until the market changes"""
+        trade_manager, seller_id = self._trade_manager(temp_db)
+        trade_manager.create_trade(seller_id, "iron", 10, 5.0)
+        
+        first = trade_manager.get_market_page("iron")
+        assert trade_manager.get_market_page("iron") is first
+        
+        assert trade_manager.cancel_trade(first.listings[0].id, seller_id)
+        assert trade_manager.get_market_page("iron").listings == ()
+        assert trade_manager.get_market_page().listings == ()
+
+class TestTradeExpiry:
+    """Test background trade expiry"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_sweep_expires_due_trades(self, temp_db):
+        """Test due trades expire in bulk and later ones stay open"""
+        trade_manager, seller_id = TestMarketListings()._trade_manager(temp_db)
+        for _ in range(3):
+            trade_manager.create_trade(seller_id, "iron", 10, 5.0)
+        listing = trade_manager.get_market_page("iron").listings[0]
+        assert trade_manager.cancel_trade(listing.id, seller_id)
+        
+        # Restart: the sweeper reloads open trades from the database
+        trade_manager.expiry.load()
+        assert trade_manager.expiry.sweep() == 0
+        
+        # A failing batch keeps its trades scheduled, and committed batches stay expired
+        expiry, later = trade_manager.expiry, datetime.utcnow() + timedelta(hours=25)
+        expiry.BATCH_SIZE = 1
+        on_expired, calls = expiry.on_expired, []
+        def fail_second(session, rows):
+            calls.append(rows)
+            if len(calls) == 2:
+                raise RuntimeError("database unavailable")
+            on_expired(session, rows)
+        expiry.on_expired = fail_second
+        with pytest.raises(RuntimeError):
+            expiry.sweep(later)
+        assert len(expiry._heap) == 1
+        expiry.on_expired = on_expired
+        assert expiry.sweep(later) == 1
+        expiry.load()
+        assert trade_manager.expiry.sweep(later) == 0
+        assert trade_manager.expiry.next_due() is None
+        
+        with temp_db.get_session() as session:
+            statuses = sorted(trade.status for trade in session.query(Trade))
+            # Escrow of cancelled and expired listings is back with the seller
+            iron = session.query(PlayerMaterial).filter_by(player_id=seller_id, material_type="iron").one()
+        assert statuses == ["cancelled", "expired", "expired"]
+        assert iron.quantity == 1000
+        assert trade_manager.get_market_page("iron").listings == ()
+    
+    def test_loop_wakes_for_new_trades(self, temp_db):
+        """Test the loop sleeps until the earliest due time"""
+        trade_manager, seller_id = TestMarketListings()._trade_manager(temp_db)
+        expiry = trade_manager.expiry
+        
+        async def scenario():
+            task = asyncio.create_task(expiry.run())
+            await asyncio.sleep(0.05)
+            with temp_db.get_session() as session:
+                trade = Trade(seller_id=seller_id, material_type="iron", quantity=1, price_per_unit=1,
+                              total_price=1, expires_at=datetime.utcnow() + timedelta(seconds=0.1))
+                session.add(trade)
+                session.commit()
+                expiry.schedule(trade.id, trade.expires_at)
+            await asyncio.sleep(0.3)
+            expiry.stop()
+            await task
+        
+        asyncio.run(scenario())
+        with temp_db.get_session() as session:
+            assert session.query(Trade).one().status == "expired"
+
+class TestTradeSettlement:
+    """Test escrowed, row-locked trade settlement"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_escrow_and_batch_settlement(self, temp_db):
+        """Test listing escrows materials and a batch settles each trade once"""
+        trade_manager, seller_id = TestMarketListings()._trade_manager(temp_db)
+        with temp_db.get_session() as session:
+            buyer = Player(telegram_id=2, username="buyer", gold=200.0)
+            session.add(buyer)
+            session.commit()
+            buyer_id = buyer.id
+        
+        assert trade_manager.create_trade(seller_id, "iron", 2000, 1.0) is None
+        first = trade_manager.create_trade(seller_id, "iron", 600, 0.1)
+        second = trade_manager.create_trade(seller_id, "iron", 400, 0.2)
+        assert trade_manager.create_trade(seller_id, "iron", 1, 1.0) is None  # all iron is escrowed
+        
+        results = trade_manager.execute_trades([(first.id, buyer_id), (first.id, buyer_id), (second.id, buyer_id)])
+        assert results == [True, False, True]
+        assert not trade_manager.execute_trade(second.id, buyer_id)
+        
+        with temp_db.get_session() as session:
+            assert session.get(Player, buyer_id).gold == pytest.approx(60.0)
+            assert session.get(Player, seller_id).gold == pytest.approx(1000.0 + 140.0)
+            quantities = {(m.player_id, m.material_type): m.quantity for m in session.query(PlayerMaterial)}
+        assert quantities[(seller_id, "iron")] == 0
+        assert quantities[(buyer_id, "iron")] == 1000
+        
+        # Gold already spent in the ledger's batch window cannot pay for a trade
+        ledger = trade_manager.settlement.ledger
+        oil = trade_manager.create_trade(seller_id, "oil", 100, 0.2)
+        ledger.is_running = True
+        ledger.transfer(player_account(buyer_id), SHOP, GOLD, 50, "unit_purchase")
+        assert not trade_manager.execute_trade(oil.id, buyer_id)
+        ledger.is_running = False
+        ledger.commit()
+        assert ledger.balance(player_account(buyer_id)) == pytest.approx(10.0)
+    
+    def test_concurrent_buyers(self, temp_db):
+        """Stress test: many buyers racing for the same listings never double-sell"""
+        from concurrent.futures import ThreadPoolExecutor
+        import random
+        
+        trade_manager, seller_id = TestMarketListings()._trade_manager(temp_db)
+        trade_ids = [trade_manager.create_trade(seller_id, "iron", 50, 2.0).id for _ in range(20)]
+        with temp_db.get_session() as session:
+            buyers = [Player(telegram_id=100 + i, username=f"buyer{i}", gold=300.0) for i in range(16)]
+            session.add_all(buyers)
+            session.commit()
+            buyer_ids = [buyer.id for buyer in buyers]
+            total_gold = sum(player.gold for player in session.query(Player))
+        
+        def buyer_session(buyer_id):
+            rng = random.Random(buyer_id)
+            bought = 0
+            for _ in range(10):
+                if rng.random() < 0.3:
+                    fills = [(trade_id, buyer_id) for trade_id in rng.sample(trade_ids, 3)]
+                    bought += sum(trade_manager.execute_trades(fills))
+                else:
+                    bought += trade_manager.execute_trade(rng.choice(trade_ids), buyer_id)
+            return bought
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            purchases = sum(pool.map(buyer_session, buyer_ids))
+        
+        with temp_db.get_session() as session:
+            completed = session.query(Trade).filter_by(status="completed").count()
+            players = session.query(Player).all()
+            iron = sum(m.quantity for m in session.query(PlayerMaterial).filter_by(material_type="iron"))
+            escrowed = sum(trade.escrow_quantity for trade in session.query(Trade))
+        
+        assert purchases == completed
+        assert sum(player.gold for player in players) == pytest.approx(total_gold)
+        assert all(player.gold >= 0 for player in players)
+        assert iron + escrowed == pytest.approx(1000)
+
+class TestLedger:
+    """Test double-entry postings, batching and audits"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_movements_are_audited(self, temp_db):
+        """Test every manager posts through the ledger and balances can be rebuilt"""
+        ledger = Ledger(temp_db)
+        with temp_db.get_session() as session:
+            players = [Player(telegram_id=i, username=f"p{i}", gold=100.0) for i in (1, 2)]
+            session.add_all(players)
+            session.flush()
+            ledger.record(session, [entry for p in players for entry in opening_entries(p.id, p.gold)])
+            quest = Quest(title="Supply Run", description="Move supplies", quest_type="escort",
+                          rewards={"gold": 50, "materials": {"iron": 20}})
+            session.add(quest)
+            session.flush()
+            session.add(PlayerQuest(player_id=players[0].id, quest_id=quest.id))
+            session.commit()
+            player_ids, quest_id = [p.id for p in players], quest.id
+        
+        ledger.checkpoint()
+        assert ledger.drift == {}
+        income = DailyIncomeManager(temp_db, {"daily_income_base": 1000, "tax_rate": 0.1, "inflation_rate": 0.0},
+                                    ledger)
+        with temp_db.get_session() as session:
+            paid = sum(income.calculate_daily_income(player) for player in session.query(Player))
+        income.process_daily_income()
+        with temp_db.get_session() as session:
+            batch = session.query(LedgerBatch).order_by(LedgerBatch.id.desc()).first()
+            assert batch.entry_count == 2
+        
+        quests = QuestManager()
+        quests.db, quests.ledger = temp_db, ledger
+        assert quests.complete_quest(player_ids[0], quest_id)
+        
+        economy = EconomyManager({"materials": {"iron": {"base_price": 10, "volatility": 0.1}},
+                                  "price_update_interval": 1800})
+        trades = TradeManager(temp_db, economy, ledger)
+        trade = trades.create_trade(player_ids[0], "iron", 15, 2.0)
+        assert trades.execute_trade(trade.id, player_ids[1])
+        
+        military = MilitaryManager({"unit_types": {}, "battle_cooldown": 300})
+        military.db = temp_db
+        with pytest.raises(RuntimeError):
+            military.build_units(player_ids[1], "Rifleman", 1)
+        military.ledger = ledger
+        cost = military.calculate_unit_cost("Rifleman", 2)
+        assert military.build_units(player_ids[1], "Rifleman", 2)
+        admin = AdminManager([])
+        admin.db, admin.ledger = temp_db, ledger
+        assert admin.give_gold(1, 25)
+        
+        for player_id in player_ids:
+            assert ledger.audit(player_id) == {}
+        assert ledger.reconstruct(player_account(player_ids[1]))[material_asset("iron")] == pytest.approx(15)
+        assert ledger.balance(INCOME) == pytest.approx(-paid)
+        assert ledger.balance(SHOP) == pytest.approx(cost)
+        
+        # Writes that bypass the ledger show up in the audit, and checkpoints do not absorb them
+        with temp_db.get_session() as session:
+            session.get(Player, player_ids[1]).gold += 5
+            session.commit()
+        ledger.checkpoint()
+        gold_ledger, gold_actual = ledger.drift[player_account(player_ids[1])][GOLD]
+        assert gold_actual - gold_ledger == pytest.approx(5)
+        assert ledger.audit(player_ids[1])[GOLD] == (gold_ledger, gold_actual)
+        assert ledger.audit(player_ids[0]) == {}
+    
+    def test_batched_commits(self, temp_db):
+        """Test entries queue while the commit loop runs and land in one batch"""
+        with temp_db.get_session() as session:
+            session.add(Player(telegram_id=1, username="p1", gold=0.0))
+            session.commit()
+        ledger = Ledger(temp_db, commit_interval=0.01)
+        account = player_account(1)
+        
+        async def scenario():
+            task = asyncio.create_task(ledger.run())
+            await asyncio.sleep(0)
+            for _ in range(10):
+                ledger.transfer(INCOME, account, GOLD, 5, "test")
+            assert ledger.pending(account) == 50
+            await asyncio.sleep(0.05)
+            assert ledger.pending(account) == 0
+            ledger.stop()
+            await task
+        
+        asyncio.run(scenario())
+        assert ledger.balance(account) == pytest.approx(50)
+        with temp_db.get_session() as session:
+            assert session.query(LedgerBatch).count() == 1
+        with pytest.raises(ValueError):
+            ledger.post(Entry("broken", (Posting(account, GOLD, 5),)))
+
 class TestMilitary:
     """Test military system"""
     
@@ -288,6 +954,188 @@ class TestMilitary:
         power = military.calculate_combat_power(units)
         assert power > 0
 
+class TestBattleLog:
+    """Test compact battle replay encoding"""
+    
+    def test_replay_round_trip(self):
+        """Test encoding and decoding a multi-round replay"""
+        codec = BattleLogCodec()
+        attacker_units = {"Rifleman": 120, "infantry": 5, "rifleman": 2}
+        defender_units = {"Sniper": 40}
+        rounds = [
+            BattleRound(100.0, 80.0, {"attacker": {"Rifleman": 6}, "defender": {"Sniper": 4}}),
+            BattleRound(90.0, 70.0, {"attacker": {"Rifleman": 3, "infantry": 1}, "defender": {"Sniper": 5}})
+        ]
+        
+        blob = codec.encode(attacker_units, defender_units, rounds)
+        replay = codec.decode(blob)
+        
+        assert replay.attacker_units == attacker_units
+        assert replay.defender_units == defender_units
+        assert len(replay.rounds) == 2
+        assert replay.rounds[1].attacker_power == 90.0
+        assert replay.casualties == {
+            "attacker": {"Rifleman": 9, "infantry": 1},
+            "defender": {"Sniper": 9}
+        }
+        
+        # Catalogue-position replays from version 1 are rejected rather than misread
+        import struct
+        import zlib
+        with pytest.raises(ValueError):
+            codec.decode(zlib.compress(bytes([1, 0, 0, 0, 0, 0, 0])))
+        # Version 2 replays with 32-bit quantities still decode
+        version_2 = (struct.pack("<BHH", 2, 1, 0) + struct.pack("<H", 7) + b"Militia" +
+                     struct.pack("<H", 1) + struct.pack("<HI", 0, 12) + struct.pack("<H", 0))
+        assert codec.decode(zlib.compress(version_2)).attacker_units == {"Militia": 12}
+        
+        # Quantities beyond 32 bits survive the round trip
+        huge = {"Militia": 2 ** 40}
+        assert codec.decode(codec.encode(huge, {}, [BattleRound(1.0, 1.0, {"attacker": huge})])).casualties == {
+            "attacker": huge, "defender": {}
+        }
+    
+    def test_lazy_replay_decodes_on_demand(self):
+        """Test lazy replay only decodes on first access"""
+        codec = BattleLogCodec()
+        blob = codec.encode({"Rifleman": 10}, {"Sniper": 5}, [BattleRound(1.0, 2.0)])
+        
+        lazy = LazyBattleReplay(blob, codec)
+        assert not lazy.is_decoded
+        assert lazy.defender_units == {"Sniper": 5}
+        assert lazy.is_decoded
+
+class TestOrderBook:
+    """Test order book matching and batched persistence"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_price_time_priority(self):
+        """Test best price matches first, then oldest order at that price"""
+        engine = MatchingEngine()
+        first, _ = engine.submit_limit(1, "iron", SELL, 10.0, 5)
+        second, _ = engine.submit_limit(2, "iron", SELL, 10.0, 5)
+        cheaper, _ = engine.submit_limit(3, "iron", SELL, 9.0, 5)
+        
+        order, fills = engine.submit_limit(4, "iron", BUY, 10.0, 8)
+        assert order.status == "filled"
+        assert [(f.sell_order_id, f.price, f.quantity) for f in fills] == [
+            (cheaper.order_id, 9.0, 5), (first.order_id, 10.0, 3)
+        ]
+        assert first.remaining == 2 and first.is_open
+        assert second.remaining == 5
+        assert engine.get_book("iron").depth()[SELL] == [(10.0, 7)]
+    
+    def test_market_orders_and_cancellation(self):
+        """Test market orders fill what they can and never rest"""
+        engine = MatchingEngine()
+        ask, _ = engine.submit_limit(1, "oil", SELL, 15.0, 10)
+        bid, _ = engine.submit_limit(2, "oil", BUY, 12.0, 10)
+        
+        order, fills = engine.submit_market(3, "oil", BUY, 20, budget=75.0)
+        assert sum(f.quantity for f in fills) == 5
+        assert order.status == "cancelled"
+        assert order.order_id not in engine.open_orders
+        
+        assert engine.cancel(bid.order_id, player_id=1) is False
+        assert engine.cancel(bid.order_id, player_id=2) is True
+        order, fills = engine.submit_market(4, "oil", SELL, 5)
+        assert fills == [] and order.status == "cancelled"
+        
+        # Self-trade prevention cancels the resting order instead of matching it
+        order, fills = engine.submit_limit(1, "oil", BUY, 20.0, 1)
+        assert fills == [] and ask.status == "cancelled" and order.is_open
+    
+    def test_batched_settlement(self, temp_db):
+        """Test fills settle gold and materials when the batch is flushed"""
+        economy = EconomyManager({
+            "materials": {"iron": {"base_price": 10, "volatility": 0.1}},
+            "price_update_interval": 1800
+        })
+        with temp_db.get_session() as session:
+            seller = Player(telegram_id=1, username="seller", gold=0.0)
+            buyer = Player(telegram_id=2, username="buyer", gold=1000.0)
+            session.add_all([seller, buyer])
+            session.commit()
+            seller_id, buyer_id = seller.id, buyer.id
+            session.add(PlayerMaterial(player_id=seller_id, material_type="iron", quantity=100))
+            session.commit()
+        
+        ledger = Ledger(temp_db)
+        exchange = MarketExchange(temp_db, economy, ledger)
+        exchange.load()
+        success, _, _, _ = exchange.place_limit_order(seller_id, "iron", SELL, 10.0, 60)
+        assert success
+        # The listed iron is escrowed, so other spend paths cannot use it either
+        assert ledger.balance(player_account(seller_id), material_asset("iron")) == 40
+        success, message, _, _ = exchange.place_limit_order(seller_id, "iron", SELL, 11.0, 50)
+        assert not success and "Insufficient" in message
+        
+        success, _, order, fills = exchange.place_market_order(buyer_id, "iron", BUY, 40)
+        assert success and order.status == "filled" and len(fills) == 1
+        # Pending fills count towards the buyer's available gold before flushing
+        success, message, _, _ = exchange.place_limit_order(buyer_id, "iron", BUY, 10.0, 61)
+        assert not success and message == "Insufficient gold"
+        exchange.flush()
+        
+        with temp_db.get_session() as session:
+            assert session.get(Player, seller_id).gold == 400.0
+            assert session.get(Player, buyer_id).gold == 600.0
+            materials = {
+                (m.player_id, m.material_type): m.quantity for m in session.query(PlayerMaterial)
+            }
+            # The resting remainder stays in escrow
+            assert materials == {(seller_id, "iron"): 40, (buyer_id, "iron"): 40}
+            assert session.query(MarketFill).count() == 1
+            resting = session.query(MarketOrder).filter_by(status="open").one()
+            assert resting.remaining == 20
+        
+        # Open orders survive a restart
+        restored = MarketExchange(temp_db, economy, ledger)
+        restored.load()
+        assert restored.get_order_book("iron")[SELL] == [(10.0, 20)]
+        assert restored.engine.next_order_id == order.order_id + 1
+        
+        # Holds queued while the ledger loop runs count as spent
+        ledger.is_running = True
+        success, _, bid, _ = restored.place_limit_order(buyer_id, "iron", BUY, 5.0, 100)
+        assert success and ledger.pending(player_account(buyer_id)) == -500
+        success, message, _, _ = restored.place_limit_order(buyer_id, "iron", BUY, 5.0, 30)
+        assert not success and message == "Insufficient gold"
+        ledger.is_running = False
+        ledger.commit()
+        
+        # Cancelling returns the escrow of the remainder
+        assert restored.cancel_order(bid.order_id, buyer_id)
+        restored.flush()
+        with temp_db.get_session() as session:
+            assert session.get(Player, buyer_id).gold == 600.0
+            # Orders persisted before escrow are escrowed on load, or cancelled if unaffordable
+            session.add_all([
+                MarketOrder(id=100, player_id=seller_id, material_type="iron", side=SELL, price=12.0,
+                            quantity=30, remaining=30, sequence=100),
+                MarketOrder(id=101, player_id=seller_id, material_type="iron", side=SELL, price=13.0,
+                            quantity=30, remaining=30, sequence=101)
+            ])
+            session.commit()
+        legacy = MarketExchange(temp_db, economy, ledger)
+        legacy.load()
+        assert legacy.get_order_book("iron")[SELL] == [(10.0, 20), (12.0, 30)]
+        with temp_db.get_session() as session:
+            assert session.get(MarketOrder, 101).status == "cancelled"
+            assert session.query(PlayerMaterial).filter_by(player_id=seller_id).one().quantity == 10
+        # Escrow holds exactly the open orders' remainders
+        assert ledger.balance(ORDER_ESCROW, material_asset("iron")) == pytest.approx(50)
+        assert ledger.balance(ORDER_ESCROW) == pytest.approx(0)
+
 class TestQuestSystem:
     """Test quest system"""
     
@@ -311,6 +1159,329 @@ class TestQuestSystem:
             assert len(quest.title) > 0
             assert len(quest.description) > 0
 
+class TestQuestEligibility:
+    """Test cached eligibility checks and atomic quest acceptance"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def _setup(self, temp_db):
+        with temp_db.get_session() as session:
+            player = Player(telegram_id=1, username="commander", level=3)
+            session.add(player)
+            session.flush()
+            session.add_all([
+                PlayerUnit(player_id=player.id, unit_name="Rifle Squad", unit_type="infantry", subcategory="basic", quantity=6),
+                PlayerUnit(player_id=player.id, unit_name="Marines", unit_type="infantry", subcategory="elite", quantity=6)
+            ])
+            requirements = [
+                {"level": 1}, {"level": 5}, {"level": 1, "units": {"infantry": 12}},
+                {"level": 1, "units": {"infantry": 20}}
+            ] + [{"level": 2}] * 6
+            quests = [Quest(title=f"Quest {i}", description="", quest_type="recon", requirements=r)
+                      for i, r in enumerate(requirements)]
+            quests.append(Quest(title="Retired", description="", quest_type="recon", is_active=False))
+            session.add_all(quests)
+            session.commit()
+            return player.id, [quest.id for quest in quests]
+    
+    def test_batch_evaluation(self, temp_db):
+        """Test one context answers a whole list of quests"""
+        player_id, quest_ids = self._setup(temp_db)
+        eligibility = QuestEligibility(temp_db)
+        results = eligibility.evaluate(player_id, quest_ids)
+        
+        assert results[quest_ids[0]] == (True, "Can accept quest")
+        assert results[quest_ids[1]][1] == "Level too low for this quest"
+        assert results[quest_ids[2]][0]  # unit totals are summed across unit rows
+        assert results[quest_ids[3]][1] == "Not enough infantry units (need 20)"
+        assert results[quest_ids[-1]][1] == "Quest is not available"
+        assert eligibility.evaluate(player_id, [999_999])[999_999][0] is False
+        assert len(eligibility.eligible(player_id, quest_ids)) == 8
+    
+    def test_active_limit_enforced_in_sql(self, temp_db):
+        """Test the limit holds when many acceptances race with stale caches"""
+        from concurrent.futures import ThreadPoolExecutor
+        player_id, quest_ids = self._setup(temp_db)
+        candidates = quest_ids[4:10]
+        
+        engines = [QuestEligibility(temp_db) for _ in candidates]
+        for engine in engines:
+            engine.context(player_id)  # every cache believes no quest is active
+        with ThreadPoolExecutor(max_workers=len(candidates)) as pool:
+            results = list(pool.map(lambda args: args[0].accept(player_id, args[1]), zip(engines, candidates)))
+        
+        assert sum(accepted for accepted, _ in results) == 3
+        with temp_db.get_session() as session:
+            assert session.query(PlayerQuest).filter_by(player_id=player_id, status="active").count() == 3
+        
+        quests = QuestManager()
+        quests.db = temp_db
+        accepted = next(quest_id for quest_id, (ok, _) in zip(candidates, results) if ok)
+        assert quests.can_accept_quest(player_id, accepted) == (False, "You already have this quest")
+        assert quests.fail_quest(player_id, accepted)
+        assert quests.accept_quest(player_id, quest_ids[0])
+
+class TestQuestBoard:
+    """Test personalised quest boards"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_board_filters_and_rotates(self, temp_db):
+        """Test boards only show acceptable quests and stay stable within a rotation"""
+        with temp_db.get_session() as session:
+            player = Player(telegram_id=1, username="commander", level=2)
+            session.add(player)
+            session.flush()
+            quests = [Quest(title=f"Patrol {i}", description="", quest_type="recon", difficulty=2,
+                            requirements={"level": 1}) for i in range(8)]
+            quests += [
+                Quest(title="Armoured push", description="", quest_type="invasion", difficulty=2,
+                      requirements={"level": 1, "units": {"tank": 2}}),
+                Quest(title="Far too hard", description="", quest_type="invasion", difficulty=9,
+                      requirements={"level": 1})
+            ]
+            session.add_all(quests)
+            session.commit()
+            player_id = player.id
+            armoured_id = quests[8].id
+            hard_id = quests[9].id
+        
+        eligibility = QuestEligibility(temp_db)
+        board = QuestBoard(temp_db, eligibility, board_size=5, seed=7)
+        first = [quest.id for quest in board.board(player_id)]
+        assert len(first) == 5
+        assert armoured_id not in first and hard_id not in first
+        assert [quest.id for quest in board.board(player_id)] == first
+        
+        # An accepted quest drops off without redrawing the rest
+        assert eligibility.accept(player_id, first[0])[0]
+        assert [quest.id for quest in board.board(player_id)] == first[1:]
+        
+        # Unit changes invalidate the board so unit-gated quests can appear
+        with temp_db.get_session() as session:
+            session.add(PlayerUnit(player_id=player_id, unit_name="Tiger", unit_type="tank", subcategory="heavy", quantity=3))
+            session.commit()
+        eligibility.invalidate(player_id)
+        board.invalidate(player_id)
+        board.board_size = 9
+        assert armoured_id in [quest.id for quest in board.board(player_id)]
+        
+        epoch = board.epoch
+        board.rotate()
+        assert board.epoch == epoch + 1
+        assert len(board.board(player_id, limit=3)) == 3
+        
+        # Rotations pick up new and retired quests without reloading the rest
+        with temp_db.get_session() as session:
+            session.query(Quest).filter(Quest.id == first[1]).update({Quest.is_active: False})
+            session.add(Quest(title="Supply run", description="", quest_type="escort", difficulty=1,
+                              requirements={"level": 1}))
+            session.commit()
+        kept = board.quests[first[2]]
+        board.rotate()
+        assert board.quests[first[2]] is kept
+        assert first[1] not in board.quests and first[1] not in board.pools[2]
+        assert len(board.pools[1]) == 1
+        
+        # Veterans still see every easier quest, and nothing beyond the window
+        with temp_db.get_session() as session:
+            session.query(Player).filter(Player.id == player_id).update({Player.level: 12})
+            session.commit()
+        eligibility.invalidate(player_id)
+        board.board_size = 20
+        shown = {quest.id for quest in board.board(player_id)}
+        assert len(shown) == 9 and first[1] not in shown and hard_id in shown
+    
+    def test_manager_uses_board(self, temp_db):
+        """Test QuestManager serves and refreshes boards"""
+        with temp_db.get_session() as session:
+            player = Player(telegram_id=2, username="general", level=1, gold=100000)
+            session.add(player)
+            session.commit()
+            player_id = player.id
+        
+        quests = QuestManager()
+        quests.db = temp_db
+        quests.generate_daily_quests()
+        available = quests.get_available_quests(player_id)
+        assert available
+        assert all(quests.can_accept_quest(player_id, quest.id)[0] for quest in available)
+        
+        military = MilitaryManager({"unit_types": {}, "battle_cooldown": 300})
+        military.db, military.ledger = temp_db, Ledger(temp_db)
+        military.on_units_changed = quests.player_changed
+        assert player_id in quests.board._boards
+        assert military.build_units(player_id, "Rifleman", 1)
+        assert player_id not in quests.board._boards
+        
+        # A board drawn at the active-quest limit refills as soon as a quest is finished
+        quests.ledger = Ledger(temp_db)
+        available = quests.get_available_quests(player_id)
+        accepted = [quest.id for quest in available[:3]]
+        assert all(quests.accept_quest(player_id, quest_id) for quest_id in accepted)
+        quests.board.rotate()
+        assert quests.get_available_quests(player_id) == []
+        assert quests.complete_quest(player_id, accepted[0])
+        shown = quests.get_available_quests(player_id)
+        assert shown and all(quests.can_accept_quest(player_id, quest.id)[0] for quest in shown)
+
+class TestQuestTimers:
+    """Test deadline-queue quest expiry"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_deadlines_expire_and_notify(self, temp_db):
+        """Test due quests expire in bulk, finished ones are cancelled and players are told"""
+        with temp_db.get_session() as session:
+            player = Player(telegram_id=42, username="commander", level=5)
+            session.add(player)
+            session.flush()
+            quests = [Quest(title=f"Mission {duration}", description="", quest_type="recon", duration=duration,
+                            rewards={"experience": 10}, requirements={"level": 1})
+                      for duration in (60, 120, 3600)]
+            session.add_all(quests)
+            session.commit()
+            player_id = player.id
+            quest_ids = [quest.id for quest in quests]
+        
+        notifications = []
+        quests = QuestManager()
+        quests.db, quests.ledger = temp_db, Ledger(temp_db)
+        quests.on_notify = notifications.extend
+        for quest_id in quest_ids:
+            assert quests.accept_quest(player_id, quest_id)
+        assert len(quests.timers) == 3
+        
+        assert quests.complete_quest(player_id, quest_ids[0])
+        assert len(quests.timers) == 2
+        assert quests.timers.expire() == 0
+        
+        # A failed batch is put back and reported only once it commits
+        later = datetime.utcnow() + timedelta(seconds=600)
+        expire_batch = quests.timers._expire_batch
+        quests.timers._expire_batch = Mock(side_effect=RuntimeError("database unavailable"))
+        with pytest.raises(RuntimeError):
+            quests.timers.expire(later)
+        assert len(quests.timers) == 2 and len(notifications) == 1
+        quests.timers._expire_batch = expire_batch
+        assert quests.timers.expire(later) == 1
+        assert [(n.telegram_id, n.quest_id, n.status) for n in notifications] == [
+            (42, quest_ids[0], "completed"), (42, quest_ids[1], "expired")]
+        # The expired quest frees its slot in the eligibility cache
+        assert quests.can_accept_quest(player_id, quest_ids[1])[0]
+        
+        with temp_db.get_session() as session:
+            statuses = [pq.status for pq in session.query(PlayerQuest).order_by(PlayerQuest.quest_id)]
+        assert statuses == ["completed", "expired", "active"]
+        
+        # Restart: the queue reloads active quests from the database
+        restarted = QuestManager()
+        restarted.db = temp_db
+        restarted.timers.load()
+        assert len(restarted.timers) == 1
+        assert restarted.timers.next_due() > datetime.utcnow() + timedelta(seconds=3000)
+    
+    def test_queue_scales_to_many_quests(self):
+        """Test scheduling, cancelling and popping hundreds of thousands of deadlines"""
+        timers = QuestTimerQueue(db_manager=None)
+        start = datetime(2026, 1, 1)
+        for i in range(200_000):
+            timers.schedule(i, i % 1000, i % 50, start + timedelta(seconds=i % 7200))
+        for i in range(0, 200_000, 2):
+            timers.cancel(i)
+        assert len(timers) == 100_000
+        assert timers.next_due() == start + timedelta(seconds=1)
+        
+        due = timers.pop_due(start + timedelta(seconds=99))
+        assert len(due) == sum(1 for i in range(1, 200_000, 2) if i % 7200 < 100)
+        assert all(i % 2 and i % 7200 < 100 for i in due)
+        assert len(timers) == 100_000 - len(due)
+        assert timers.next_due() == start + timedelta(seconds=101)
+        assert len(timers.pop_due(start + timedelta(seconds=199), limit=10)) == 10
+
+class TestQuestGeneration:
+    """Test bulk procedural quest generation"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_daily_generation_with_level_variants(self, temp_db):
+        """Test one batch covers every type and level without duplicate titles"""
+        import random
+        quests = QuestManager(rng=random.Random(11))
+        quests.db = temp_db
+        assert quests.generate_daily_quests(per_type=40, levels=[1, 5, 12]) == 5 * 3 * 40
+        assert quests.generate_daily_quests(per_type=40, levels=[1, 5, 12]) == 5 * 3 * 40
+        
+        with temp_db.get_session() as session:
+            rows = session.query(Quest.title, Quest.quest_type, Quest.difficulty, Quest.requirements).all()
+        assert len({(title, quest_type) for title, quest_type, _, _ in rows}) == len(rows) == 1200
+        
+        high = [row for row in rows if row.title.endswith("(Lv 12)")]
+        assert len(high) == 5 * 2 * 40
+        assert all(11 <= row.difficulty <= 13 for row in high)
+        invasions = [row for row in high if row.quest_type == "invasion"]
+        assert all(row.requirements["units"]["infantry"] >= 5 * (row.difficulty - 4) for row in invasions)
+        
+        # Without levels the daily set matches the original level-1 quests
+        assert quests.generate_daily_quests() == 25
+        
+        # The next day retires earlier generated quests but keeps hand-written ones
+        with temp_db.get_session() as session:
+            session.add(Quest(title="Escort Convoy", description="", quest_type="escort",
+                              created_at=datetime.utcnow() - timedelta(days=1)))
+            session.query(Quest).update({Quest.created_at: datetime.utcnow() - timedelta(days=1)})
+            session.commit()
+        assert quests.generate_daily_quests() == 25
+        with temp_db.get_session() as session:
+            active = session.query(Quest.title).filter(Quest.is_active == True).all()
+            assert len(QuestGenerator.load_title_index(session)) == len(active) == 26
+        assert ("Escort Convoy",) in active
+        assert len(quests.board.quests) == 26
+    
+    def test_generation_is_reproducible(self):
+        """Test the same seed yields the same quests"""
+        import numpy as np
+        templates = QuestManager().quest_templates
+        first = QuestGenerator(templates, np.random.default_rng(5)).generate("invasion", 50, level=4)
+        second = QuestGenerator(templates, np.random.default_rng(5)).generate("invasion", 50, level=4)
+        assert len(first) == 50
+        for row in first + second:
+            row.pop("created_at")
+        assert first == second
+        assert all(3 <= row["difficulty"] <= 5 for row in first)
+
 class TestTechnology:
     """Test technology system"""
     
@@ -336,6 +1507,362 @@ class TestTechnology:
                 assert isinstance(technologies, list)
                 assert len(technologies) > 0
 
+class TestTechGraph:
+    """Test the compiled technology graph"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_compiled_graph(self):
+        """Test topological numbering and prerequisite masks"""
+        graph = TechnologyManager().graph
+        for node in graph.nodes:
+            for prerequisite in node.prerequisites:
+                assert graph.node(prerequisite).bit < node.bit
+        
+        nuclear = graph.node("Nuclear Weapons")
+        assert nuclear.prereq_mask == graph.mask_of(["Armored Warfare", "Air Superiority"])
+        researched = graph.mask_of(["Basic Training", "Tactical Warfare", "Armored Warfare"])
+        assert graph.missing_prerequisites(nuclear, researched) == ["Air Superiority"]
+        assert graph.can_research(graph.node("Air Superiority"), researched)
+        assert {node.name for node in graph.nodes_in(graph.available_mask(0))} == {
+            node.name for node in graph.nodes if not node.prerequisites}
+        
+        with pytest.raises(ValueError):
+            TechGraph({"loop": {"tier_1": [
+                {"name": "A", "description": "", "cost": 1, "prerequisites": ["B"], "effects": {}},
+                {"name": "B", "description": "", "cost": 1, "prerequisites": ["A"], "effects": {}}
+            ]}})
+    
+    def test_research_uses_nation_masks(self, temp_db):
+        """Test research stores technology ids and keeps the nation mask current"""
+        with temp_db.get_session() as session:
+            nation = Nation(name="Arcadia", research_points=1000)
+            session.add(nation)
+            session.commit()
+            nation_id = nation.id
+        
+        technology = TechnologyManager()
+        technology.db = temp_db
+        assert len(technology.get_available_technologies(nation_id)) == 6
+        assert technology.can_research_technology(nation_id, "Armored Warfare") == (
+            False, "Prerequisite Basic Training not researched")
+        assert technology.start_research(nation_id, "Basic Training")
+        assert technology.can_research_technology(nation_id, "Basic Training") == (
+            False, "Technology already being researched")
+        
+        technology.update_research_progress(nation_id, research_speed=100)
+        assert technology.researched_mask(nation_id) == technology.graph.node("Basic Training").mask
+        assert "Armored Warfare" in [tech["name"] for tech in technology.get_available_technologies(nation_id)]
+        assert technology.get_technology_effects(nation_id)["military"] == {"infantry_attack": 0.2, "infantry_defense": 0.2}
+        
+        # A fresh manager rebuilds the mask from the stored technology ids
+        restarted = TechnologyManager()
+        restarted.db = temp_db
+        assert restarted.researched_mask(nation_id) == technology.researched_mask(nation_id)
+        with temp_db.get_session() as session:
+            assert session.query(Technology).count() == len(technology.graph)
+
+class TestResearchTick:
+    """Test the batched research tick"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_tick_advances_all_nations(self, temp_db):
+        """Test one tick updates every nation and project in a fixed number of statements"""
+        from sqlalchemy import event
+        with temp_db.get_session() as session:
+            nations = [Nation(name=f"Nation {i}", population=1_000_000, research_points=1000) for i in range(20)]
+            nations.append(Nation(name="Capped", population=1_000_000, research_points=MAX_RESEARCH_POINTS - 10))
+            session.add_all(nations)
+            session.commit()
+            nation_ids = [nation.id for nation in nations]
+        
+        technology = TechnologyManager()
+        technology.db = temp_db
+        for nation_id in nation_ids[:20]:
+            assert technology.start_research(nation_id, "Basic Training")
+            assert technology.start_research(nation_id, "Scientific Method")
+        
+        statements = []
+        event.listen(temp_db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        completed = technology.research.tick(research_speed=50)
+        assert statements and len(statements) <= 4
+        assert completed == []
+        
+        completed = technology.research.tick(research_speed=60)
+        assert len(completed) == 40
+        basic = technology.graph.node("Basic Training")
+        assert all(technology.researched_mask(nation_id) & basic.mask for nation_id in nation_ids[:20])
+        assert technology.in_progress_mask(nation_ids[0]) == 0
+        
+        with temp_db.get_session() as session:
+            points = dict(session.query(Nation.id, Nation.research_points))
+            progress = {p for (p,) in session.query(NationTechnology.research_progress)}
+        assert points[nation_ids[0]] == 1000 - 100 - 150 + 2 * 1000
+        assert points[nation_ids[-1]] == MAX_RESEARCH_POINTS
+        assert progress == {1.0}
+        
+        # The per-nation API rides on the same engine without generating points
+        assert technology.start_research(nation_ids[0], "Armored Warfare")
+        technology.update_research_progress(nation_ids[0], research_speed=100)
+        assert technology.researched_mask(nation_ids[0]) & technology.graph.node("Armored Warfare").mask
+        with temp_db.get_session() as session:
+            assert session.query(Nation.research_points).filter_by(id=nation_ids[0]).scalar() == 2450
+
+class TestNationModifiers:
+    """Test the per-nation technology effect cache"""
+    
+    @pytest.fixture
+    def temp_db(self):
+        """Create temporary database for testing"""
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            db_url = f"sqlite:///{tmp.name}"
+            db_manager = DatabaseManager(db_url)
+            db_manager.create_tables()
+            yield db_manager
+            os.unlink(tmp.name)
+    
+    def test_modifiers_follow_research(self, temp_db):
+        """Test rows are built from researched masks and updated as research completes"""
+        with temp_db.get_session() as session:
+            nation = Nation(name="Arcadia", research_points=5000, gdp=1_000_000)
+            session.add(nation)
+            session.flush()
+            player = Player(telegram_id=1, username="commander", nation_id=nation.id, level=1, morale=100.0)
+            province = Province(name="Heartland", x=0, y=0, owner_id=nation.id)
+            session.add_all([player, province])
+            session.commit()
+            nation_id, player_id, province_id = nation.id, player.id, province.id
+        
+        technology = TechnologyManager()
+        technology.db = temp_db
+        modifiers = technology.modifiers
+        assert modifiers.value(nation_id, "all_production") == 1.0
+        assert modifiers.value(None, "research_speed") == 1.0
+        
+        income = DailyIncomeManager(temp_db, {"daily_income_base": 1000, "tax_rate": 0.0, "inflation_rate": 0.0},
+                                    Ledger(temp_db), modifiers)
+        military = MilitaryManager({"unit_types": {}, "battle_cooldown": 300})
+        military.modifiers = modifiers
+        provinces = ProvinceManager()
+        provinces.db = temp_db
+        provinces.modifiers = modifiers
+        
+        with temp_db.get_session() as session:
+            base_income = income.calculate_daily_income(session.get(Player, player_id))
+        base_power = military.calculate_combat_power({"Rifleman": 10}, nation_id=nation_id)
+        base_iron = provinces.get_province_production(province_id)["iron"]
+        
+        for name in ("Basic Training", "Steel Production", "Scientific Method"):
+            assert technology.start_research(nation_id, name)
+        technology.research.tick(research_speed=100, generate_points=False)
+        assert technology.start_research(nation_id, "Industrial Revolution")
+        technology.update_research_progress(nation_id, research_speed=100)
+        
+        assert modifiers.value(nation_id, "all_production") == pytest.approx(1.5)
+        assert modifiers.value(nation_id, "infantry_attack") == pytest.approx(1.2)
+        with temp_db.get_session() as session:
+            boosted_income = income.calculate_daily_income(session.get(Player, player_id))
+        assert boosted_income - base_income == pytest.approx(1_000_000 * 0.001 * 0.5)
+        assert military.calculate_combat_power({"Rifleman": 10}, nation_id=nation_id) == pytest.approx(base_power * 1.2)
+        assert military.calculate_combat_power({"Rifleman": 10}) == pytest.approx(base_power)
+        assert provinces.get_province_production(province_id)["iron"] == pytest.approx(base_iron * 1.3 * 1.5)
+        
+        # A restart rebuilds the same row in bulk, and research speed feeds the tick
+        restarted = TechnologyManager()
+        restarted.db = temp_db
+        restarted.load_research_state()
+        assert list(restarted.modifiers.vector(nation_id)) == list(modifiers.vector(nation_id))
+        assert restarted.research_speeds() == {nation_id: pytest.approx(1.25)}
+        assert restarted.start_research(nation_id, "Laboratory Equipment")
+        restarted.research.tick(speeds=restarted.research_speeds())
+        with temp_db.get_session() as session:
+            progress = session.query(NationTechnology.research_progress).filter(
+                NationTechnology.completed_at.is_(None)).scalar()
+        assert progress == pytest.approx(0.0125)
+
+class TestQuizSampler:
+    """Test indexed quiz question sampling"""
+    
+    def test_buckets_match_filters(self):
+        """Test every bucket holds exactly the questions matching its filters"""
+        quiz_db = MilitaryQuizDatabase()
+        sampler = quiz_db.sampler
+        assert len(sampler.bucket()) == len(quiz_db.questions)
+        for difficulty in DifficultyLevel:
+            for category in [None] + list(QuestionCategory):
+                expected = {q.question_id for q in quiz_db.questions.values()
+                            if q.difficulty == difficulty and category in (None, q.category)}
+                assert {sampler.questions[o].question_id for o in sampler.bucket(difficulty, category)} == expected
+        
+        questions = quiz_db.get_random_questions(5, DifficultyLevel.EASY)
+        assert len({q.question_id for q in questions}) == 5
+        assert all(q.difficulty == DifficultyLevel.EASY for q in questions)
+        assert quiz_db.get_random_questions(5, DifficultyLevel.EASY, QuestionCategory.NUCLEAR) == []
+    
+    def test_no_repeats_per_user(self):
+        """Test users see every question in a bucket before any repeats"""
+        import random
+        quiz_db = MilitaryQuizDatabase()
+        sampler = QuestionSampler(quiz_db.questions, random.Random(1))
+        easy = len(sampler.bucket(DifficultyLevel.EASY))
+        
+        served = []
+        for _ in range(easy // 3):
+            served.extend(q.question_id for q in sampler.sample(3, DifficultyLevel.EASY, user_id=7))
+        assert len(set(served)) == len(served)
+        
+        # The rest of the bucket comes first, then it starts over without duplicates in the draw
+        remaining = easy - len(served)
+        nxt = [q.question_id for q in sampler.sample(remaining + 2, DifficultyLevel.EASY, user_id=7)]
+        assert len(set(nxt)) == len(nxt) == remaining + 2
+        easy_ids = {sampler.questions[i].question_id for i in sampler.bucket(DifficultyLevel.EASY)}
+        assert set(nxt[:remaining]) | set(served) == easy_ids
+        # Other users and other buckets are unaffected
+        assert len(sampler.sample(easy, DifficultyLevel.EASY, user_id=8)) == easy
+        assert len(sampler.seen[7]) == (len(quiz_db.questions) + 7) // 8
+
+class TestQuizResults:
+    """Test the persistent quiz results store"""
+    
+    @staticmethod
+    def _play(quiz, user_id, correct):
+        """Run a five question quiz answering the first `correct` questions right"""
+        session_id = quiz.start_quiz(user_id, DifficultyLevel.EASY, question_count=5)
+        questions = quiz.active_sessions[session_id].questions
+        for i, question in enumerate(questions):
+            answer = question.correct_answer if i < correct else (question.correct_answer + 1) % len(question.options)
+            response = quiz.answer_question(session_id, answer, 5.0)
+        return response["result"]
+    
+    def test_stats_and_replay(self):
+        """Test stats are running totals and survive a restart through the log"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "quiz_results.jsonl")
+            quiz = MilitaryQuizSystem(None, QuizResultStore(path, recent=2))
+            assert quiz.get_user_stats(1)["total_quizzes"] == 0
+            results = [self._play(quiz, 1, correct) for correct in (5, 2, 4)] + [self._play(quiz, 2, 1)]
+            
+            stats = quiz.get_user_stats(1)
+            mine = results[:3]
+            assert stats == {
+                "total_quizzes": 3,
+                "total_score": sum(r.score for r in mine),
+                "average_accuracy": pytest.approx(sum(r.accuracy for r in mine) / 3),
+                "best_rank": max(mine, key=lambda r: r.score).rank,
+                "total_knowledge": sum(r.knowledge_gained for r in mine),
+                "longest_streak": 5
+            }
+            # Memory keeps only the most recent results
+            assert len(quiz.results.log) == 2
+            assert [r.session_id for r in quiz.results.recent(user_id=1)] == [results[2].session_id]
+            
+            with open(path) as f:
+                assert len(f.readlines()) == 4
+            restarted = MilitaryQuizSystem(None, QuizResultStore(path))
+            assert restarted.get_user_stats(1) == stats
+            assert restarted.results.recent(1)[0] == results[-1]
+        
+        # Results are persisted by default, next to the code rather than the working directory
+        assert MilitaryQuizSystem(None).results.path == os.path.join(DATA_DIR, DEFAULT_RESULTS_FILE)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = QuizResultStore("results.jsonl", data_dir=tmp)
+            assert store.path == os.path.join(tmp, "results.jsonl")
+            store.log.append(results[0])
+            store.log.spill()
+            handle = store.log._file
+            store.log.append(results[1])
+            store.log.spill()
+            # One append handle is kept between flushes and closed at shutdown
+            assert store.log._file is handle
+            store.close()
+            assert handle.closed and store.log._file is None
+            with open(store.path) as f:
+                assert len(f.readlines()) == 2
+
+class TestQuizLeaderboard:
+    """Test the bounded quiz leaderboards"""
+    
+    @staticmethod
+    def _result(user_id, score, timestamp=datetime(2024, 1, 3, 12), category=None):
+        return SimpleNamespace(user_id=user_id, score=score, accuracy=80.0, rank="Expert",
+                               category=category, timestamp=timestamp)
+    
+    def test_top_k_with_user_dedup(self):
+        """Test the board keeps each user's best score and matches a full sort"""
+        import random
+        rng = random.Random(7)
+        board = Leaderboard(10)
+        best = {}
+        for _ in range(2000):
+            user_id, score = rng.randrange(50), rng.randrange(1000)
+            board.add(self._result(user_id, score))
+            best[user_id] = max(best.get(user_id, -1), score)
+        
+        top = board.top()
+        assert len(top) == 10 and len({entry["user_id"] for entry in top}) == 10
+        assert [entry["score"] for entry in top] == sorted(best.values(), reverse=True)[:10]
+        assert all(best[entry["user_id"]] == entry["score"] for entry in top)
+        assert len(board._heap) <= 20
+        assert board.top(3) == top[:3]
+        # A lower score from a listed user changes nothing
+        assert not board.add(self._result(top[0]["user_id"], 0))
+    
+    def test_windowed_boards(self):
+        """Test daily and weekly boards roll over on newer results"""
+        boards = QuizLeaderboards(overall_size=3, category_size=2)
+        wednesday = datetime(2024, 1, 3, 12)
+        boards.add(self._result(1, 500, wednesday, QuestionCategory.WEAPONS))
+        boards.add(self._result(2, 300, wednesday + timedelta(days=1)))
+        
+        thursday = wednesday + timedelta(days=1)
+        assert [e["user_id"] for e in boards.top("overall", period="daily", now=thursday)] == [2]
+        assert [e["user_id"] for e in boards.top("overall", period="weekly", now=thursday)] == [1, 2]
+        assert [e["user_id"] for e in boards.top("overall")] == [1, 2]
+        assert boards.top(f"category_{QuestionCategory.WEAPONS.value}", period="daily", now=thursday) == []
+        
+        # A stale result cannot land on the current daily board
+        boards.add(self._result(3, 900, wednesday))
+        assert [e["user_id"] for e in boards.top("overall", period="daily", now=thursday)] == [2]
+        assert [e["user_id"] for e in boards.top("overall", period="weekly", now=thursday)] == [3, 1, 2]
+        
+        next_monday = datetime(2024, 1, 8, 9)
+        assert boards.top("overall", period="weekly", now=next_monday) == []
+        boards.add(self._result(4, 10, next_monday))
+        assert [e["user_id"] for e in boards.top("overall", period="weekly", now=next_monday)] == [4]
+        assert len(boards.top("overall")) == 3
+        with pytest.raises(ValueError):
+            boards.top("overall", period="monthly")
+    
+    def test_quiz_system_leaderboard(self):
+        """Test completed quizzes reach the quiz system leaderboards once per user"""
+        quiz = MilitaryQuizSystem(None, QuizResultStore())
+        for correct in (1, 5, 3):
+            TestQuizResults._play(quiz, 1, correct)
+        TestQuizResults._play(quiz, 2, 2)
+        
+        board = quiz.get_leaderboard(limit=10)
+        assert [entry["user_id"] for entry in board] == sorted((1, 2), key=lambda u: -quiz.results.stats[u].best_score)
+        assert board[0]["score"] == max(stats.best_score for stats in quiz.results.stats.values())
+        assert set(board[0]) == {"user_id", "score", "accuracy", "rank", "timestamp"}
+        assert quiz.get_leaderboard(period="daily") == board
+
 class TestUI:
     """Test UI system"""
     
@@ -410,6 +1937,7 @@ class TestIntegration:
             }
             military = MilitaryManager(config)
             military.db = temp_db
+            military.ledger = Ledger(temp_db)
             
             # Build units
             success = military.build_units(player.id, "Rifleman", 5)
@@ -436,9 +1964,23 @@ def run_tests():
     test_assets.test_get_assets_by_category()
     test_assets.test_get_assets_by_tier()
     test_assets.test_search_assets()
+    test_assets.test_indexed_queries()
     test_assets.test_asset_properties()
     print("✅ Military assets tests passed")
     
+    # Test catalogue cache
+    print("Testing catalogue cache...")
+    test_catalogue = TestCatalogueCache()
+    test_catalogue.test_catalogue_built_once_and_cached()
+    test_catalogue.test_catalogue_instances_share_data()
+    test_catalogue.test_compact_records()
+    print("✅ Catalogue cache tests passed")
+    
+    # Test resource planner
+    print("Testing resource planner...")
+    TestResourcePlanner().test_batch_queries_match_single_asset_checks()
+    print("✅ Resource planner tests passed")
+    
     # Test database
     print("Testing database...")
     test_db = TestDatabase()
@@ -460,6 +2002,91 @@ def run_tests():
     test_economy.test_trade_cost_calculation()
     print("✅ Economy tests passed")
     
+    # Test price engine
+    print("Testing price engine...")
+    test_engine = TestPriceEngine()
+    test_engine.test_shared_engine()
+    test_engine.test_order_flow_buffer()
+    test_engine.test_events_indexed_by_resource()
+    print("✅ Price engine tests passed")
+    
+    # Test resource ledger
+    print("Testing resource ledger...")
+    test_ledger = TestResourceLedger()
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        test_ledger.test_balances_survive_restart(temp_db)
+        os.unlink(tmp.name)
+    test_ledger.test_storage_capacity()
+    print("✅ Resource ledger tests passed")
+    
+    # Test simulation
+    print("Testing simulation...")
+    test_simulation = TestSimulation()
+    test_simulation.test_subsystem_streams()
+    test_simulation.test_reproducible_runs()
+    print("✅ Simulation tests passed")
+    
+    # Test price history
+    print("Testing price history...")
+    test_history = TestPriceHistory()
+    test_history.test_ring_buffer_keeps_latest_ticks()
+    test_history.test_ohlc_rollups()
+    test_history.test_persistence()
+    print("✅ Price history tests passed")
+    
+    # Test market analysis
+    print("Testing market analysis...")
+    test_analysis = TestMarketAnalysis()
+    test_analysis.test_indicators()
+    test_analysis.test_cached_per_tick()
+    print("✅ Market analysis tests passed")
+    
+    # Test market listings
+    print("Testing market listings...")
+    test_listings = TestMarketListings()
+    for test in (test_listings.test_keyset_pagination, test_listings.test_cache_invalidation):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Market listings tests passed")
+    
+    # Test trade expiry
+    print("Testing trade expiry...")
+    test_expiry = TestTradeExpiry()
+    for test in (test_expiry.test_sweep_expires_due_trades, test_expiry.test_loop_wakes_for_new_trades):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Trade expiry tests passed")
+    
+    # Test trade settlement
+    print("Testing trade settlement...")
+    test_settlement = TestTradeSettlement()
+    for test in (test_settlement.test_escrow_and_batch_settlement, test_settlement.test_concurrent_buyers):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Trade settlement tests passed")
+    
+    # Test ledger
+    print("Testing ledger...")
+    test_double_entry = TestLedger()
+    for test in (test_double_entry.test_movements_are_audited, test_double_entry.test_batched_commits):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Ledger tests passed")
+    
     # Test military
     print("Testing military...")
     test_military = TestMilitary()
@@ -468,6 +2095,25 @@ def run_tests():
     test_military.test_combat_power_calculation()
     print("✅ Military tests passed")
     
+    # Test battle log
+    print("Testing battle log...")
+    test_battle_log = TestBattleLog()
+    test_battle_log.test_replay_round_trip()
+    test_battle_log.test_lazy_replay_decodes_on_demand()
+    print("✅ Battle log tests passed")
+    
+    # Test order book
+    print("Testing order book...")
+    test_order_book = TestOrderBook()
+    test_order_book.test_price_time_priority()
+    test_order_book.test_market_orders_and_cancellation()
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        test_order_book.test_batched_settlement(temp_db)
+        os.unlink(tmp.name)
+    print("✅ Order book tests passed")
+    
     # Test quest system
     print("Testing quest system...")
     test_quest = TestQuestSystem()
@@ -475,6 +2121,50 @@ def run_tests():
     test_quest.test_quest_generation()
     print("✅ Quest system tests passed")
     
+    # Test quest eligibility
+    print("Testing quest eligibility...")
+    test_eligibility = TestQuestEligibility()
+    for test in (test_eligibility.test_batch_evaluation, test_eligibility.test_active_limit_enforced_in_sql):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Quest eligibility tests passed")
+    
+    # Test quest board
+    print("Testing quest board...")
+    test_board = TestQuestBoard()
+    for test in (test_board.test_board_filters_and_rotates, test_board.test_manager_uses_board):
+        with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+            temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+            temp_db.create_tables()
+            test(temp_db)
+            os.unlink(tmp.name)
+    print("✅ Quest board tests passed")
+    
+    # Test quest timers
+    print("Testing quest timers...")
+    test_timers = TestQuestTimers()
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        test_timers.test_deadlines_expire_and_notify(temp_db)
+        os.unlink(tmp.name)
+    test_timers.test_queue_scales_to_many_quests()
+    print("✅ Quest timers tests passed")
+    
+    # Test quest generation
+    print("Testing quest generation...")
+    test_generation = TestQuestGeneration()
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        test_generation.test_daily_generation_with_level_variants(temp_db)
+        os.unlink(tmp.name)
+    test_generation.test_generation_is_reproducible()
+    print("✅ Quest generation tests passed")
+    
     # Test technology
     print("Testing technology...")
     test_tech = TestTechnology()
@@ -482,6 +2172,54 @@ def run_tests():
     test_tech.test_technology_tree_structure()
     print("✅ Technology tests passed")
     
+    # Test technology graph
+    print("Testing technology graph...")
+    test_graph = TestTechGraph()
+    test_graph.test_compiled_graph()
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        test_graph.test_research_uses_nation_masks(temp_db)
+        os.unlink(tmp.name)
+    print("✅ Technology graph tests passed")
+    
+    # Test research tick
+    print("Testing research tick...")
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        TestResearchTick().test_tick_advances_all_nations(temp_db)
+        os.unlink(tmp.name)
+    print("✅ Research tick tests passed")
+    
+    # Test nation modifiers
+    print("Testing nation modifiers...")
+    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as tmp:
+        temp_db = DatabaseManager(f"sqlite:///{tmp.name}")
+        temp_db.create_tables()
+        TestNationModifiers().test_modifiers_follow_research(temp_db)
+        os.unlink(tmp.name)
+    print("✅ Nation modifiers tests passed")
+    
+    # Test quiz sampler
+    print("Testing quiz sampler...")
+    test_sampler = TestQuizSampler()
+    test_sampler.test_buckets_match_filters()
+    test_sampler.test_no_repeats_per_user()
+    print("✅ Quiz sampler tests passed")
+    
+    # Test quiz results
+    print("Testing quiz results...")
+    TestQuizResults().test_stats_and_replay()
+    print("✅ Quiz results tests passed")
+    
+    # Test quiz leaderboard
+    print("Testing quiz leaderboard...")
+    TestQuizLeaderboard().test_top_k_with_user_dedup()
+    TestQuizLeaderboard().test_windowed_boards()
+    TestQuizLeaderboard().test_quiz_system_leaderboard()
+    print("✅ Quiz leaderboard tests passed")
+    
     # Test UI
     print("Testing UI...")
     test_ui = TestUI()
@@ -225,6 +225,7 @@ def test_integration():
     print("Testing integration...")
     
     from database import DatabaseManager, Player, PlayerUnit
+    from ledger import Ledger
     from military import MilitaryManager
     import tempfile
     
@@ -255,6 +256,7 @@ def test_integration():
             }
             military = MilitaryManager(config)
             military.db = db_manager
+            military.ledger = Ledger(db_manager)
             
             # Test building units
             success = military.build_units(player.id, "Rifleman", 5)
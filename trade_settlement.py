@@ -0,0 +1,227 @@
+"""
+Trade Settlement for World War Telegram Bot
+Escrows listed materials and settles trades atomically under row locks
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+
+from database import DatabaseManager, Player, PlayerMaterial, Trade
+from ledger import GOLD, TRADE_ESCROW, Entry, Ledger, material_asset, player_account, require_ledger, transfer
+
+@contextmanager
+def locked_transaction(db: DatabaseManager):
+    """Session whose transaction may take row locks.
+
+    SQLite has no SELECT ... FOR UPDATE, so the database write lock is taken up front
+    with BEGIN IMMEDIATE instead; other backends lock the rows queried with_for_update().
+    """
+    session = db.get_session()
+    try:
+        if session.get_bind().dialect.name == "sqlite":
+            session.execute(text("BEGIN IMMEDIATE"))
+        yield session
+    finally:
+        session.close()
+
+class TradeSettlement:
+    """Escrow and settlement of player trades.
+
+    Locks are always taken in the same order (trades by id, then players by id, then
+    materials by player and type) so concurrent settlements cannot deadlock.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, economy_manager, ledger: Ledger,
+                 on_change: Optional[Callable[[str], None]] = None):
+        self.db = db_manager
+        self.economy = economy_manager
+        # Called with the material of every listing created, settled or cancelled
+        self.on_change = on_change
+        self.ledger = require_ledger(ledger, "TradeSettlement")
+
+    def escrow_listing(self, seller_id: int, material: str, quantity: float, price_per_unit: float,
+                       buyer_id: Optional[int] = None, duration: timedelta = timedelta(hours=24)) -> Optional[Trade]:
+        """Move the seller's materials into escrow and open a trade; None if they lack them"""
+        with locked_transaction(self.db) as session:
+            seller_material = session.query(PlayerMaterial).filter_by(
+                player_id=seller_id, material_type=material
+            ).with_for_update().first()
+            if quantity <= 0 or not seller_material or seller_material.quantity < quantity:
+                return None
+
+            seller_material.quantity -= quantity
+            seller_material.last_updated = datetime.utcnow()
+            trade = Trade(
+                seller_id=seller_id,
+                buyer_id=buyer_id,
+                material_type=material,
+                quantity=quantity,
+                escrow_quantity=quantity,
+                price_per_unit=price_per_unit,
+                total_price=price_per_unit * quantity,
+                expires_at=datetime.utcnow() + duration
+            )
+            session.add(trade)
+            session.flush()
+            self.ledger.record(session, [transfer(player_account(seller_id), TRADE_ESCROW, material_asset(material),
+                                                  quantity, "trade_escrow", f"trade:{trade.id}")])
+            session.commit()
+            session.refresh(trade)
+
+        self._changed(material)
+        return trade
+
+    def settle(self, trade_id: int, buyer_id: int) -> bool:
+        """Settle a single trade"""
+        return self.settle_batch([(trade_id, buyer_id)])[0]
+
+    def settle_batch(self, fills: Iterable[Tuple[int, int]]) -> List[bool]:
+        """Settle (trade_id, buyer_id) fills in one transaction; returns success per fill"""
+        fills = list(fills)
+        if not fills:
+            return []
+
+        settled: List[Tuple[str, float]] = []
+        entries: List[Entry] = []
+        results = []
+        with locked_transaction(self.db) as session:
+            trade_ids = sorted({trade_id for trade_id, _ in fills})
+            trades = {
+                trade.id: trade for trade in session.query(Trade).filter(
+                    Trade.id.in_(trade_ids)
+                ).order_by(Trade.id).with_for_update()
+            }
+
+            player_ids = sorted({buyer_id for _, buyer_id in fills} |
+                                {trade.seller_id for trade in trades.values()})
+            players = {
+                player.id: player for player in session.query(Player).filter(
+                    Player.id.in_(player_ids)
+                ).order_by(Player.id).with_for_update()
+            }
+
+            material_types = sorted({trade.material_type for trade in trades.values()})
+            materials: Dict[Tuple[int, str], PlayerMaterial] = {
+                (material.player_id, material.material_type): material
+                for material in session.query(PlayerMaterial).filter(
+                    PlayerMaterial.player_id.in_(player_ids),
+                    PlayerMaterial.material_type.in_(material_types)
+                ).order_by(PlayerMaterial.player_id, PlayerMaterial.material_type).with_for_update()
+            }
+
+            now = datetime.utcnow()
+            for trade_id, buyer_id in fills:
+                trade = trades.get(trade_id)
+                buyer = players.get(buyer_id)
+                seller = players.get(trade.seller_id) if trade else None
+                if not trade or trade.status != "open" or not buyer or not seller:
+                    results.append(False)
+                    continue
+                if trade.buyer_id is not None and trade.buyer_id != buyer_id:
+                    results.append(False)
+                    continue
+                # Counting ledger entries not yet committed
+                if buyer.gold + self.ledger.pending(player_account(buyer.id)) < trade.total_price:
+                    results.append(False)
+                    continue
+
+                # Listings created before escrow still take materials from the seller's stock
+                from_stock = trade.quantity - (trade.escrow_quantity or 0.0)
+                if from_stock > 0:
+                    seller_material = materials.get((seller.id, trade.material_type))
+                    pending = self.ledger.pending(player_account(seller.id), material_asset(trade.material_type))
+                    if not seller_material or seller_material.quantity + pending < from_stock:
+                        results.append(False)
+                        continue
+                    seller_material.quantity -= from_stock
+                    seller_material.last_updated = now
+
+                buyer_material = materials.get((buyer.id, trade.material_type))
+                if buyer_material is None:
+                    buyer_material = PlayerMaterial(player_id=buyer.id, material_type=trade.material_type,
+                                                    quantity=0.0)
+                    session.add(buyer_material)
+                    materials[(buyer.id, trade.material_type)] = buyer_material
+                buyer_material.quantity += trade.quantity
+                buyer_material.last_updated = now
+
+                buyer.gold -= trade.total_price
+                seller.gold += trade.total_price
+                reference = f"trade:{trade.id}"
+                asset = material_asset(trade.material_type)
+                entries.append(transfer(player_account(buyer.id), player_account(seller.id), GOLD,
+                                        trade.total_price, "trade", reference))
+                if trade.escrow_quantity:
+                    entries.append(transfer(TRADE_ESCROW, player_account(buyer.id), asset,
+                                            trade.escrow_quantity, "trade", reference))
+                if from_stock > 0:
+                    entries.append(transfer(player_account(seller.id), player_account(buyer.id), asset,
+                                            from_stock, "trade", reference))
+                trade.buyer_id = buyer_id
+                trade.escrow_quantity = 0.0
+                trade.status = "completed"
+                trade.completed_at = now
+                settled.append((trade.material_type, trade.quantity))
+                results.append(True)
+
+            self.ledger.record(session, entries)
+            session.commit()
+
+        for material, quantity in settled:
+            self.economy.apply_market_impact(material, quantity, "buy")
+        for material in {material for material, _ in settled}:
+            self._changed(material)
+        return results
+
+    def cancel_listing(self, trade_id: int, seller_id: int) -> bool:
+        """Cancel an open trade (only by seller) and return its escrow"""
+        with locked_transaction(self.db) as session:
+            trade = session.query(Trade).filter_by(id=trade_id).with_for_update().first()
+            if not trade or trade.seller_id != seller_id or trade.status != "open":
+                return False
+
+            trade.status = "cancelled"
+            self.release_escrow(session, [(trade.seller_id, trade.material_type, trade.escrow_quantity or 0.0)])
+            trade.escrow_quantity = 0.0
+            material = trade.material_type
+            session.commit()
+
+        self._changed(material)
+        return True
+
+    def release_escrow(self, session, escrows: Iterable[Tuple[int, str, float]]):
+        """Return (seller_id, material, quantity) escrows to sellers within the caller's transaction"""
+        totals: Dict[Tuple[int, str], float] = {}
+        for seller_id, material, quantity in escrows:
+            if quantity:
+                totals[(seller_id, material)] = totals.get((seller_id, material), 0.0) + quantity
+        if not totals:
+            return
+
+        keys = sorted(totals)
+        existing = {
+            (material.player_id, material.material_type): material
+            for material in session.query(PlayerMaterial).filter(
+                tuple_(PlayerMaterial.player_id, PlayerMaterial.material_type).in_(keys)
+            ).order_by(PlayerMaterial.player_id, PlayerMaterial.material_type).with_for_update()
+        }
+        self.ledger.record(session, [
+            transfer(TRADE_ESCROW, player_account(seller_id), material_asset(material), totals[(seller_id, material)],
+                     "trade_escrow_release")
+            for seller_id, material in keys
+        ])
+        now = datetime.utcnow()
+        for key in keys:
+            material = existing.get(key)
+            if material is None:
+                session.add(PlayerMaterial(player_id=key[0], material_type=key[1],
+                                           quantity=totals[key], last_updated=now))
+            else:
+                material.quantity += totals[key]
+                material.last_updated = now
+
+    def _changed(self, material: str):
+        if self.on_change:
+            self.on_change(material)
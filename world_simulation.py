@@ -1,6 +1,7 @@
 """
 World Simulation System for World War Telegram Bot
 """
+import asyncio
 import random
 import json
 from datetime import datetime, timedelta
@@ -8,8 +9,9 @@ from typing import Dict, List, Optional, Tuple
 from database import DatabaseManager, WorldEvent, Province, Nation, Player
 
 class WorldSimulator:
-    def __init__(self, config: Dict):
+    def __init__(self, config: Dict, rng: Optional[random.Random] = None):
         self.config = config
+        self.rng = rng or random.Random()
         self.world_events_interval = config["world_events_interval"]
         self.season_duration = config["season_duration"]
         self.ai_factions = config["ai_factions"]
@@ -117,18 +119,7 @@ class WorldSimulator:
         
         while self.is_running:
             try:
-                # Generate world events
-                if random.random() < 0.1:  # 10% chance per cycle
-                    await self.generate_world_event()
-                
-                # Update weather
-                await self.update_weather()
-                
-                # Process AI factions
-                await self.process_ai_factions()
-                
-                # Update world state
-                await self.update_world_state()
+                await self.tick()
                 
                 # Wait before next cycle
                 await asyncio.sleep(3600)  # 1 hour
@@ -137,22 +128,37 @@ class WorldSimulator:
                 print(f"Error in world simulation: {e}")
                 await asyncio.sleep(300)  # Wait 5 minutes before retrying
     
+    async def tick(self):
+        """Run one simulation cycle (one hour of game time)"""
+        # Generate world events
+        if self.rng.random() < 0.1:  # 10% chance per cycle
+            await self.generate_world_event()
+        
+        # Update weather
+        await self.update_weather()
+        
+        # Process AI factions
+        await self.process_ai_factions()
+        
+        # Update world state
+        await self.update_world_state()
+    
     def stop(self):
         """Stop the simulation"""
         self.is_running = False
     
     async def generate_world_event(self):
         """Generate a random world event"""
-        event_type = random.choice(list(self.event_types.keys()))
+        event_type = self.rng.choice(list(self.event_types.keys()))
         event_data = self.event_types[event_type]
         
-        name = random.choice(event_data["names"])
-        description = random.choice(event_data["descriptions"])
+        name = self.rng.choice(event_data["names"])
+        description = self.rng.choice(event_data["descriptions"])
         
         # Generate effects
         effects = {}
         for effect_name, (min_val, max_val) in event_data["effects"].items():
-            effects[effect_name] = random.uniform(min_val, max_val)
+            effects[effect_name] = self.rng.uniform(min_val, max_val)
         
         # Determine affected regions
         affected_regions = self._get_random_regions(3)  # Affect 3 random regions
@@ -163,10 +169,10 @@ class WorldSimulator:
                 title=name,
                 description=description,
                 event_type=event_type,
-                severity=random.choice(["low", "medium", "high", "critical"]),
+                severity=self.rng.choice(["low", "medium", "high", "critical"]),
                 effects=effects,
                 affected_regions=affected_regions,
-                duration=random.randint(3600, 86400)  # 1 hour to 1 day
+                duration=self.rng.randint(3600, 86400)  # 1 hour to 1 day
             )
             session.add(event)
             session.commit()
@@ -176,7 +182,7 @@ class WorldSimulator:
         with self.db.get_session() as session:
             provinces = session.query(Province).all()
             region_ids = [p.id for p in provinces]
-            return random.sample(region_ids, min(count, len(region_ids)))
+            return self.rng.sample(region_ids, min(count, len(region_ids)))
     
     async def update_weather(self):
         """Update weather for all provinces"""
@@ -185,24 +191,24 @@ class WorldSimulator:
             
             for province in provinces:
                 # Random weather change
-                if random.random() < 0.05:  # 5% chance to change weather
-                    province.weather = random.choice([
+                if self.rng.random() < 0.05:  # 5% chance to change weather
+                    province.weather = self.rng.choice([
                         "clear", "rain", "storm", "fog", "snow", "cloudy"
                     ])
                     
                     # Update temperature based on weather
                     if province.weather == "snow":
-                        province.temperature = random.uniform(-10, 5)
+                        province.temperature = self.rng.uniform(-10, 5)
                     elif province.weather == "storm":
-                        province.temperature = random.uniform(5, 15)
+                        province.temperature = self.rng.uniform(5, 15)
                     elif province.weather == "rain":
-                        province.temperature = random.uniform(10, 20)
+                        province.temperature = self.rng.uniform(10, 20)
                     elif province.weather == "fog":
-                        province.temperature = random.uniform(5, 15)
+                        province.temperature = self.rng.uniform(5, 15)
                     elif province.weather == "cloudy":
-                        province.temperature = random.uniform(10, 25)
+                        province.temperature = self.rng.uniform(10, 25)
                     else:  # clear
-                        province.temperature = random.uniform(15, 30)
+                        province.temperature = self.rng.uniform(15, 30)
             
             session.commit()
     
@@ -213,7 +219,7 @@ class WorldSimulator:
             
             for nation in ai_nations:
                 # Random AI actions
-                action = random.choice([
+                action = self.rng.choice([
                     "expand", "research", "build", "attack", "diplomacy"
                 ])
                 
@@ -234,8 +240,8 @@ class WorldSimulator:
         with self.db.get_session() as session:
             unclaimed = session.query(Province).filter(Province.owner_id.is_(None)).all()
             
-            if unclaimed and random.random() < 0.3:  # 30% chance to expand
-                province = random.choice(unclaimed)
+            if unclaimed and self.rng.random() < 0.3:  # 30% chance to expand
+                province = self.rng.choice(unclaimed)
                 province.owner_id = nation.id
                 province.morale = 100.0
                 session.commit()
@@ -244,7 +250,7 @@ class WorldSimulator:
         """AI research logic"""
         # Simple AI research - just add research points
         with self.db.get_session() as session:
-            nation.research_points += random.randint(10, 50)
+            nation.research_points += self.rng.randint(10, 50)
             session.commit()
     
     async def _ai_build(self, nation: Nation):
@@ -253,10 +259,10 @@ class WorldSimulator:
         with self.db.get_session() as session:
             provinces = session.query(Province).filter(Province.owner_id == nation.id).all()
             
-            if provinces and random.random() < 0.2:  # 20% chance to build
-                province = random.choice(provinces)
+            if provinces and self.rng.random() < 0.2:  # 20% chance to build
+                province = self.rng.choice(provinces)
                 building_types = ["factory", "farm", "mine", "refinery"]
-                building = random.choice(building_types)
+                building = self.rng.choice(building_types)
                 
                 buildings = province.buildings or []
                 if building not in buildings:
@@ -273,8 +279,8 @@ class WorldSimulator:
                 Nation.is_ai == False  # Attack player nations
             ).all()
             
-            if other_nations and random.random() < 0.1:  # 10% chance to attack
-                target = random.choice(other_nations)
+            if other_nations and self.rng.random() < 0.1:  # 10% chance to attack
+                target = self.rng.choice(other_nations)
                 # This would trigger a battle (simplified)
                 pass
     
@@ -282,7 +288,7 @@ class WorldSimulator:
         """AI diplomacy logic"""
         # AI forms alliances or breaks them
         with self.db.get_session() as session:
-            if random.random() < 0.05:  # 5% chance for diplomacy
+            if self.rng.random() < 0.05:  # 5% chance for diplomacy
                 # This would create or break alliances
                 pass
     